@@ -2,10 +2,10 @@
 
 
 a = Analysis(
-    ['app.py'],
+    ['run.py'],
     pathex=[],
     binaries=[],
-    datas=[('templates', 'templates'), ('static', 'static')],
+    datas=[('app/templates', 'app/templates'), ('app/static', 'app/static')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
@@ -1,55 +1,190 @@
+import json
+import logging
 import os
+import secrets
+import time
+from datetime import datetime
+
 from flask import Flask
-from flask_bcrypt import Bcrypt
-from flask_wtf.csrf import CSRFProtect
 from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate
 from flask_login import LoginManager
-from datetime import datetime
+from flask_wtf.csrf import CSRFProtect
 
-# Initialize extensions outside of the factory function
+# Extensions are created unbound so models and commands can import them; the
+# factory binds them. The schema is managed by `flask db upgrade` alone.
 db = SQLAlchemy()
-bcrypt = Bcrypt()
-csrf = CSRFProtect()
+migrate = Migrate()
 login_manager = LoginManager()
+csrf = CSRFProtect()
+
+perf_logger = logging.getLogger('academy.perf')
+
 
 def create_app():
-    # Create the Flask application instance
-    app = Flask(__name__, instance_relative_config=True)
+    started = time.perf_counter()
+    timings = {}
+    # Views, commands and the helpers behind them load here rather than at
+    # package import, so `import app` (migrations, scripts) stays cheap.
+    from .assets import asset_srcset, asset_url
+    from .auth import load_cached_user
+    from .cache import LRUCache, NullCache, cache_fragment, make_bytecode_cache, make_response_cache, preload_templates
+    from .cli import (archive_cli, assets_cli, bench_indexes_command, bench_login_command, bench_templates_command,
+                      documents_cli, import_cli, jobs_cli, ledger_cli, loadtest_command, rollover_cli, rollups_cli,
+                      search_cli, seed_demo_command)
+    from .database import configure_sqlite_engine, engine_options
+    from .fees import format_currency_filter
+    from .instrumentation import register_request_instrumentation
+    from .students import include_in_migrations
+    from .api import api_v1
+    from .routes import register_routes
+    timings['imports'] = time.perf_counter()
 
-    # Configure the database connection
+    app = Flask(__name__)
+    
+    # Configuration
+    # The random fallback only suits a single process (run.py, the desktop build);
+    # gunicorn.conf.py refuses to start workers without a shared SECRET_KEY.
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', secrets.token_hex(32))
+    
     database_url = os.environ.get("DATABASE_URL")
     if database_url:
         app.config['SQLALCHEMY_DATABASE_URI'] = database_url.replace("postgresql://", "postgresql+psycopg2://", 1)
     else:
         app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///db.sqlite'
-
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    
-    # The SECRET_KEY is essential for CSRF protection and session management
-    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'a-very-hard-to-guess-secret-key')
     
-    # Initialize extensions with the application
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['STUDENTS_PAGE_SIZE'] = int(os.environ.get('STUDENTS_PAGE_SIZE', 50))
+    app.config['STUDENTS_MAX_PAGE_SIZE'] = int(os.environ.get('STUDENTS_MAX_PAGE_SIZE', 200))
+    app.config['FACET_CACHE_TTL'] = int(os.environ.get('FACET_CACHE_TTL', 300))
+    app.config['IMPORT_BATCH_SIZE'] = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+    app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 200))
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '').lower() in ('1', 'true', 'yes')
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    app.config['PAYMENT_BATCH_MAX_ROWS'] = int(os.environ.get('PAYMENT_BATCH_MAX_ROWS', 500))
+    app.config['PAYMENT_BATCH_FORM_ROWS'] = int(os.environ.get('PAYMENT_BATCH_FORM_ROWS', 20))
+    # Any werkzeug method string; stored hashes using another method (or
+    # bcrypt) are rehashed with this one the next time their user logs in.
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    app.config['USER_CACHE_TTL'] = int(os.environ.get('USER_CACHE_TTL', 30))
+    app.config['USER_CACHE_SIZE'] = int(os.environ.get('USER_CACHE_SIZE', 1024))
+    # Run jobs in-process as soon as they are queued (development, tests).
+    app.config['JOBS_EAGER'] = os.environ.get('JOBS_EAGER', '').lower() in ('1', 'true', 'yes')
+    app.config['JOBS_POLL_INTERVAL'] = float(os.environ.get('JOBS_POLL_INTERVAL', 2))
+    app.config['JOBS_STALE_SECONDS'] = int(os.environ.get('JOBS_STALE_SECONDS', 300))
+    app.config['JOBS_MAX_ATTEMPTS'] = int(os.environ.get('JOBS_MAX_ATTEMPTS', 3))
+    app.config['JOBS_RETENTION_DAYS'] = int(os.environ.get('JOBS_RETENTION_DAYS', 7))
+    # Academic years whose payments stay in the payments table: the current
+    # one and the one before. `flask archive close` moves out anything older.
+    app.config['ARCHIVE_KEEP_YEARS'] = int(os.environ.get('ARCHIVE_KEEP_YEARS', 2))
+    app.config['RESPONSE_CACHE_URL'] = os.environ.get('RESPONSE_CACHE_URL', 'memory://')
+    app.config['RESPONSE_CACHE_SIZE'] = int(os.environ.get('RESPONSE_CACHE_SIZE', 512))
+    app.config['RESPONSE_CACHE_TIMEOUT'] = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 600))
+    # Rendered table rows and blocks, keyed by the data they show; same URL
+    # schemes as RESPONSE_CACHE_URL.
+    app.config['FRAGMENT_CACHE_URL'] = os.environ.get('FRAGMENT_CACHE_URL', 'memory://')
+    app.config['FRAGMENT_CACHE_SIZE'] = int(os.environ.get('FRAGMENT_CACHE_SIZE', 5000))
+    app.config['FRAGMENT_CACHE_TIMEOUT'] = int(os.environ.get('FRAGMENT_CACHE_TIMEOUT', 3600))
+    # Compiled templates are shared through this directory so a new worker
+    # loads bytecode instead of recompiling; an empty value turns it off.
+    app.config['TEMPLATE_CACHE_DIR'] = os.environ.get('TEMPLATE_CACHE_DIR', os.path.join(app.instance_path, 'jinja'))
+    app.config['TEMPLATE_PRELOAD'] = os.environ.get('TEMPLATE_PRELOAD', '').lower() in ('1', 'true', 'yes')
+    # Rendered PDF receipts, keyed by payment and the student's data_version;
+    # same URL schemes as RESPONSE_CACHE_URL.
+    app.config['RECEIPT_CACHE_URL'] = os.environ.get('RECEIPT_CACHE_URL', 'memory://')
+    app.config['RECEIPT_CACHE_SIZE'] = int(os.environ.get('RECEIPT_CACHE_SIZE', 1000))
+    app.config['RECEIPT_CACHE_TIMEOUT'] = int(os.environ.get('RECEIPT_CACHE_TIMEOUT', 7 * 24 * 3600))
+    # Processes that render statements and receipts for a whole class or batch.
+    app.config['DOCUMENT_WORKERS'] = int(os.environ.get('DOCUMENT_WORKERS', os.cpu_count() or 1))
+    # Output of `flask assets build`, served from /assets; image variants are
+    # made at these widths (the logo shows about 55px wide, so 1x/2x/4x).
+    app.config['ASSET_DIST_DIR'] = os.environ.get('ASSET_DIST_DIR', os.path.join(app.static_folder, 'dist'))
+    app.config['ASSET_IMAGE_WIDTHS'] = [
+        int(width) for width in os.environ.get('ASSET_IMAGE_WIDTHS', '64,128,256').split(',') if width.strip()
+    ]
+    # Each gunicorn worker has its own pool, sized to its thread count
+    # (gunicorn.conf.py exports WEB_THREADS) so no thread waits on a connection.
+    app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', os.environ.get('WEB_THREADS', 5)))
+    app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 2))
+    app.config['DB_POOL_TIMEOUT'] = int(os.environ.get('DB_POOL_TIMEOUT', 10))
+    app.config['DB_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    app.config['SQLITE_BEGIN_IMMEDIATE'] = os.environ.get('SQLITE_BEGIN_IMMEDIATE', '1').lower() in ('1', 'true', 'yes')
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], app.config)
+    timings['config'] = time.perf_counter()
+
+    # Initialize extensions
     db.init_app(app)
-    bcrypt.init_app(app)
-    csrf.init_app(app)
+    migrate.init_app(app, db, include_object=include_in_migrations)
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            configure_sqlite_engine(db.engine, app.config)
     login_manager.init_app(app)
-    login_manager.login_view = 'main.login'
+    login_manager.login_view = 'login'
+    # Every form POST carries {{ csrf_token() }}. The JSON API is exempt: it only
+    # accepts application/json bodies, which a cross-site form cannot send.
+    csrf.init_app(app)
+    csrf.exempt(api_v1)
     
-    @app.context_processor
-    def inject_now():
-        return {'now': datetime.now()}
-
     @login_manager.user_loader
     def load_user(user_id):
-        from .models import User
-        return User.query.get(int(user_id))
+        return load_cached_user(int(user_id))
 
-    from .routes import main_bp
-    app.register_blueprint(main_bp)
+    @app.context_processor
+    def inject_now():
+        return {'now': datetime.now()}
+    
+    bytecode_cache = make_bytecode_cache(app.config['TEMPLATE_CACHE_DIR'])
+    if bytecode_cache is not None:
+        # jinja_options only apply before app.jinja_env is first touched.
+        app.jinja_options = dict(app.jinja_options, bytecode_cache=bytecode_cache)
+    app.jinja_env.filters['format_currency'] = format_currency_filter
+    app.jinja_env.globals['cache_fragment'] = cache_fragment
+    app.jinja_env.globals['asset_url'] = asset_url
+    app.jinja_env.globals['asset_srcset'] = asset_srcset
+    app.extensions['user_cache'] = (LRUCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+                                    if app.config['USER_CACHE_TTL'] > 0 else NullCache())
+    app.extensions['response_cache'] = make_response_cache(
+        app.config['RESPONSE_CACHE_URL'], app.config['RESPONSE_CACHE_SIZE'], app.config['RESPONSE_CACHE_TIMEOUT']
+    )
+    app.extensions['fragment_cache'] = make_response_cache(
+        app.config['FRAGMENT_CACHE_URL'], app.config['FRAGMENT_CACHE_SIZE'], app.config['FRAGMENT_CACHE_TIMEOUT'],
+        prefix='academy:fragment:'
+    )
+    app.extensions['receipt_cache'] = make_response_cache(
+        app.config['RECEIPT_CACHE_URL'], app.config['RECEIPT_CACHE_SIZE'], app.config['RECEIPT_CACHE_TIMEOUT'],
+        prefix='academy:receipt:'
+    )
+    timings['extensions'] = time.perf_counter()
 
-    with app.app_context():
-        # Import models here to ensure they are registered with SQLAlchemy
-        from . import models
-        db.create_all()
+    app.register_blueprint(api_v1)
+    app.cli.add_command(ledger_cli)
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(bench_indexes_command)
+    app.cli.add_command(bench_login_command)
+    app.cli.add_command(bench_templates_command)
+    app.cli.add_command(import_cli)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(rollover_cli)
+    app.cli.add_command(archive_cli)
+    app.cli.add_command(assets_cli)
+    app.cli.add_command(documents_cli)
+    app.cli.add_command(search_cli)
+    app.cli.add_command(seed_demo_command)
+    app.cli.add_command(loadtest_command)
+    register_request_instrumentation(app)
+    register_routes(app)
+    timings['views'] = time.perf_counter()
+    if app.config['TEMPLATE_PRELOAD']:
+        preload_templates(app)
+        timings['templates'] = time.perf_counter()
 
+    phases, previous = {}, started
+    for phase, at in timings.items():
+        phases[phase] = round((at - previous) * 1000, 2)
+        previous = at
+    app.extensions['startup_ms'] = dict(phases, total=round((previous - started) * 1000, 2))
+    perf_logger.info(json.dumps({'event': 'startup', 'pid': os.getpid(), **app.extensions['startup_ms']}))
     return app
@@ -0,0 +1,262 @@
+import json
+from datetime import date
+
+from flask import Blueprint, request, current_app, jsonify, url_for
+from flask_login import current_user
+from sqlalchemy.orm import defer
+
+from . import db
+from .models import Job, Payment, Student
+from .fees import get_current_school_period, with_fee_status
+from .imports import IdempotencyConflict, record_payment_batch
+from .ledger import build_fee_breakdown
+from .students import decode_cursor, filter_students, keyset_page
+
+# JSON API. Rows are fetched as plain column tuples for just the requested
+# fields and serialised straight to dicts; no ORM objects are built.
+api_v1 = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+STUDENT_API_FIELDS = {
+    'reg_number': Student.reg_number,
+    'name': Student.name,
+    'dob': Student.dob,
+    'gender': Student.gender,
+    'address': Student.address,
+    'phone': Student.phone,
+    'email': Student.email,
+    'student_class': Student.student_class,
+    'term': Student.term,
+    'academic_year': Student.academic_year,
+    'admission_date': Student.admission_date,
+}
+FEE_STATUS_API_FIELDS = ('expected_fee', 'total_paid', 'outstanding', 'fee_status')
+PAYMENT_API_FIELDS = {
+    'id': Payment.id,
+    'reg_number': Payment.student_reg_number,
+    'term': Payment.term,
+    'academic_year': Payment.academic_year,
+    'amount_paid': Payment.amount_paid,
+    'payment_date': Payment.payment_date,
+    'recorded_by': Payment.recorded_by,
+}
+STUDENT_API_DEFAULT_FIELDS = ('reg_number', 'name', 'student_class', 'term', 'academic_year')
+DEFAULTER_API_DEFAULT_FIELDS = ('reg_number', 'name', 'student_class', 'expected_fee', 'total_paid', 'outstanding')
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@api_v1.errorhandler(ApiError)
+def handle_api_error(error):
+    return jsonify({'error': error.message}), error.status
+
+
+@api_v1.before_request
+def require_api_login():
+    if not current_user.is_authenticated:
+        raise ApiError('Authentication required.', 401)
+
+
+def api_fields(available, default):
+    """The ?fields= selection, validated against `available`."""
+    requested = request.args.get('fields')
+    if not requested:
+        return list(default)
+    fields = list(dict.fromkeys(field.strip() for field in requested.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise ApiError(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(available)}.")
+    return fields
+
+
+def api_limit():
+    limit = request.args.get('limit', type=int) or current_app.config['STUDENTS_PAGE_SIZE']
+    return max(1, min(limit, current_app.config['STUDENTS_MAX_PAGE_SIZE']))
+
+
+def api_value(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def api_response(payload):
+    """JSON with a content ETag, answering If-None-Match with 304."""
+    response = jsonify(payload)
+    response.add_etag()
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
+def student_api_query(fields, academic_year, term, status='all'):
+    """Column-only Student query for `fields`, with fee status columns only when asked for."""
+    query = db.session.query(Student.id, Student.name, *[
+        STUDENT_API_FIELDS[field].label(f'f_{field}') for field in fields if field in STUDENT_API_FIELDS
+    ])
+    if status != 'all' or any(field in FEE_STATUS_API_FIELDS for field in fields):
+        query = with_fee_status(query, academic_year, term, status=status)
+    return query
+
+
+def student_api_record(row, fields):
+    record = {}
+    for field in fields:
+        if field == 'outstanding':
+            # Overpayments show as nothing outstanding, as on the student list.
+            record[field] = round(max(row.expected_fee - row.total_paid, 0.0), 2)
+        elif field == 'fee_status':
+            record[field] = row.fee_status
+        elif field in FEE_STATUS_API_FIELDS:
+            record[field] = round(getattr(row, field), 2)
+        else:
+            record[field] = api_value(getattr(row, f'f_{field}'))
+    return record
+
+
+def student_api_listing(status, default_fields):
+    fields = api_fields(list(STUDENT_API_FIELDS) + list(FEE_STATUS_API_FIELDS), default_fields)
+    current_year, current_term = get_current_school_period()
+    academic_year = request.args.get('academic_year', current_year)
+    term = request.args.get('fee_term', current_term)
+    if status is None:
+        status = request.args.get('status', 'all')
+        if status not in ('all', 'Paid', 'Defaulter', 'N/A'):
+            raise ApiError("status must be one of all, Paid, Defaulter, N/A.")
+    cursor = request.args.get('after')
+    after = decode_cursor(cursor)
+    if cursor and after is None:
+        raise ApiError('Malformed cursor.')
+
+    query = student_api_query(fields, academic_year, term, status)
+    query = filter_students(query, request.args.get('class', 'all'), request.args.get('term', 'all'),
+                            request.args.get('search', '').strip())
+    rows, next_cursor, _ = keyset_page(query, api_limit(), after=after, key=lambda row: row)
+    return api_response({
+        'data': [student_api_record(row, fields) for row in rows],
+        'next': next_cursor,
+        'academic_year': academic_year,
+        'fee_term': term,
+    })
+
+
+@api_v1.route('/students')
+def api_students():
+    return student_api_listing(None, STUDENT_API_DEFAULT_FIELDS)
+
+
+@api_v1.route('/defaulters')
+def api_defaulters():
+    return student_api_listing('Defaulter', DEFAULTER_API_DEFAULT_FIELDS)
+
+
+@api_v1.route('/students/<reg_number>')
+def api_student(reg_number):
+    fields = api_fields(list(STUDENT_API_FIELDS) + list(FEE_STATUS_API_FIELDS), STUDENT_API_FIELDS)
+    current_year, current_term = get_current_school_period()
+    row = student_api_query(
+        fields, request.args.get('academic_year', current_year), request.args.get('fee_term', current_term)
+    ).filter(Student.reg_number == reg_number).first()
+    if row is None:
+        raise ApiError('Student not found.', 404)
+    return api_response({'data': student_api_record(row, fields)})
+
+
+@api_v1.route('/students/<reg_number>/fees')
+def api_student_fees(reg_number):
+    student = db.session.query(
+        Student.reg_number, Student.student_class, Student.term, Student.academic_year
+    ).filter(Student.reg_number == reg_number).first()
+    if student is None:
+        raise ApiError('Student not found.', 404)
+    current_year, current_term = get_current_school_period()
+    breakdown = build_fee_breakdown(student, current_year, current_term)
+    return api_response({'data': [
+        dict(period, **{name: round(period[name], 2) for name in ('expected', 'paid', 'outstanding')})
+        for period in breakdown.values()
+    ]})
+
+
+def payment_api_listing(query):
+    fields = api_fields(PAYMENT_API_FIELDS, PAYMENT_API_FIELDS)
+    after = request.args.get('after')
+    if after is not None:
+        try:
+            query = query.filter(Payment.id > int(after))
+        except ValueError:
+            raise ApiError('Malformed cursor.')
+    limit = api_limit()
+    rows = query.with_entities(
+        Payment.id.label('cursor_id'), *[PAYMENT_API_FIELDS[field].label(field) for field in fields]
+    ).order_by(Payment.id).limit(limit + 1).all()
+    return api_response({
+        'data': [{field: api_value(getattr(row, field)) for field in fields} for row in rows[:limit]],
+        'next': str(rows[limit - 1].cursor_id) if len(rows) > limit else None,
+    })
+
+
+@api_v1.route('/payments')
+def api_payments():
+    query = db.session.query(Payment)
+    for arg, column in (('reg_number', Payment.student_reg_number),
+                        ('academic_year', Payment.academic_year), ('term', Payment.term)):
+        if request.args.get(arg):
+            query = query.filter(column == request.args[arg])
+    try:
+        if request.args.get('from'):
+            query = query.filter(Payment.payment_date >= date.fromisoformat(request.args['from']))
+        if request.args.get('to'):
+            query = query.filter(Payment.payment_date <= date.fromisoformat(request.args['to']))
+    except ValueError:
+        raise ApiError('from/to must be YYYY-MM-DD dates.')
+    return payment_api_listing(query)
+
+
+@api_v1.route('/payments/batch', methods=['POST'])
+def api_payment_batch():
+    if current_user.role != 'admin':
+        raise ApiError('Only administrators can record payments.', 403)
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('payments'), list):
+        raise ApiError('Expected a JSON object with a "payments" list.')
+    rows = body['payments']
+    if not rows or not all(isinstance(row, dict) for row in rows):
+        raise ApiError('"payments" must be a non-empty list of objects.')
+    if len(rows) > current_app.config['PAYMENT_BATCH_MAX_ROWS']:
+        raise ApiError(f"At most {current_app.config['PAYMENT_BATCH_MAX_ROWS']} payments per batch.")
+    idempotency_key = request.headers.get('Idempotency-Key') or body.get('idempotency_key')
+    if not idempotency_key or len(idempotency_key) > 64:
+        raise ApiError('An Idempotency-Key header (or idempotency_key field) of up to 64 characters is required.')
+    try:
+        result, replayed = record_payment_batch(rows, current_user.id, idempotency_key)
+    except IdempotencyConflict as e:
+        raise ApiError(str(e), 422)
+    response = jsonify(dict(result, replayed=replayed))
+    response.status_code = 200 if replayed else 201
+    return response
+
+
+@api_v1.route('/students/<reg_number>/payments')
+def api_student_payments(reg_number):
+    if not db.session.query(Student.query.filter_by(reg_number=reg_number).exists()).scalar():
+        raise ApiError('Student not found.', 404)
+    return payment_api_listing(db.session.query(Payment).filter(Payment.student_reg_number == reg_number))
+
+
+@api_v1.route('/jobs/<int:job_id>')
+def api_job(job_id):
+    job = db.session.get(Job, job_id, options=[defer(Job.result_data)])
+    if job is None or (current_user.role != 'admin' and job.created_by != current_user.id):
+        raise ApiError('Job not found.', 404)
+    data = {
+        'id': job.id, 'kind': job.kind, 'status': job.status, 'progress': job.progress, 'message': job.message,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'result': json.loads(job.result) if job.result else None,
+        'download_url': url_for('job_download', job_id=job.id) if job.status == 'done' and job.result_name else None,
+    }
+    return api_response({'data': data})
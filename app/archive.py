@@ -0,0 +1,93 @@
+from datetime import datetime
+
+from . import db
+from .models import Student, Payment, PaymentArchive, PaymentHistory, ArchivedYear, academic_year_start
+from .cache import bump_cache_version
+from .fees import get_current_school_period
+
+
+def closed_academic_years(keep_years):
+    """Academic years still in the payments table that are older than the newest `keep_years`, oldest first."""
+    current_academic_year, _ = get_current_school_period()
+    cutoff = academic_year_start(current_academic_year) - max(keep_years, 1) + 1
+    years = db.session.query(Payment.academic_year).filter(Payment.academic_year_start < cutoff).distinct()
+    return sorted((year for (year,) in years), key=academic_year_start)
+
+
+def _summarise_archived_year(academic_year):
+    """Rebuild payment_history and the archived_years row for one year from payments_archive. Does not commit."""
+    archived = PaymentArchive.__table__
+    db.session.execute(db.delete(PaymentHistory).where(PaymentHistory.academic_year == academic_year))
+    db.session.execute(PaymentHistory.__table__.insert().from_select(
+        ['student_reg_number', 'academic_year', 'term', 'academic_year_start', 'term_ordinal',
+         'payments', 'amount_paid', 'last_payment_date'],
+        db.select(
+            archived.c.student_reg_number, archived.c.academic_year, archived.c.term,
+            db.func.min(archived.c.academic_year_start), db.func.min(archived.c.term_ordinal),
+            db.func.count(), db.func.sum(archived.c.amount_paid), db.func.max(archived.c.payment_date)
+        ).where(archived.c.academic_year == academic_year, archived.c.term.isnot(None)).group_by(
+            archived.c.student_reg_number, archived.c.academic_year, archived.c.term)
+    ))
+    count, amount = db.session.query(db.func.count(), db.func.coalesce(db.func.sum(archived.c.amount_paid), 0)).filter(
+        archived.c.academic_year == academic_year
+    ).one()
+    return count, amount
+
+
+def _touch_year_students(academic_year):
+    """touch_students() for everyone with archived payments in a year, as one UPDATE."""
+    students = Student.__table__
+    db.session.execute(students.update().where(students.c.reg_number.in_(
+        db.select(PaymentHistory.student_reg_number).where(PaymentHistory.academic_year == academic_year)
+    )).values(data_version=students.c.data_version + 1, updated_at=datetime.utcnow()))
+    bump_cache_version('students')
+
+
+def archive_academic_year(academic_year, archived_by=None):
+    """Move a closed year's payments into payments_archive, in one transaction.
+
+    The rows are copied with INSERT ... SELECT and deleted from payments;
+    their per-student, per-term totals go into payment_history, which
+    payment_totals_query() reads in their place, so the ledger still
+    verifies. Running it again for a year picks up late payments. Commits
+    and returns the number of payments moved.
+    """
+    current_academic_year, _ = get_current_school_period()
+    start = academic_year_start(academic_year)
+    if start is None or start >= academic_year_start(current_academic_year):
+        raise ValueError(f'{academic_year} is not a closed academic year.')
+
+    payments = Payment.__table__
+    selected = payments.c.academic_year == academic_year
+    columns = [column.name for column in payments.columns]
+    moved = db.session.execute(PaymentArchive.__table__.insert().from_select(
+        columns + ['archived_at'],
+        db.select(*payments.c, db.literal(datetime.utcnow(), db.DateTime)).where(selected)
+    )).rowcount
+    db.session.execute(payments.delete().where(selected))
+    count, amount = _summarise_archived_year(academic_year)
+    if count:
+        year = db.session.get(ArchivedYear, academic_year) or ArchivedYear(academic_year=academic_year)
+        year.payments, year.amount, year.archived_by, year.archived_at = count, amount, archived_by, datetime.utcnow()
+        db.session.add(year)
+        _touch_year_students(academic_year)
+    db.session.commit()
+    return moved
+
+
+def restore_academic_year(academic_year):
+    """Move an archived year's payments back into the payments table. Commits and returns the number moved."""
+    if db.session.get(ArchivedYear, academic_year) is None:
+        raise ValueError(f'{academic_year} has not been archived.')
+    archived = PaymentArchive.__table__
+    selected = archived.c.academic_year == academic_year
+    columns = [column.name for column in Payment.__table__.columns]
+    moved = db.session.execute(Payment.__table__.insert().from_select(
+        columns, db.select(*[archived.c[name] for name in columns]).where(selected)
+    )).rowcount
+    _touch_year_students(academic_year)
+    db.session.execute(archived.delete().where(selected))
+    db.session.execute(db.delete(PaymentHistory).where(PaymentHistory.academic_year == academic_year))
+    db.session.execute(db.delete(ArchivedYear).where(ArchivedYear.academic_year == academic_year))
+    db.session.commit()
+    return moved
@@ -0,0 +1,182 @@
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+
+import click
+from flask import request, current_app, send_from_directory, url_for
+
+
+# Static assets. `flask assets build` copies app/static into ASSET_DIST_DIR
+# under content-hashed names, with .br/.gz siblings for text files and
+# resized, recompressed variants of the images, and writes the manifest that
+# asset_url() and asset_srcset() resolve names through. Without a build they
+# fall back to plain /static URLs.
+ASSET_MAX_AGE = 365 * 24 * 3600
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.ico', '.json', '.txt', '.html')
+RESIZABLE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def _hashed_name(name, data, label=''):
+    root, ext = os.path.splitext(name)
+    return f'{root}{label}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+def _asset_encoders():
+    """[(suffix, compress)] in order of preference; brotli needs the optional brotli package."""
+    encoders = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    try:
+        import brotli
+    except ImportError:
+        click.echo('The brotli package is not installed; writing gzip copies only.')
+    else:
+        encoders.insert(0, ('.br', lambda data: brotli.compress(data, quality=11)))
+    return encoders
+
+
+def _write_asset(dist_dir, name, data, encoders=()):
+    """Write a built file and any compressed copies that come out smaller; returns their suffixes."""
+    path = os.path.join(dist_dir, *name.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as fh:
+        fh.write(data)
+    written = []
+    for suffix, compress in encoders:
+        packed = compress(data)
+        if len(packed) < len(data):
+            with open(path + suffix, 'wb') as fh:
+                fh.write(packed)
+            written.append(suffix)
+    return written
+
+
+def _image_variants(name, data, widths):
+    """[(width, mimetype, extension, bytes)] at each of `widths` up to the image's own, in its format and as WebP.
+
+    Returns None when Pillow is not installed.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+    if name.lower().endswith('.png'):
+        own = ('PNG', 'image/png', '.png', {'optimize': True})
+    else:
+        own = ('JPEG', 'image/jpeg', '.jpg', {'optimize': True, 'quality': 82, 'progressive': True})
+    formats = (own, ('WEBP', 'image/webp', '.webp', {'quality': 80, 'method': 6}))
+    variants = []
+    for width in sorted({w for w in widths if w < image.width} | {image.width}):
+        resized = image if width == image.width else image.resize(
+            (width, round(image.height * width / image.width)), Image.LANCZOS)
+        for save_format, mimetype, extension, options in formats:
+            out = io.BytesIO()
+            resized.save(out, save_format, **options)
+            variants.append((width, mimetype, extension, out.getvalue()))
+    return variants
+
+
+def build_assets(static_dir, dist_dir, image_widths):
+    """Build every file under static_dir into dist_dir and write its manifest.json; returns the manifest.
+
+    Files from earlier builds are left in place, so pages rendered (or
+    cached) before a deploy keep resolving their old hashed URLs.
+    """
+    manifest = {'files': {}, 'encodings': {}, 'variants': {}}
+    encoders = _asset_encoders()
+    pillow_missing = False
+    dist_dir = os.path.abspath(dist_dir)
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.abspath(os.path.join(root, d)) != dist_dir)
+        for filename in sorted(files):
+            name = os.path.relpath(os.path.join(root, filename), static_dir).replace(os.sep, '/')
+            with open(os.path.join(root, filename), 'rb') as fh:
+                data = fh.read()
+            ext = os.path.splitext(filename)[1].lower()
+            hashed = _hashed_name(name, data)
+            encodings = _write_asset(dist_dir, hashed, data, encoders if ext in COMPRESSIBLE_EXTENSIONS else ())
+            manifest['files'][name] = hashed
+            if encodings:
+                manifest['encodings'][hashed] = encodings
+            if ext not in RESIZABLE_EXTENSIONS:
+                continue
+            variants = _image_variants(name, data, image_widths)
+            if variants is None:
+                pillow_missing = True
+                continue
+            manifest['variants'][name] = []
+            for width, mimetype, extension, variant in variants:
+                variant_name = _hashed_name(os.path.splitext(name)[0] + extension, variant, f'.{width}w')
+                _write_asset(dist_dir, variant_name, variant)
+                manifest['variants'][name].append({'width': width, 'type': mimetype, 'file': variant_name})
+    if pillow_missing:
+        click.echo('Pillow is not installed; images were copied without resized variants.')
+
+    path = os.path.join(dist_dir, 'manifest.json')
+    with open(path + '.tmp', 'w') as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+    return manifest
+
+
+def asset_manifest():
+    """The build manifest, read once per worker; empty when `flask assets build` has not run."""
+    manifest = current_app.extensions.get('asset_manifest')
+    if manifest is None:
+        try:
+            with open(os.path.join(current_app.config['ASSET_DIST_DIR'], 'manifest.json')) as fh:
+                manifest = json.load(fh)
+        except FileNotFoundError:
+            manifest = {'files': {}, 'encodings': {}, 'variants': {}}
+        current_app.extensions['asset_manifest'] = manifest
+    return manifest
+
+
+def asset_url(filename, width=None):
+    """url_for('static', ...) for templates, but pointing at the hashed build of the file.
+
+    With `width`, an image resolves to its narrowest variant at least that
+    wide, in the original format.
+    """
+    manifest = asset_manifest()
+    if width:
+        for variant in manifest['variants'].get(filename, ()):
+            if variant['width'] >= width and variant['type'] != 'image/webp':
+                return url_for('asset', filename=variant['file'])
+    hashed = manifest['files'].get(filename)
+    if hashed is None:
+        return url_for('static', filename=filename)
+    return url_for('asset', filename=hashed)
+
+
+def asset_srcset(filename, mimetype=None):
+    """A srcset of an image's resized variants, of `mimetype` or else its own format; '' before a build."""
+    mimetype = mimetype or mimetypes.guess_type(filename)[0]
+    return ', '.join(
+        f"{url_for('asset', filename=variant['file'])} {variant['width']}w"
+        for variant in asset_manifest()['variants'].get(filename, ()) if variant['type'] == mimetype
+    )
+
+
+def send_asset(filename):
+    """Serve a built file with immutable far-future caching, precompressed when the client accepts it."""
+    encodings = asset_manifest()['encodings'].get(filename, ())
+    suffix = encoding = None
+    for candidate_suffix, candidate_encoding in (('.br', 'br'), ('.gz', 'gzip')):
+        if candidate_suffix in encodings and request.accept_encodings[candidate_encoding]:
+            suffix, encoding = candidate_suffix, candidate_encoding
+            break
+    response = send_from_directory(
+        current_app.config['ASSET_DIST_DIR'], filename + suffix if suffix else filename,
+        mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream', max_age=ASSET_MAX_AGE
+    )
+    if encoding:
+        response.content_encoding = encoding
+    if encodings:
+        response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
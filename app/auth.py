@@ -0,0 +1,100 @@
+import secrets
+
+from flask import current_app, g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from . import db
+from .cache import bump_cache_version, get_cache_version
+from .models import User
+
+
+# Passwords. Werkzeug hashes look like "method$salt$hash"; accounts created by
+# the old blueprint carry bcrypt "$2b$..." hashes in the same column. Both
+# verify, and either is rewritten with PASSWORD_HASH_METHOD at the next login.
+def hash_password(password):
+    return generate_password_hash(password, method=current_app.config['PASSWORD_HASH_METHOD'])
+
+
+_reference_hashes = {}
+
+
+def _reference_hash(method):
+    """A hash of a random password made with `method`, computed once per method.
+
+    Its prefix is the method string werkzeug records, with defaults filled
+    in, and checking against it costs the same as checking a real password.
+    """
+    if method not in _reference_hashes:
+        _reference_hashes[method] = generate_password_hash(secrets.token_hex(16), method=method)
+    return _reference_hashes[method]
+
+
+def hash_prefix(method):
+    return _reference_hash(method).split('$', 1)[0]
+
+
+def verify_password(stored, password):
+    if stored.startswith('$2'):
+        try:
+            import bcrypt
+        except ImportError:
+            current_app.logger.warning('A bcrypt password hash was found but the bcrypt package is not installed.')
+            return False
+        return bcrypt.checkpw(password.encode('utf-8'), stored.encode('utf-8'))
+    try:
+        return check_password_hash(stored, password)
+    except ValueError:
+        return False
+
+
+def password_needs_rehash(stored):
+    return stored.split('$', 1)[0] != hash_prefix(current_app.config['PASSWORD_HASH_METHOD'])
+
+
+def authenticate(username, password):
+    """The user with these credentials, or None; upgrades an outdated hash in place.
+
+    An unknown username still pays for one hash check, so response time
+    does not reveal which usernames exist.
+    """
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        verify_password(_reference_hash(current_app.config['PASSWORD_HASH_METHOD']), password)
+        return None
+    if not verify_password(user.password, password):
+        return None
+    if password_needs_rehash(user.password):
+        user.password = hash_password(password)
+        db.session.commit()
+    return user
+
+
+# Flask-Login calls the user loader on every authenticated request. The
+# columns it needs are kept per worker for USER_CACHE_TTL seconds and turned
+# back into a session-attached User without a query. Any update or delete of
+# a user bumps the 'users' version stamp, which is read once per request, so
+# a password or role change made through any worker applies at once.
+def load_cached_user(user_id):
+    cache = current_app.extensions['user_cache']
+    if 'users_version' not in g:
+        g.users_version = get_cache_version('users')
+    entry = cache.get(user_id)
+    if entry is None or entry['version'] != g.users_version:
+        user = db.session.get(User, user_id)
+        if user is not None:
+            cache.set(user_id, {'version': g.users_version,
+                                'state': {'id': user.id, 'username': user.username, 'role': user.role}})
+        return user
+    user = User(**entry['state'])
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _forget_cached_user(mapper, connection, target):
+    bump_cache_version('users', connection)
+    if has_app_context() and 'user_cache' in current_app.extensions:
+        current_app.extensions['user_cache'].delete(target.id)
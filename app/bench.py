@@ -0,0 +1,284 @@
+import os
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, build_opener
+
+import click
+
+from . import db
+from .models import User, Student, Payment
+from .fees import FEE_STRUCTURE, expected_fee, fee_classes, fee_terms, get_current_school_period
+from .instrumentation import APP_ROOT
+from .students import get_student_facets
+
+
+HOT_QUERY_INDEXES = [
+    index for table in (Student.__table__, Payment.__table__) for index in table.indexes
+]
+
+
+def seed_benchmark_data(connection, n_students, n_payments, seed=42):
+    """Insert synthetic students and payments spread over the FEE_STRUCTURE classes."""
+    rng = random.Random(seed)
+    classes = sorted({student_class for student_class, _ in FEE_STRUCTURE})
+    terms = sorted({term for _, term in FEE_STRUCTURE})
+    years = ['2023/2024', '2024/2025', '2025/2026']
+
+    connection.execute(User.__table__.insert(), [{'id': 1, 'username': 'bench', 'password': '-', 'role': 'admin'}])
+    students = [{
+        'reg_number': f'BENCH/{i:07d}',
+        'name': f'Student {rng.randrange(n_students):07d}',
+        'student_class': rng.choice(classes),
+        'term': rng.choice(terms),
+        'academic_year': rng.choice(years),
+        'admission_date': date(rng.randint(2018, 2025), rng.randint(1, 12), rng.randint(1, 28)),
+    } for i in range(n_students)]
+    for start in range(0, len(students), 5000):
+        connection.execute(Student.__table__.insert(), students[start:start + 5000])
+
+    payments = []
+    for _ in range(n_payments):
+        payments.append({
+            'student_reg_number': f'BENCH/{rng.randrange(n_students):07d}',
+            'term': rng.choice(terms),
+            'academic_year': rng.choice(years),
+            'amount_paid': float(rng.choice([5000, 10000, 20000, 25000, 50000])),
+            'payment_date': date(rng.randint(2023, 2025), rng.randint(1, 12), rng.randint(1, 28)),
+            'recorded_by': 1,
+        })
+        if len(payments) == 5000:
+            connection.execute(Payment.__table__.insert(), payments)
+            payments = []
+    if payments:
+        connection.execute(Payment.__table__.insert(), payments)
+
+
+def benchmark_hot_queries(engine, repeat):
+    """Time each hot query shape and capture its plan; returns {name: {...}}."""
+    sample = 'BENCH/0000001'
+    queries = {
+        'period_sum': db.select(db.func.sum(Payment.amount_paid)).where(
+            Payment.student_reg_number == sample,
+            Payment.academic_year == '2024/2025',
+            Payment.term == 'First Term'),
+        'student_payments': db.select(Payment).where(
+            Payment.student_reg_number == sample).order_by(Payment.payment_date.desc()),
+        'list_by_name': db.select(Student).order_by(Student.name, Student.id).limit(50),
+        'list_by_class': db.select(Student).where(
+            Student.student_class == 'JSS 1').order_by(Student.name, Student.id).limit(50),
+        'latest_admissions': db.select(Student).order_by(Student.admission_date.desc()).limit(5),
+        'distinct_classes': db.select(Student.student_class).distinct(),
+    }
+    explain = 'EXPLAIN QUERY PLAN ' if engine.dialect.name == 'sqlite' else 'EXPLAIN ANALYZE '
+    results = {}
+    with engine.connect() as connection:
+        for name, query in queries.items():
+            sql = str(query.compile(engine, compile_kwargs={'literal_binds': True}))
+            plan = [' '.join(str(col) for col in row) for row in connection.exec_driver_sql(explain + sql)]
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                connection.execute(query).fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = {'median_ms': statistics.median(timings), 'plan': plan}
+    return results
+
+
+FIRST_NAMES = ['Abdullahi', 'Aisha', 'Fatima', 'Ibrahim', 'Musa', 'Zainab', 'Yusuf', 'Hauwa', 'Usman', 'Maryam',
+               'Sani', 'Khadija', 'Aminu', 'Halima', 'Bashir', 'Rukayya', 'Nura', 'Safiya', 'Kabiru', 'Hadiza']
+LAST_NAMES = ['Abubakar', 'Bello', 'Garba', 'Sule', 'Idris', 'Lawal', 'Danjuma', 'Yakubu', 'Shehu', 'Mohammed',
+              'Aliyu', 'Haruna', 'Umar', 'Isah', 'Jibril', 'Tijjani', 'Salisu', 'Ahmad', 'Rabiu', 'Kabir']
+TERM_START_MONTHS = {'First Term': 9, 'Second Term': 1, 'Third Term': 5}
+
+
+def generate_school_data(n_students, n_years=3, seed=42):
+    """Yield ('student', row) and ('payment', row) dicts for a synthetic school.
+
+    Enrolment is heavier in the lower classes, and each student has a mix of
+    full, instalment and missing payments for every term they were enrolled,
+    dated inside that term.
+    """
+    rng = random.Random(seed)
+    classes = fee_classes()
+    terms = fee_terms()
+    class_weights = [len(classes) - i for i in range(len(classes))]
+    current_academic_year, current_term = get_current_school_period()
+    last_start = int(current_academic_year.split('/')[0])
+    years = [f'{y}/{y + 1}' for y in range(last_start - n_years + 1, last_start + 1)]
+
+    for i in range(n_students):
+        reg_number = f'AFA-{rng.choice(years)[:4]}-{i:06d}'
+        student_class = rng.choices(classes, weights=class_weights)[0]
+        admission_year = rng.choice(years)
+        yield 'student', {
+            'reg_number': reg_number,
+            'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            'dob': date(2005 + rng.randint(0, 15), rng.randint(1, 12), rng.randint(1, 28)),
+            'gender': rng.choice(['Male', 'Female']),
+            'address': f'{rng.randint(1, 200)} Kano Road, Mai\'adua',
+            'phone': f'080{rng.randint(10000000, 99999999)}',
+            'email': '',
+            'student_class': student_class,
+            'term': current_term,
+            'academic_year': current_academic_year,
+            'admission_date': date(int(admission_year[:4]), 9, rng.randint(1, 28)),
+        }
+
+        for year in years[years.index(admission_year):]:
+            for term in terms:
+                if year == current_academic_year and terms.index(term) > terms.index(current_term):
+                    break
+                fee = expected_fee(student_class, term, year)
+                behaviour = rng.random()
+                if fee <= 0 or behaviour < 0.15:
+                    continue
+                total = fee if behaviour < 0.75 else round(fee * rng.uniform(0.2, 0.9), -2)
+                instalments = 1 if behaviour < 0.6 else rng.randint(2, 3)
+                start_year = int(year[:4]) + (0 if term == 'First Term' else 1)
+                term_start = date(start_year, TERM_START_MONTHS.get(term, 9), 1)
+                for n in range(instalments):
+                    yield 'payment', {
+                        'student_reg_number': reg_number,
+                        'term': term,
+                        'academic_year': year,
+                        'amount_paid': round(total / instalments, 2),
+                        'payment_date': term_start + timedelta(days=rng.randint(0, 80)),
+                        'recorded_by': None,
+                    }
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def loadtest_scenarios(n_detail_pages=20):
+    """(name, path) pairs covering the dashboard, every /students filter and detail pages."""
+    classes, terms = get_student_facets()
+    sample = [reg for (reg,) in db.session.query(Student.reg_number).order_by(Student.id).limit(5000)]
+    rng = random.Random(7)
+    scenarios = [
+        ('index', '/'),
+        ('students', '/students'),
+        ('students_paid', '/students?status=Paid'),
+        ('students_defaulter', '/students?status=Defaulter'),
+        ('students_search', '/students?' + urlencode({'search_query': 'Aisha'})),
+    ]
+    if classes:
+        scenarios.append(('students_class', '/students?' + urlencode({'class': classes[len(classes) // 2]})))
+    if terms:
+        scenarios.append(('students_term', '/students?' + urlencode({'term': terms[0]})))
+    for reg_number in rng.sample(sample, min(n_detail_pages, len(sample))):
+        scenarios.append(('student_details', f'/student/{reg_number}'))
+    return scenarios
+
+
+def _server_timing_queries(header):
+    match = re.search(r'desc="(\d+) queries"', header or '')
+    return int(match.group(1)) if match else None
+
+
+def summarise_timings(samples, wall_seconds):
+    """Collapse {name: [(ms, queries), ...]} into per-scenario latency stats."""
+    report = {}
+    for name, values in samples.items():
+        latencies = sorted(ms for ms, _ in values)
+        queries = [q for _, q in values if q is not None]
+        report[name] = {
+            'requests': len(values),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'mean_queries': round(statistics.mean(queries), 1) if queries else None,
+        }
+    total = sum(len(values) for values in samples.values())
+    return {'scenarios': report, 'total_requests': total,
+            'throughput_rps': round(total / wall_seconds, 1) if wall_seconds else 0.0}
+
+
+def run_loadtest_in_process(app, scenarios, n_requests, user_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+    samples = {}
+    started = time.perf_counter()
+    for _ in range(n_requests):
+        for name, path in scenarios:
+            t0 = time.perf_counter()
+            response = client.get(path)
+            elapsed = (time.perf_counter() - t0) * 1000
+            if response.status_code != 200:
+                raise click.ClickException(f'{path} returned {response.status_code}')
+            samples.setdefault(name, []).append(
+                (elapsed, _server_timing_queries(response.headers.get('Server-Timing'))))
+    return samples, time.perf_counter() - started
+
+
+CSRF_TOKEN_PATTERN = re.compile(r'name="csrf_token" value="([^"]+)"')
+
+
+def login_form(html, username, password):
+    """The /login form fields, with the CSRF token taken from the login page's HTML."""
+    return {'username': username, 'password': password, 'csrf_token': CSRF_TOKEN_PATTERN.search(html).group(1)}
+
+
+def run_loadtest_http(base_url, scenarios, n_requests, concurrency, username, password):
+    def session():
+        opener = build_opener(HTTPCookieProcessor())
+        with opener.open(base_url + '/login') as response:
+            form = login_form(response.read().decode('utf-8'), username, password)
+        opener.open(base_url + '/login', data=urlencode(form).encode()).read()
+        return opener
+
+    openers = [session() for _ in range(concurrency)]
+
+    def worker(index):
+        opener, results = openers[index], []
+        for i in range(index, n_requests * len(scenarios), concurrency):
+            name, path = scenarios[i % len(scenarios)]
+            t0 = time.perf_counter()
+            with opener.open(base_url + path) as response:
+                response.read()
+                header = response.headers.get('Server-Timing')
+            results.append((name, (time.perf_counter() - t0) * 1000, _server_timing_queries(header)))
+        return results
+
+    samples = {}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for results in pool.map(worker, range(concurrency)):
+            for name, elapsed, queries in results:
+                samples.setdefault(name, []).append((elapsed, queries))
+    return samples, time.perf_counter() - started
+
+
+def start_gunicorn(app_module, workers, port):
+    """Launch gunicorn on 127.0.0.1:port against the current database and wait for it."""
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(APP_ROOT, 'gunicorn.conf.py'),
+         '--bind', f'127.0.0.1:{port}', '--workers', str(workers), app_module],
+        cwd=APP_ROOT, env=dict(os.environ, DATABASE_URL=db.engine.url.render_as_string(hide_password=False))
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise click.ClickException('gunicorn exited during start-up.')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise click.ClickException('gunicorn did not start listening within 30s.')
@@ -0,0 +1,248 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+
+from flask import request, session, g, current_app, make_response, message_flashed
+from flask_login import current_user
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+
+from . import db
+from .database import upsert
+from .models import Student, CacheVersion
+from .instrumentation import inc_metric
+
+
+def get_cache_version(name):
+    return db.session.query(CacheVersion.version).filter_by(name=name).scalar() or 0
+
+
+def bump_cache_version(name, connection=None):
+    """Increment a version stamp inside the caller's transaction.
+
+    Pass the `connection` from a mapper event, where the session is flushing.
+    """
+    versions = CacheVersion.__table__
+    now = datetime.utcnow()
+    (connection or db.session).execute(
+        upsert(versions, ('name',), lambda excluded: {'version': versions.c.version + 1, 'updated_at': now}),
+        {'name': name, 'version': 1, 'updated_at': now}
+    )
+
+
+def cache_stamps(*names):
+    """{name: (version, updated_at)} for several version stamps in one query."""
+    stamps = dict.fromkeys(names, (0, None))
+    stamps.update(
+        (name, (version, updated_at))
+        for name, version, updated_at in db.session.query(
+            CacheVersion.name, CacheVersion.version, CacheVersion.updated_at
+        ).filter(CacheVersion.name.in_(names))
+    )
+    return stamps
+
+
+def touch_students(reg_numbers=()):
+    """Mark students' pages, and the listings, as changed. Does not commit."""
+    if reg_numbers:
+        students = Student.__table__
+        db.session.execute(
+            students.update().where(students.c.reg_number.in_(list(reg_numbers))).values(
+                data_version=students.c.data_version + 1, updated_at=datetime.utcnow()
+            )
+        )
+    bump_cache_version('students')
+
+
+class LRUCache:
+    """Thread-safe in-process LRU with per-entry expiry; the default response cache."""
+
+    def __init__(self, max_entries=512, default_timeout=600):
+        self.max_entries = max_entries
+        self.default_timeout = default_timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + (timeout or self.default_timeout))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class NullCache:
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class RedisCache:
+    """Response cache shared by every worker; needs the redis package."""
+
+    def __init__(self, url, default_timeout=600, prefix='academy:page:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('RESPONSE_CACHE_URL points at Redis but the redis package is not installed.')
+        self._client = redis.Redis.from_url(url)
+        self.default_timeout = default_timeout
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self._client.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, timeout=None):
+        self._client.set(self.prefix + key, pickle.dumps(value), ex=timeout or self.default_timeout)
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self._client.scan_iter(match=self.prefix + '*'):
+            self._client.delete(key)
+
+
+def make_response_cache(url, max_entries=512, default_timeout=600, prefix='academy:page:'):
+    """Build the backend named by RESPONSE_CACHE_URL.
+
+    'memory://' (the default) is a per-process LRU, 'null://' disables
+    caching and redis:// URLs share one cache between workers. Any object
+    with get/set/delete/clear can be passed instead of a URL, e.g. a
+    stand-in for the shared backend in tests.
+    """
+    if not isinstance(url, str):
+        return url
+    if url in ('', 'memory://'):
+        return LRUCache(max_entries, default_timeout)
+    if url == 'null://':
+        return NullCache()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisCache(url, default_timeout, prefix)
+    raise ValueError(f'Unsupported cache URL {url!r}.')
+
+
+@message_flashed.connect
+def _note_flash(sender, message, category, **extra):
+    g.flashed = True
+
+
+def cached_page(stamp):
+    """Serve a GET view from the response cache while its version stamp is unchanged.
+
+    `stamp(**view_args)` returns (version, last_modified) for the data the
+    page shows, or None to bypass the cache. The version is part of the
+    cache key and the ETag, so bumping it invalidates both, and a matching
+    If-None-Match gets a 304 without rendering or a cache lookup. Pages are
+    not cached while flash messages are pending, since they would be baked in.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**view_args):
+            cache = current_app.extensions.get('response_cache')
+            if cache is None or request.method != 'GET' or '_flashes' in session:
+                return view(**view_args)
+            current = stamp(**view_args)
+            if current is None:
+                return view(**view_args)
+            version, last_modified = current
+            key = hashlib.sha1(json.dumps(
+                [request.endpoint, view_args, sorted(request.args.items(multi=True)), current_user.role, version],
+                default=str
+            ).encode('utf-8')).hexdigest()
+
+            if request.if_none_match.contains(key):
+                response = current_app.response_class(status=304)
+                inc_metric('academy_response_cache_total', {'result': 'not_modified'})
+            else:
+                cached = cache.get(key)
+                if cached is not None:
+                    body, mimetype = cached
+                    response = current_app.response_class(body, mimetype=mimetype)
+                    inc_metric('academy_response_cache_total', {'result': 'hit'})
+                else:
+                    response = make_response(view(**view_args))
+                    if response.status_code == 200 and not g.get('flashed'):
+                        cache.set(key, (response.get_data(), response.mimetype))
+                    inc_metric('academy_response_cache_total', {'result': 'miss'})
+            response.set_etag(key)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+def cache_fragment(name, key, caller):
+    """Template helper for `{% call cache_fragment(name, key) %}...{% endcall %}`.
+
+    Renders the block once per (name, key) and serves the HTML from the
+    fragment cache afterwards. The key has to cover everything the block
+    shows, normally a student's data_version plus any per-request values.
+    """
+    cache = current_app.extensions.get('fragment_cache')
+    if cache is None:
+        return caller()
+    cache_key = json.dumps([name, key], default=str)
+    html = cache.get(cache_key)
+    result = 'hit'
+    if html is None:
+        html = caller()
+        cache.set(cache_key, str(html))
+        result = 'miss'
+    stats = g.get('render_stats')
+    if stats is not None:
+        stats[result] += 1
+    return Markup(html)
+
+
+def make_bytecode_cache(directory):
+    """Jinja bytecode cache in `directory`, so new workers skip compiling templates; None when blank."""
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    return FileSystemBytecodeCache(directory, pattern='academy-%s.cache')
+
+
+def preload_templates(app):
+    """Load every template into the worker's Jinja cache; returns how many there are."""
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
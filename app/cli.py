@@ -0,0 +1,656 @@
+import csv
+import json
+import os
+import re
+import secrets
+import signal
+import socket
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from werkzeug.security import generate_password_hash
+
+from . import db
+from .models import User, Student, Payment, Job, Rollover, ArchivedYear, academic_year_start, parse_date
+from .archive import archive_academic_year, closed_academic_years, restore_academic_year
+from .assets import build_assets
+from .auth import hash_password, hash_prefix, load_cached_user, verify_password
+from .bench import (HOT_QUERY_INDEXES, benchmark_hot_queries, generate_school_data, loadtest_scenarios, login_form,
+                    run_loadtest_http, run_loadtest_in_process, seed_benchmark_data, start_gunicorn, summarise_timings)
+from .cache import LRUCache, make_bytecode_cache, touch_students
+from .documents import write_receipts_zip, write_statements_zip
+from .fees import get_current_school_period
+from .imports import import_payments, import_students, iter_import_rows
+from .jobs import JOB_HANDLERS, claim_next_job, enqueue_job, purge_finished_jobs, requeue_stale_jobs, run_job, touch_job
+from .ledger import rebuild_balances, rebuild_daily_collections, refresh_class_term_summaries, verify_balances
+from .rollover import apply_rollover, class_ladder, revert_rollover, rollover_plan, student_periods
+from .students import invalidate_student_facets, rebuild_search_index, search_backend
+
+
+search_cli = AppGroup('search', help='Manage the student search index.')
+
+
+@search_cli.command('rebuild')
+def search_rebuild_command():
+    """Create the search objects if missing and re-index every student."""
+    rebuild_search_index()
+    click.echo(f'Search index rebuilt ({search_backend()}).')
+
+
+ledger_cli = AppGroup('ledger', help='Maintain the per-student/term balance ledger.')
+
+
+@ledger_cli.command('rebuild')
+def ledger_rebuild_command():
+    """Recompute every ledger row from the payments table."""
+    rows = rebuild_balances()
+    click.echo(f'Rebuilt {rows} balance rows.')
+
+
+@ledger_cli.command('verify')
+def ledger_verify_command():
+    """Reconcile the ledger against the payments table; exits 1 on drift."""
+    problems = verify_balances()
+    for problem in problems:
+        click.echo(problem)
+    if problems:
+        click.echo(f'{len(problems)} mismatches found. Run "flask ledger rebuild" to repair.')
+        raise SystemExit(1)
+    click.echo('Ledger matches payments.')
+
+
+rollups_cli = AppGroup('rollups', help='Maintain the dashboard summary tables.')
+
+
+@rollups_cli.command('rebuild')
+def rollups_rebuild_command():
+    """Recompute class/term summaries and daily collections from scratch."""
+    refresh_class_term_summaries()
+    days = rebuild_daily_collections()
+    db.session.commit()
+    click.echo(f'Rebuilt class/term summaries and {days} daily collection rows.')
+
+
+rollover_cli = AppGroup('rollover', help='Move students on to the next term, promoting classes at year end.')
+
+
+def _default_rollover_period(academic_year, term):
+    if academic_year and term:
+        return academic_year, term
+    periods = student_periods()
+    if not periods:
+        raise click.ClickException('There are no students to roll over.')
+    busiest = max(periods, key=lambda row: row[2])
+    return academic_year or busiest[0], term or busiest[1]
+
+
+def _echo_rollover_plan(plan):
+    click.echo(f"{plan['from_term']} {plan['from_year']} -> {plan['to_term']} {plan['to_year']}"
+               f"{' (with promotion)' if plan['promote'] else ''}")
+    for old, new, count in plan['moves']:
+        click.echo(f'  {old or "(no class)":<12} -> {new or "(no class)":<12} {count:>7}')
+    click.echo(f"{plan['students']} students move, {plan['promoted']} of them up a class.")
+    if plan['graduating']:
+        click.echo(f"{plan['graduating']} students finish {class_ladder()[-1]} and are left in place.")
+
+
+@rollover_cli.command('preview')
+@click.option('--year', 'academic_year', help='Academic year to roll over from. Defaults to the one most students are in.')
+@click.option('--term', help='Term to roll over from. Defaults to the one most students are in.')
+@click.option('--hold', 'held', multiple=True, metavar='REG_NUMBER', help='Student who repeats their class; repeatable.')
+def rollover_preview_command(academic_year, term, held):
+    """Show what `flask rollover apply` would move, without changing anything."""
+    try:
+        _echo_rollover_plan(rollover_plan(*_default_rollover_period(academic_year, term), held))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+
+@rollover_cli.command('apply')
+@click.option('--year', 'academic_year', help='Academic year to roll over from. Defaults to the one most students are in.')
+@click.option('--term', help='Term to roll over from. Defaults to the one most students are in.')
+@click.option('--hold', 'held', multiple=True, metavar='REG_NUMBER', help='Student who repeats their class; repeatable.')
+@click.option('--yes', is_flag=True, help='Do not ask for confirmation.')
+def rollover_apply_command(academic_year, term, held, yes):
+    """Move students on to the next term or year."""
+    academic_year, term = _default_rollover_period(academic_year, term)
+    try:
+        _echo_rollover_plan(rollover_plan(academic_year, term, held))
+        if not yes:
+            click.confirm('Apply this rollover?', abort=True)
+        rollover = apply_rollover(academic_year, term, held=held)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Rollover #{rollover.id} moved {rollover.student_count} students.')
+
+
+@rollover_cli.command('revert')
+@click.argument('rollover_id', type=int, required=False)
+def rollover_revert_command(rollover_id):
+    """Undo the most recent rollover."""
+    try:
+        rollover = revert_rollover(rollover_id)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Reverted rollover #{rollover.id}: {rollover.reverted_count} students moved back.')
+
+
+@rollover_cli.command('list')
+@click.option('--limit', default=20, show_default=True)
+def rollover_list_command(limit):
+    """Show the most recent rollovers."""
+    for rollover in Rollover.query.order_by(Rollover.id.desc()).limit(limit):
+        reverted = f'reverted {rollover.reverted_at:%Y-%m-%d %H:%M}' if rollover.reverted_at else ''
+        click.echo(f'{rollover.id:>5} {rollover.created_at:%Y-%m-%d %H:%M} '
+                   f'{rollover.from_term} {rollover.from_year} -> {rollover.to_term} {rollover.to_year} '
+                   f'{rollover.student_count:>7} students {reverted}')
+
+
+archive_cli = AppGroup('archive', help='Move closed academic years out of the payments table.')
+
+
+@archive_cli.command('close')
+@click.argument('years', nargs=-1)
+@click.option('--keep', 'keep_years', type=int, help='Years to leave in the payments table. Defaults to ARCHIVE_KEEP_YEARS.')
+@click.option('--dry-run', is_flag=True, help='List the years that would be archived.')
+def archive_close_command(years, keep_years, dry_run):
+    """Archive YEARS, or every year older than the newest --keep years."""
+    if not years:
+        years = closed_academic_years(keep_years or current_app.config['ARCHIVE_KEEP_YEARS'])
+    if not years:
+        click.echo('No academic years to archive.')
+        return
+    for academic_year in years:
+        if dry_run:
+            count = Payment.query.filter_by(academic_year=academic_year).count()
+            click.echo(f'{academic_year}: {count} payments would be archived.')
+            continue
+        try:
+            moved = archive_academic_year(academic_year)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        click.echo(f'{academic_year}: archived {moved} payments.')
+
+
+@archive_cli.command('restore')
+@click.argument('academic_year')
+def archive_restore_command(academic_year):
+    """Move an archived year's payments back into the payments table."""
+    try:
+        moved = restore_academic_year(academic_year)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'{academic_year}: restored {moved} payments.')
+
+
+@archive_cli.command('list')
+def archive_list_command():
+    """Show the archived academic years."""
+    years = sorted(ArchivedYear.query, key=lambda year: academic_year_start(year.academic_year) or 0)
+    for year in years:
+        click.echo(f'{year.academic_year} {year.payments:>9} payments {year.amount:>16,.2f} '
+                   f'archived {year.archived_at:%Y-%m-%d %H:%M}')
+    if not years:
+        click.echo('No academic years have been archived.')
+
+
+import_cli = AppGroup('import', help='Bulk-load students or payments from CSV/XLSX files.')
+
+
+def _echo_import_report(report, errors_path):
+    click.echo(f"Inserted {report['inserted']} rows, {len(report['errors'])} rejected.")
+    if report['errors'] and errors_path:
+        with open(errors_path, 'w', newline='') as fh:
+            writer = csv.writer(fh)
+            writer.writerow(['line', 'reg_number', 'error'])
+            writer.writerows(report['errors'])
+        click.echo(f'Error report written to {errors_path}')
+    else:
+        for line_number, reg_number, message in report['errors'][:20]:
+            click.echo(f'  line {line_number} ({reg_number}): {message}')
+
+
+@import_cli.command('students')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False), help='Write rejected rows to this CSV.')
+def import_students_command(path, batch_size, errors_path):
+    """Import students from a CSV or XLSX file."""
+    with open(path, 'rb') as fh:
+        report = import_students(iter_import_rows(fh, path), batch_size=batch_size)
+    _echo_import_report(report, errors_path)
+
+
+@import_cli.command('payments')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--recorded-by', required=True, help='Username the payments are recorded under.')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False), help='Write rejected rows to this CSV.')
+def import_payments_command(path, recorded_by, batch_size, errors_path):
+    """Import payments from a CSV or XLSX file."""
+    user = User.query.filter_by(username=recorded_by).first()
+    if user is None:
+        raise click.BadParameter(f'No user named {recorded_by}.', param_hint='--recorded-by')
+    with open(path, 'rb') as fh:
+        report = import_payments(iter_import_rows(fh, path), user.id, batch_size=batch_size)
+    _echo_import_report(report, errors_path)
+
+
+def _heartbeat(app, stop, state, interval):
+    """Keep heartbeat_at fresh for the job being run, even through long single statements.
+
+    Not used on SQLite, where a write from this thread could invalidate the
+    handler's open transaction; progress() calls are the heartbeat there.
+    """
+    with app.app_context():
+        while not stop.wait(interval):
+            if state.get('job_id') is not None:
+                touch_job(state['job_id'])
+
+
+jobs_cli = AppGroup('jobs', help='Run and inspect background jobs.')
+
+
+@jobs_cli.command('worker')
+@click.option('--once', is_flag=True, help='Exit once the queue is empty instead of polling.')
+@click.option('--poll-interval', type=float, help='Seconds between polls of an empty queue. Defaults to JOBS_POLL_INTERVAL.')
+def jobs_worker_command(once, poll_interval):
+    """Claim and run queued jobs until stopped (SIGTERM/SIGINT finish the current job first)."""
+    config = current_app.config
+    poll_interval = poll_interval or config['JOBS_POLL_INTERVAL']
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+    stopping = threading.Event()
+    state = {'job_id': None}
+
+    def stop(signum, frame):
+        click.echo(f'{worker}: stopping after the current job')
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    if db.engine.dialect.name != 'sqlite':
+        threading.Thread(target=_heartbeat, daemon=True, args=(
+            current_app._get_current_object(), stopping, state, max(5, config['JOBS_STALE_SECONDS'] // 4)
+        )).start()
+
+    click.echo(f'{worker}: waiting for jobs')
+    next_housekeeping = 0.0
+    while not stopping.is_set():
+        if time.monotonic() >= next_housekeeping:
+            requeued, failed = requeue_stale_jobs(config['JOBS_STALE_SECONDS'], config['JOBS_MAX_ATTEMPTS'])
+            purged = purge_finished_jobs(config['JOBS_RETENTION_DAYS'])
+            if requeued or failed or purged:
+                click.echo(f'{worker}: requeued {requeued}, failed {failed} stale jobs; purged {purged}')
+            next_housekeeping = time.monotonic() + 300
+        job_id = claim_next_job(worker)
+        if job_id is None:
+            if once:
+                break
+            stopping.wait(poll_interval)
+            continue
+        state['job_id'] = job_id
+        job = run_job(job_id)
+        state['job_id'] = None
+        click.echo(f'{worker}: job {job_id} ({job.kind}) {job.status}')
+        db.session.remove()
+    stopping.set()
+
+
+@jobs_cli.command('enqueue')
+@click.argument('kind', type=click.Choice(sorted(JOB_HANDLERS)))
+@click.option('--param', 'params', multiple=True, metavar='KEY=VALUE', help='Job parameter; repeatable.')
+def jobs_enqueue_command(kind, params):
+    """Queue a job, e.g. a nightly `reconcile_ledger` from cron."""
+    job = enqueue_job(kind, dict(param.split('=', 1) for param in params))
+    click.echo(f'Queued job {job.id} ({kind}).')
+
+
+@jobs_cli.command('list')
+@click.option('--limit', default=20, show_default=True)
+def jobs_list_command(limit):
+    """Show the most recent jobs."""
+    for job in Job.query.order_by(Job.id.desc()).limit(limit):
+        click.echo(f'{job.id:>6} {job.kind:<18} {job.status:<8} {job.progress:>3}% '
+                   f'{job.created_at:%Y-%m-%d %H:%M} {job.message or ""}')
+
+
+documents_cli = AppGroup('documents', help='Print fee receipts and term statements.')
+
+
+@documents_cli.command('statements')
+@click.option('--class', 'classes', multiple=True, help='Class to print; repeatable. Defaults to every class.')
+@click.option('--year', 'academic_year', help='Academic year of the statements. Defaults to the current one.')
+@click.option('--term', help='Term of the statements. Defaults to the current one.')
+@click.option('--output', required=True, type=click.Path(dir_okay=False), help='ZIP file to write.')
+@click.option('--workers', type=int, help='Rendering processes. Defaults to DOCUMENT_WORKERS.')
+def documents_statements_command(classes, academic_year, term, output, workers):
+    """Write a PDF term statement for every student, a folder per class."""
+    current_academic_year, current_term = get_current_school_period()
+    academic_year, term = academic_year or current_academic_year, term or current_term
+    workers = workers or current_app.config['DOCUMENT_WORKERS']
+    query = Student.query.filter(Student.student_class.in_(classes)) if classes else Student.query
+    started = time.perf_counter()
+    with open(output, 'wb') as fh:
+        count = write_statements_zip(fh, query, academic_year, term, workers,
+                                     lambda done, total, message: click.echo(message))
+    click.echo(f'Wrote {count:,} statements for {term} {academic_year} to {output} '
+               f'in {time.perf_counter() - started:.1f} s ({workers} workers).')
+
+
+@documents_cli.command('receipts')
+@click.option('--batch', 'batch_id', type=int, help='Payment batch to print.')
+@click.option('--date', 'payment_date', help='Print every payment taken on this day (YYYY-MM-DD).')
+@click.option('--output', required=True, type=click.Path(dir_okay=False), help='ZIP file to write.')
+@click.option('--workers', type=int, help='Rendering processes. Defaults to DOCUMENT_WORKERS.')
+def documents_receipts_command(batch_id, payment_date, output, workers):
+    """Write the PDF receipts of one payment batch or one day's payments."""
+    if (batch_id is None) == (payment_date is None):
+        raise click.UsageError('Give one of --batch or --date.')
+    if batch_id is not None:
+        condition = Payment.batch_id == batch_id
+    else:
+        try:
+            condition = Payment.payment_date == parse_date(payment_date)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint='--date')
+    workers = workers or current_app.config['DOCUMENT_WORKERS']
+    started = time.perf_counter()
+    with open(output, 'wb') as fh:
+        count = write_receipts_zip(fh, condition, workers)
+    click.echo(f'Wrote {count:,} receipts to {output} in {time.perf_counter() - started:.1f} s.')
+
+
+@click.command('bench-indexes')
+@click.option('--database-url', help='Scratch database to benchmark against (its tables are dropped). Defaults to a temporary SQLite file.')
+@click.option('--students', 'n_students', default=5000, show_default=True)
+@click.option('--payments', 'n_payments', default=20000, show_default=True)
+@click.option('--repeat', default=20, show_default=True)
+@click.option('--output', type=click.Path(dir_okay=False), help='Write the full report, plans included, as JSON.')
+def bench_indexes_command(database_url, n_students, n_payments, repeat, output):
+    """Seed a scratch database and time the hot queries before and after the indexes."""
+    if database_url is None:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.sqlite')
+    engine = db.create_engine(database_url)
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for index in HOT_QUERY_INDEXES:
+            index.drop(connection)
+        click.echo(f'Seeding {n_students} students and {n_payments} payments into {engine.url.render_as_string()}')
+        seed_benchmark_data(connection, n_students, n_payments)
+
+    report = {'dialect': engine.dialect.name, 'students': n_students, 'payments': n_payments}
+    report['before'] = benchmark_hot_queries(engine, repeat)
+    with engine.begin() as connection:
+        for index in HOT_QUERY_INDEXES:
+            index.create(connection)
+        connection.exec_driver_sql('ANALYZE')
+    report['after'] = benchmark_hot_queries(engine, repeat)
+    db.metadata.drop_all(engine)
+
+    click.echo(f"{'query':<20}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for name, before in report['before'].items():
+        after = report['after'][name]
+        speedup = before['median_ms'] / after['median_ms'] if after['median_ms'] else float('inf')
+        click.echo(f"{name:<20}{before['median_ms']:>12.3f}{after['median_ms']:>12.3f}{speedup:>9.1f}x")
+        click.echo(f"    before: {' | '.join(before['plan'])}")
+        click.echo(f"    after:  {' | '.join(after['plan'])}")
+    if output:
+        with open(output, 'w') as fh:
+            json.dump(report, fh, indent=2)
+
+
+@click.command('seed-demo')
+@with_appcontext
+@click.option('--students', 'n_students', default=5000, show_default=True)
+@click.option('--years', 'n_years', default=3, show_default=True)
+@click.option('--seed', default=42, show_default=True)
+@click.option('--batch-size', default=5000, show_default=True)
+def seed_demo_command(n_students, n_years, seed, batch_size):
+    """Fill the database with a synthetic school for load testing."""
+    bursar = User.query.filter_by(username='bursar').first()
+    if bursar is None:
+        bursar = User(username='bursar', password=hash_password('bursar'), role='admin')
+        db.session.add(bursar)
+        db.session.commit()
+
+    batches = {'student': [], 'payment': []}
+    counts = {'student': 0, 'payment': 0}
+
+    def flush(kind):
+        if batches[kind]:
+            table = Student.__table__ if kind == 'student' else Payment.__table__
+            db.session.execute(table.insert(), batches[kind])
+            counts[kind] += len(batches[kind])
+            batches[kind] = []
+
+    started = time.perf_counter()
+    for kind, row in generate_school_data(n_students, n_years, seed):
+        if kind == 'payment':
+            row['recorded_by'] = bursar.id
+        batches[kind].append(row)
+        if len(batches[kind]) >= batch_size:
+            flush('student')
+            flush('payment')
+    flush('student')
+    flush('payment')
+    db.session.commit()
+    rebuild_balances()
+    rebuild_daily_collections()
+    touch_students()
+    db.session.commit()
+    invalidate_student_facets()
+    click.echo(f"Inserted {counts['student']} students and {counts['payment']} payments "
+               f"in {time.perf_counter() - started:.1f}s (user 'bursar', password 'bursar').")
+
+
+@click.command('loadtest')
+@with_appcontext
+@click.option('--requests', 'n_requests', default=20, show_default=True, help='Rounds through every scenario.')
+@click.option('--gunicorn', 'use_gunicorn', is_flag=True, help='Drive a real gunicorn server instead of the test client.')
+@click.option('--app-module', default='app:create_app()', show_default=True)
+@click.option('--workers', default=2, show_default=True)
+@click.option('--concurrency', default=4, show_default=True)
+@click.option('--port', default=8765, show_default=True)
+@click.option('--username', default='bursar', show_default=True)
+@click.option('--password', default='bursar', show_default=True)
+@click.option('--output', type=click.Path(dir_okay=False), help='Write the report as JSON.')
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False), help='Earlier --output report to compare p95s against.')
+def loadtest_command(n_requests, use_gunicorn, app_module, workers, concurrency, port, username, password, output, baseline):
+    """Measure latency percentiles, throughput and query counts per page."""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f'No user {username}; run "flask seed-demo" first.')
+    scenarios = loadtest_scenarios()
+    db.session.remove()
+
+    if use_gunicorn:
+        process = start_gunicorn(app_module, workers, port)
+        try:
+            samples, wall = run_loadtest_http(f'http://127.0.0.1:{port}', scenarios, n_requests,
+                                              concurrency, username, password)
+        finally:
+            process.terminate()
+            process.wait()
+    else:
+        # A request reuses an already-pushed app context, which would share g
+        # and the session identity map across requests; a thread starts clean.
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            samples, wall = pool.submit(
+                run_loadtest_in_process, current_app._get_current_object(), scenarios, n_requests, user.id
+            ).result()
+
+    report = summarise_timings(samples, wall)
+    report['mode'] = 'gunicorn' if use_gunicorn else 'test_client'
+    report['students'] = Student.query.count()
+
+    previous = {}
+    if baseline:
+        with open(baseline) as fh:
+            previous = json.load(fh).get('scenarios', {})
+    click.echo(f"{report['mode']}: {report['students']} students, {report['total_requests']} requests, "
+               f"{report['throughput_rps']} req/s")
+    click.echo(f"{'scenario':<20}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>10}")
+    for name, stats in report['scenarios'].items():
+        line = (f"{name:<20}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}"
+                f"{stats['mean_queries'] if stats['mean_queries'] is not None else '-':>10}")
+        if name in previous and previous[name]['p95_ms']:
+            change = (stats['p95_ms'] - previous[name]['p95_ms']) / previous[name]['p95_ms'] * 100
+            line += f"   p95 {change:+.0f}% vs baseline"
+        click.echo(line)
+    if output:
+        with open(output, 'w') as fh:
+            json.dump(report, fh, indent=2)
+
+
+assets_cli = AppGroup('assets', help='Build fingerprinted, precompressed static files.')
+
+
+@assets_cli.command('build')
+def assets_build_command():
+    """Hash, compress and resize everything in app/static into ASSET_DIST_DIR."""
+    dist_dir = current_app.config['ASSET_DIST_DIR']
+    manifest = build_assets(current_app.static_folder, dist_dir, current_app.config['ASSET_IMAGE_WIDTHS'])
+    for name, hashed in sorted(manifest['files'].items()):
+        size = os.path.getsize(os.path.join(dist_dir, hashed))
+        compressed = ', '.join(
+            f"{suffix[1:]} {os.path.getsize(os.path.join(dist_dir, hashed + suffix)):,}"
+            for suffix in manifest['encodings'].get(hashed, ())
+        )
+        variants = len(manifest['variants'].get(name, ()))
+        click.echo(f"{name:<32} {size:>9,} bytes{f' ({compressed})' if compressed else ''}"
+                   f"{f', {variants} variants' if variants else ''}")
+    click.echo(f"Wrote {len(manifest['files'])} files to {dist_dir}.")
+
+
+def _median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+@click.command('bench-login')
+@click.option('--method', 'methods', multiple=True,
+              help='Hash method to time, e.g. scrypt or pbkdf2:sha256:600000; repeatable. Defaults to PASSWORD_HASH_METHOD.')
+@click.option('--repeat', default=10, show_default=True)
+@with_appcontext
+def bench_login_command(methods, repeat):
+    """Time password hashing, the login request and the user loader.
+
+    A throwaway user is created for the login timings and removed afterwards.
+    """
+    methods = methods or (current_app.config['PASSWORD_HASH_METHOD'],)
+    click.echo(f"{'method':<28}{'hash ms':>10}{'verify ms':>11}")
+    for method in methods:
+        stored = generate_password_hash('bench-password', method=method)
+        click.echo(f"{hash_prefix(method):<28}"
+                   f"{_median_ms(lambda: generate_password_hash('bench-password', method=method), repeat):>10.1f}"
+                   f"{_median_ms(lambda: verify_password(stored, 'bench-password'), repeat):>11.1f}")
+
+    username = f'bench-login-{secrets.token_hex(4)}'
+    user = User(username=username, password=hash_password('bench-password'), role='user')
+    db.session.add(user)
+    db.session.commit()
+    user_id = user.id
+    try:
+        client = current_app.test_client()
+        form = login_form(client.get('/login').get_data(as_text=True), username, 'bench-password')
+
+        def login():
+            client.post('/login', data=form)
+            client.get('/logout')
+
+        click.echo(f"login POST: {_median_ms(login, repeat):.1f} ms median over {repeat}")
+        cache = current_app.extensions['user_cache']
+        with current_app.test_request_context():
+            def uncached():
+                cache.delete(user_id)
+                load_cached_user(user_id)
+                db.session.expunge_all()
+
+            def cached():
+                load_cached_user(user_id)
+                db.session.expunge_all()
+
+            cached()
+            click.echo(f"user loader: {_median_ms(uncached, repeat * 10):.3f} ms uncached, "
+                       f"{_median_ms(cached, repeat * 10):.3f} ms cached")
+    finally:
+        db.session.rollback()
+        User.query.filter_by(id=user_id).delete()
+        db.session.commit()
+
+
+def _render_ms(client, path):
+    response = client.get(path)
+    if response.status_code != 200:
+        raise click.ClickException(f'{path} returned {response.status_code}')
+    return float(re.search(r'render;dur=([\d.]+)', response.headers['Server-Timing']).group(1))
+
+
+@click.command('bench-templates')
+@click.option('--rows', default=50, show_default=True, help='Students per listing page.')
+@click.option('--repeat', default=20, show_default=True)
+@with_appcontext
+def bench_templates_command(rows, repeat):
+    """Time template compilation and /students rendering with the fragment cache cold and warm.
+
+    Rendering is read from the Server-Timing header, with the response
+    cache switched off so every request renders. A throwaway admin user is
+    created for the requests and removed afterwards.
+    """
+    app = current_app._get_current_object()
+    names = app.jinja_env.list_templates(extensions=['html'])
+
+    def compile_all(bytecode_cache=None):
+        environment = app.jinja_env.overlay(bytecode_cache=bytecode_cache, cache_size=0)
+        for name in names:
+            environment.get_template(name)
+
+    with tempfile.TemporaryDirectory() as directory:
+        bytecode_cache = make_bytecode_cache(directory)
+        compile_all(bytecode_cache)
+        click.echo(f"{len(names)} templates: {_median_ms(compile_all, repeat):.1f} ms compiled, "
+                   f"{_median_ms(lambda: compile_all(bytecode_cache), repeat):.1f} ms from bytecode cache")
+
+    username = f'bench-templates-{secrets.token_hex(4)}'
+    user = User(username=username, password=hash_password(secrets.token_hex(8)), role='admin')
+    db.session.add(user)
+    db.session.commit()
+    user_id = user.id
+    response_cache, configured_fragment_cache = app.extensions.get('response_cache'), app.extensions.get('fragment_cache')
+    fragment_cache = configured_fragment_cache or LRUCache(rows * 4)
+    app.extensions['response_cache'] = None
+    try:
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user_id)
+            sess['_fresh'] = True
+        path = f'/students?page_size={rows}'
+        timings = {}
+        for label, cache, clear in (('no fragment cache', None, False), ('cold fragments', fragment_cache, True),
+                                    ('warm fragments', fragment_cache, False)):
+            app.extensions['fragment_cache'] = cache
+            _render_ms(client, path)
+            samples = []
+            for _ in range(repeat):
+                if clear:
+                    cache.clear()
+                samples.append(_render_ms(client, path))
+            timings[label] = statistics.median(samples)
+        click.echo(f"/students render, {rows} rows: " + ', '.join(f'{ms:.1f} ms {label}' for label, ms in timings.items()))
+    finally:
+        app.extensions['response_cache'] = response_cache
+        app.extensions['fragment_cache'] = configured_fragment_cache
+        db.session.rollback()
+        User.query.filter_by(id=user_id).delete()
+        db.session.commit()
@@ -0,0 +1,75 @@
+from flask import request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+
+from . import db
+
+
+# Engine profiles. Postgres gets a sized, pre-pinged, recycled pool; SQLite
+# gets WAL and friends at connect time plus BEGIN IMMEDIATE for writes, which
+# is what actually stops concurrent payment entry failing with "database is
+# locked": a deferred transaction that reads before it writes cannot wait
+# for the lock, busy_timeout or not.
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def engine_options(database_uri, config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the database behind `database_uri`."""
+    if database_uri.startswith('sqlite'):
+        # The pysqlite dialect already uses a QueuePool without the
+        # same-thread check for file databases; the tuning is in the pragmas.
+        return {}
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': True,
+    }
+
+
+def configure_sqlite_engine(engine, config):
+    """Connect-time pragmas and explicit BEGIN handling for a SQLite engine."""
+    in_memory = engine.url.database in (None, '', ':memory:')
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_SIZE'])}",
+    ]
+    if not in_memory:
+        pragmas.insert(0, 'PRAGMA journal_mode = WAL')
+
+    @event.listens_for(engine, 'connect')
+    def _sqlite_on_connect(dbapi_connection, connection_record):
+        # Take transaction control away from the sqlite3 module so the
+        # 'begin' hook below decides how each transaction starts.
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    @event.listens_for(engine, 'begin')
+    def _sqlite_on_begin(connection):
+        if connection.get_execution_options().get('isolation_level') == 'AUTOCOMMIT':
+            return
+        # Only web writes take the lock up front. CLI sessions often sit on a
+        # transaction for a while and must not block the site or each other.
+        writing = has_request_context() and request.method not in SAFE_METHODS
+        connection.exec_driver_sql('BEGIN IMMEDIATE' if writing and config['SQLITE_BEGIN_IMMEDIATE'] else 'BEGIN')
+
+
+def upsert(table, key_columns, set_):
+    """INSERT into `table` that updates the existing row when `key_columns` collide.
+
+    `set_` receives the statement's `excluded` namespace and returns the
+    column assignments for the conflict case, e.g. paid = paid + excluded.paid.
+    SQLite and PostgreSQL both support ON CONFLICT DO UPDATE, so concurrent
+    first writes to a key add up instead of one of them failing on the
+    unique constraint.
+    """
+    dialect = postgresql if db.session.get_bind().dialect.name == 'postgresql' else sqlite
+    statement = dialect.insert(table)
+    return statement.on_conflict_do_update(
+        index_elements=[table.c[name] for name in key_columns], set_=set_(statement.excluded)
+    )
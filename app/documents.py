@@ -0,0 +1,439 @@
+import io
+import multiprocessing
+import re
+import tempfile
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import date
+
+from flask import current_app
+from sqlalchemy.orm import aliased
+
+from . import db
+from .models import (User, Student, Payment, StudentBalance, PaymentArchive, ArchivedYear, academic_year_start,
+                     term_ordinal)
+from .cache import NullCache
+from .fees import expected_fee, format_currency_filter
+from .instrumentation import inc_metric
+from .jobs import job_handler
+from .ledger import fee_breakdown_from_balances
+from .students import filter_students
+
+
+# Fee documents. Receipts and term statements are PDFs from a small built-in
+# writer (the standard Helvetica fonts, nothing embedded), so printing needs
+# no extra packages. Rendering works on plain dicts fetched in bulk up front,
+# which is what lets a whole class be spread across a process pool and
+# written into a ZIP one file at a time.
+SCHOOL_NAME = "Alfurqan Academy Mai'adua"
+PDF_PAGE_SIZE = (595, 842)  # A4, in points
+PDF_MARGIN = 50
+# Helvetica advance widths in 1/1000 em for ASCII 32-126, for right-aligning
+# amounts; the bold face is slightly wider, which headings can live with.
+HELVETICA_WIDTHS = dict(zip(map(chr, range(32, 127)), (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556, 1015,
+    667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778, 667, 778, 722, 667, 611, 722, 667,
+    944, 667, 667, 611, 278, 278, 278, 469, 556, 333,
+    556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556, 556, 556, 333, 500, 278, 556, 500,
+    722, 500, 500, 500, 334, 260, 334, 584,
+)))
+
+
+def _pdf_string(value):
+    data = str(value).encode('cp1252', 'replace')
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def text_width(value, size):
+    return sum(HELVETICA_WIDTHS.get(char, 556) for char in str(value)) * size / 1000
+
+
+class PdfDocument:
+    """Just enough PDF for printed forms: Helvetica text and ruled lines on A4 pages.
+
+    Positions are in points from the top-left corner. The output carries no
+    timestamps, so the same document always renders to the same bytes.
+    """
+
+    def __init__(self, title=''):
+        self.title = title
+        self.pages = []
+
+    def add_page(self):
+        self.pages.append([])
+
+    def text(self, x, y, value, size=10, bold=False, align='left'):
+        if align == 'right':
+            x -= text_width(value, size)
+        elif align == 'center':
+            x -= text_width(value, size) / 2
+        self.pages[-1].append(b'BT /%s %g Tf %.2f %.2f Td %s Tj ET' % (
+            b'F2' if bold else b'F1', size, x, PDF_PAGE_SIZE[1] - y, _pdf_string(value)))
+
+    def rule(self, x1, y, x2, width=0.5):
+        y = PDF_PAGE_SIZE[1] - y
+        self.pages[-1].append(b'%g w %.2f %.2f m %.2f %.2f l S' % (width, x1, y, x2, y))
+
+    def to_bytes(self):
+        objects = [
+            b'<< /Type /Catalog /Pages 2 0 R >>',
+            None,  # the page tree, filled in once the pages are numbered
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+            b'<< /Title %s /Creator %s >>' % (_pdf_string(self.title), _pdf_string(SCHOOL_NAME)),
+        ]
+        kids = []
+        for operations in self.pages:
+            stream = zlib.compress(b'\n'.join(operations))
+            objects.append(b'<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (len(stream), stream))
+            objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R '
+                           b'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> >>' % (*PDF_PAGE_SIZE, len(objects)))
+            kids.append(b'%d 0 R' % len(objects))
+        objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(kids), len(kids))
+
+        out = io.BytesIO()
+        out.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(out.tell())
+            out.write(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+        xref = out.tell()
+        out.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+        out.write(b''.join(b'%010d 00000 n \n' % offset for offset in offsets))
+        out.write(b'trailer\n<< /Size %d /Root 1 0 R /Info 5 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (
+            len(objects) + 1, xref))
+        return out.getvalue()
+
+
+def _pdf_header(pdf, heading, details):
+    """Start a page with the school name, `heading` and label/value rows; returns the y to continue at."""
+    pdf.add_page()
+    left, right = PDF_MARGIN, PDF_PAGE_SIZE[0] - PDF_MARGIN
+    pdf.text(left, 60, SCHOOL_NAME, size=16, bold=True)
+    pdf.text(right, 60, heading, size=14, bold=True, align='right')
+    pdf.rule(left, 72, right, width=1)
+    y = 96
+    for label, value in details:
+        pdf.text(left, y, label, bold=True)
+        pdf.text(left + 110, y, value)
+        y += 16
+    return y + 14
+
+
+def _pdf_table(pdf, y, title, columns, rows):
+    """Draw a titled table of (heading, x, align) columns, carrying on over new pages; returns the next y."""
+    left, right = PDF_MARGIN, PDF_PAGE_SIZE[0] - PDF_MARGIN
+
+    def headings(y):
+        for heading, x, align in columns:
+            pdf.text(x, y, heading, bold=True, align=align)
+        pdf.rule(left, y + 5, right)
+        return y + 20
+
+    pdf.text(left, y, title, size=12, bold=True)
+    y = headings(y + 22)
+    for row in rows:
+        if y > PDF_PAGE_SIZE[1] - PDF_MARGIN:
+            pdf.add_page()
+            y = headings(PDF_MARGIN + 10)
+        for (_, x, align), value in zip(columns, row):
+            if value != '':
+                pdf.text(x, y, value, align=align)
+        y += 16
+    return y + 10
+
+
+def receipt_number(payment_id):
+    return f'R{payment_id:07d}'
+
+
+def safe_filename(value):
+    """A file name component: anything but letters, digits, dots and dashes becomes a dash."""
+    return re.sub(r'[^\w.-]+', '-', value or '').strip('-') or 'none'
+
+
+def receipt_data(condition, model=Payment):
+    """Receipt dicts for the payments matching `condition`, in id order, from two queries.
+
+    Paid to date counts the term's payments up to and including each one,
+    so a reprint shows the figures of the day it was taken. Pass
+    model=PaymentArchive, with a condition on it, for payments in a closed
+    year; their whole term is archived together.
+    """
+    earlier = aliased(model)
+    paid_to_date = dict(db.session.query(model.id, db.func.sum(earlier.amount_paid)).join(
+        earlier, db.and_(earlier.student_reg_number == model.student_reg_number,
+                         earlier.academic_year == model.academic_year, earlier.term == model.term,
+                         earlier.id <= model.id)
+    ).filter(condition).group_by(model.id))
+    # The class and fee are the ones the term was priced at, which a later
+    # promotion does not change.
+    rows = db.session.query(
+        model, Student.name, db.func.coalesce(StudentBalance.student_class, Student.student_class),
+        StudentBalance.expected, Student.data_version, User.username
+    ).join(
+        Student, Student.reg_number == model.student_reg_number
+    ).outerjoin(StudentBalance, db.and_(
+        StudentBalance.student_reg_number == model.student_reg_number,
+        StudentBalance.academic_year == model.academic_year,
+        StudentBalance.term == model.term
+    )).outerjoin(User, User.id == model.recorded_by).filter(condition).order_by(model.id)
+    return [{
+        'payment_id': payment.id,
+        'number': receipt_number(payment.id),
+        'payment_date': payment.payment_date.isoformat() if payment.payment_date else '',
+        'reg_number': payment.student_reg_number,
+        'name': name,
+        'student_class': student_class,
+        'data_version': data_version,
+        'academic_year': payment.academic_year,
+        'term': payment.term,
+        'amount': payment.amount_paid,
+        'expected': expected if expected is not None else expected_fee(student_class, payment.term,
+                                                                        payment.academic_year),
+        'paid_to_date': float(paid_to_date.get(payment.id) or 0.0),
+        'recorded_by': username,
+    } for payment, name, student_class, expected, data_version, username in rows]
+
+
+def statement_data(student_query, academic_year, term):
+    """Statement dicts for every student of a Student query, from three queries however many there are.
+
+    Each carries the student_details() fee breakdown up to the statement's
+    term and that term's payments.
+    """
+    students = student_query.order_by(Student.name, Student.id).all()
+    reg_numbers = student_query.with_entities(Student.reg_number)
+    balances_by_student = {}
+    for reg_number, year, period_term, expected, paid in db.session.query(
+        StudentBalance.student_reg_number, StudentBalance.academic_year, StudentBalance.term,
+        StudentBalance.expected, StudentBalance.paid
+    ).filter(StudentBalance.student_reg_number.in_(reg_numbers)):
+        balances_by_student.setdefault(reg_number, {})[(year, period_term)] = (expected, paid)
+    # A closed year's payments are only in the archive.
+    model = PaymentArchive if db.session.get(ArchivedYear, academic_year) else Payment
+    payments_by_student = {}
+    for payment_id, reg_number, payment_date, amount in db.session.query(
+        model.id, model.student_reg_number, model.payment_date, model.amount_paid
+    ).filter(model.student_reg_number.in_(reg_numbers), model.academic_year == academic_year,
+             model.term == term).order_by(model.payment_date, model.id):
+        payments_by_student.setdefault(reg_number, []).append(
+            (payment_date.isoformat() if payment_date else '', receipt_number(payment_id), amount))
+
+    until = (academic_year_start(academic_year) or 0, term_ordinal(term) or 0)
+    generated = date.today().isoformat()
+    statements = []
+    for student in students:
+        breakdown = fee_breakdown_from_balances(student, balances_by_student.get(student.reg_number, {}),
+                                                academic_year, term)
+        statements.append({
+            'reg_number': student.reg_number,
+            'name': student.name,
+            'student_class': student.student_class,
+            'academic_year': academic_year,
+            'term': term,
+            'generated': generated,
+            'breakdown': [
+                period for period in breakdown.values()
+                if (academic_year_start(period['academic_year']) or 0, term_ordinal(period['term']) or 0) <= until
+            ],
+            'payments': payments_by_student.get(student.reg_number, []),
+        })
+    return statements
+
+
+def render_receipt_pdf(receipt):
+    """PDF bytes of one receipt_data() receipt."""
+    pdf = PdfDocument(f"Receipt {receipt['number']}")
+    y = _pdf_header(pdf, 'Fee Receipt', [
+        ('Receipt No.', receipt['number']),
+        ('Date', receipt['payment_date']),
+        ('Student', receipt['name']),
+        ('Reg. No.', receipt['reg_number']),
+        ('Class', receipt['student_class'] or ''),
+        ('Recorded by', receipt['recorded_by'] or ''),
+    ])
+    outstanding = receipt['expected'] - receipt['paid_to_date']
+    right = PDF_PAGE_SIZE[0] - PDF_MARGIN
+    y = _pdf_table(pdf, y, 'Payment', [('Description', PDF_MARGIN, 'left'), ('Amount (NGN)', right, 'right')], [
+        (f"School fees, {receipt['term']} {receipt['academic_year']}", format_currency_filter(receipt['amount'])),
+        ('Fee for the term', format_currency_filter(receipt['expected'])),
+        ('Paid for the term to date', format_currency_filter(receipt['paid_to_date'])),
+        ('Balance outstanding', format_currency_filter(max(outstanding, 0.0))),
+    ])
+    pdf.text(PDF_MARGIN, y + 10, 'Paid in full for the term.' if outstanding <= 0 else
+             f"NGN {format_currency_filter(outstanding)} remains due for {receipt['term']} {receipt['academic_year']}.")
+    pdf.text(PDF_MARGIN, y + 40, 'Thank you.', bold=True)
+    return pdf.to_bytes()
+
+
+def render_statement_pdf(statement):
+    """PDF bytes of one statement_data() statement."""
+    period = f"{statement['term']} {statement['academic_year']}"
+    pdf = PdfDocument(f"Statement {statement['reg_number']} {period}")
+    y = _pdf_header(pdf, 'Fee Statement', [
+        ('Student', statement['name']),
+        ('Reg. No.', statement['reg_number']),
+        ('Class', statement['student_class'] or ''),
+        ('Statement for', period),
+        ('Date', statement['generated']),
+    ])
+    right = PDF_PAGE_SIZE[0] - PDF_MARGIN
+    rows = []
+    for entry in statement['breakdown']:
+        if entry['expected'] <= 0:
+            status = 'N/A'
+        else:
+            status = 'Paid' if entry['outstanding'] <= 0 else 'Defaulter'
+        rows.append((f"{entry['term']} {entry['academic_year']}", format_currency_filter(entry['expected']),
+                     format_currency_filter(entry['paid']), format_currency_filter(entry['outstanding']), status))
+    total_outstanding = sum(max(entry['outstanding'], 0.0) for entry in statement['breakdown'])
+    rows.append(('Total outstanding', '', '', format_currency_filter(total_outstanding), ''))
+    y = _pdf_table(pdf, y, 'Fee breakdown by term and year', [
+        ('Term & Year', PDF_MARGIN, 'left'), ('Expected (NGN)', 300, 'right'), ('Paid (NGN)', 380, 'right'),
+        ('Outstanding (NGN)', 475, 'right'), ('Status', 490, 'left'),
+    ], rows)
+    if statement['payments']:
+        _pdf_table(pdf, y, f'Payments for {period}', [
+            ('Date', PDF_MARGIN, 'left'), ('Receipt No.', 180, 'left'), ('Amount (NGN)', right, 'right'),
+        ], [(payment_date, number, format_currency_filter(amount))
+            for payment_date, number, amount in statement['payments']])
+    else:
+        pdf.text(PDF_MARGIN, y + 10, f'No payments recorded for {period}.')
+    return pdf.to_bytes()
+
+
+@contextmanager
+def pdf_renderer(workers):
+    """Yield render(fn, documents), an iterator of fn(document) in order, spread over `workers` processes.
+
+    With one worker everything renders in this process. The pool is
+    spawned rather than forked: web and job workers run threads, and the
+    children need the render functions only, not the app or its connections.
+    """
+    if workers <= 1:
+        yield map
+        return
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        yield lambda fn, documents: pool.map(fn, documents, chunksize=max(1, len(documents) // (workers * 4)))
+
+
+def _receipt_cache_key(payment_id, data_version, expected):
+    # The expected amount is the term's price on the ledger, which repricing
+    # changes without touching the student.
+    return f'{payment_id}:{data_version}:{expected:.2f}'
+
+
+def _receipt_stamp(model, payment_id):
+    """(data_version, expected) for a receipt's cache key, or None when `model` has no such payment."""
+    student_class = db.func.coalesce(StudentBalance.student_class, Student.student_class)
+    row = db.session.query(
+        Student.data_version, StudentBalance.expected, student_class, model.term, model.academic_year
+    ).join(
+        model, model.student_reg_number == Student.reg_number
+    ).outerjoin(StudentBalance, db.and_(
+        StudentBalance.student_reg_number == model.student_reg_number,
+        StudentBalance.academic_year == model.academic_year,
+        StudentBalance.term == model.term
+    )).filter(model.id == payment_id).first()
+    if row is None:
+        return None
+    data_version, expected, student_class, term, academic_year = row
+    return data_version, expected if expected is not None else expected_fee(student_class, term, academic_year)
+
+
+def receipt_pdf(payment_id):
+    """PDF bytes of one payment's receipt, or None when there is no such payment.
+
+    Payments of closed years are found in the archive. Receipts are cached
+    by payment id, the student's data_version and the term's expected
+    amount, so a reprint is a cache read until the student or the price
+    changes.
+    """
+    for model in (Payment, PaymentArchive):
+        stamp = _receipt_stamp(model, payment_id)
+        if stamp is not None:
+            break
+    else:
+        return None
+    cache = current_app.extensions.get('receipt_cache') or NullCache()
+    key = _receipt_cache_key(payment_id, *stamp)
+    pdf = cache.get(key)
+    inc_metric('academy_receipt_cache_total', {'result': 'miss' if pdf is None else 'hit'})
+    if pdf is None:
+        receipt, = receipt_data(model.id == payment_id, model)
+        pdf = render_receipt_pdf(receipt)
+        cache.set(key, pdf)
+    return pdf
+
+
+def write_receipts_zip(fh, condition, workers=1):
+    """Write the receipts of the payments matching `condition` into a ZIP on `fh`; returns how many.
+
+    Cached receipts are reused and only the rest go to the pool.
+    """
+    receipts = receipt_data(condition)
+    cache = current_app.extensions.get('receipt_cache') or NullCache()
+    keys = [_receipt_cache_key(receipt['payment_id'], receipt['data_version'], receipt['expected'])
+            for receipt in receipts]
+    pdfs = [cache.get(key) for key in keys]
+    missing = [n for n, pdf in enumerate(pdfs) if pdf is None]
+    # PDF streams are already deflated, so the archive only stores them.
+    with pdf_renderer(min(workers, len(missing))) as render, zipfile.ZipFile(fh, 'w', zipfile.ZIP_STORED) as archive:
+        rendered = iter(render(render_receipt_pdf, [receipts[n] for n in missing]))
+        for n, receipt in enumerate(receipts):
+            if pdfs[n] is None:
+                pdfs[n] = next(rendered)
+                cache.set(keys[n], pdfs[n])
+            archive.writestr(f"{safe_filename(receipt['reg_number'])}-{receipt['number']}.pdf", pdfs[n])
+    return len(receipts)
+
+
+def write_statements_zip(fh, student_query, academic_year, term, workers=1, progress=None):
+    """Write a statement per student of a Student query into a ZIP on `fh`, a folder per class; returns how many.
+
+    Classes are fetched and rendered one at a time with a single pool for
+    the whole run, so memory stays at one class's worth of data.
+    """
+    classes = [student_class for student_class, in
+               student_query.with_entities(Student.student_class).distinct().order_by(Student.student_class)]
+    total = student_query.count()
+    done = 0
+    with pdf_renderer(min(workers, total)) as render, zipfile.ZipFile(fh, 'w', zipfile.ZIP_STORED) as archive:
+        for student_class in classes:
+            statements = statement_data(student_query.filter(Student.student_class == student_class),
+                                        academic_year, term)
+            for statement, pdf in zip(statements, render(render_statement_pdf, statements)):
+                archive.writestr(f"{safe_filename(student_class)}/{safe_filename(statement['reg_number'])}.pdf", pdf)
+            done += len(statements)
+            if progress is not None:
+                progress(done, total, f'{done:,} of {total:,} statements')
+    return done
+
+
+@job_handler('statements', 'Term statements')
+def statements_job(context):
+    params = context.params
+    filters = params.get('filters', {})
+    query = filter_students(Student.query, filters.get('class', 'all'), filters.get('term', 'all'),
+                            filters.get('search_query', '').strip())
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as fh:
+        count = write_statements_zip(fh, query, params['academic_year'], params['term'],
+                                     current_app.config['DOCUMENT_WORKERS'], context.progress)
+        fh.seek(0)
+        context.save_file(f"statements-{safe_filename(params['term'])}-{safe_filename(params['academic_year'])}.zip",
+                          'application/zip', fh.read())
+    return {'statements': count, 'academic_year': params['academic_year'], 'term': params['term']}
+
+
+@job_handler('receipts', 'Payment receipts')
+def receipts_job(context):
+    batch_id = int(context.params['batch_id'])
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as fh:
+        count = write_receipts_zip(fh, Payment.batch_id == batch_id, current_app.config['DOCUMENT_WORKERS'])
+        fh.seek(0)
+        context.save_file(f'receipts-batch-{batch_id}.zip', 'application/zip', fh.read())
+    return {'receipts': count, 'batch_id': batch_id}
@@ -0,0 +1,143 @@
+import csv
+import io
+import tempfile
+from datetime import date
+from itertools import groupby
+
+from flask import Response, send_file, stream_with_context
+
+from . import db
+from .models import Student, Payment, StudentBalance, PaymentArchive, ArchivedYear
+from .fees import with_fee_status
+from .ledger import fee_breakdown_from_balances
+from .students import filter_students
+
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+
+def student_export_rows(query):
+    """Header plus one row per student of a with_fee_status() query, streamed."""
+    yield ['Reg. No.', 'Name', 'Class', 'Term', 'Academic Year', 'Fee Status', 'Expected', 'Paid', 'Outstanding']
+    for student, expected_fee, total_paid, fee_status in query.yield_per(1000):
+        yield [
+            student.reg_number, student.name, student.student_class, student.term, student.academic_year,
+            fee_status, expected_fee, total_paid, max(expected_fee - total_paid, 0.0)
+        ]
+
+
+def payment_export_rows(query):
+    """Header plus one row per (Payment, student name) pair, streamed."""
+    yield ['Payment Date', 'Reg. No.', 'Name', 'Term', 'Academic Year', 'Amount Paid', 'Recorded By']
+    for payment, name in query.yield_per(1000):
+        yield [
+            payment.payment_date, payment.student_reg_number, name, payment.term,
+            payment.academic_year, payment.amount_paid, payment.recorded_by
+        ]
+
+
+def fee_breakdown_export_rows(query, current_academic_year, current_term, outstanding_only=False):
+    """Per-student, per-term rows of the student_details() fee breakdown.
+
+    `query` is a Student query; it is outer-joined to the ledger and walked
+    in reg_number order so each student's terms arrive together, one
+    streamed statement for the whole export.
+    """
+    yield ['Reg. No.', 'Name', 'Class', 'Term', 'Academic Year', 'Expected', 'Paid', 'Outstanding']
+    rows = query.outerjoin(
+        StudentBalance, StudentBalance.student_reg_number == Student.reg_number
+    ).add_columns(
+        StudentBalance.academic_year, StudentBalance.term, StudentBalance.expected, StudentBalance.paid
+    ).order_by(Student.reg_number).yield_per(1000)
+
+    for _, group in groupby(rows, key=lambda row: row[0].reg_number):
+        group = list(group)
+        student = group[0][0]
+        balances = {(year, term): (expected, paid) for _, year, term, expected, paid in group if year is not None}
+        breakdown = fee_breakdown_from_balances(student, balances, current_academic_year, current_term)
+        for period in breakdown.values():
+            if outstanding_only and period['outstanding'] <= 0:
+                continue
+            yield [
+                student.reg_number, student.name, student.student_class, period['term'],
+                period['academic_year'], period['expected'], period['paid'], period['outstanding']
+            ]
+
+
+def iter_csv(rows):
+    """Encode rows as CSV text chunks without buffering the whole file."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() > 16384:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def write_xlsx(rows, fh):
+    """Write rows to an XLSX file object using openpyxl's constant-memory writer."""
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ValueError('XLSX export needs the openpyxl package; use CSV instead.')
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    for row in rows:
+        sheet.append(row)
+    workbook.save(fh)
+
+
+# Reports that walk every student's ledger; /export hands them to the job worker.
+BACKGROUND_EXPORTS = ('fee_breakdown', 'outstanding')
+
+
+def export_rows(report, args, current_academic_year, current_term):
+    """Rows for one of the /export reports, filtered like the student list; None for unknown reports."""
+    class_filter = args.get('class', 'all')
+    term_filter = args.get('term', 'all')
+    search_query = args.get('search_query', '').strip()
+    query = filter_students(Student.query, class_filter, term_filter, search_query)
+
+    if report in ('students', 'defaulters'):
+        status_filter = 'Defaulter' if report == 'defaulters' else args.get('status', 'all')
+        query = with_fee_status(query, current_academic_year, current_term, status=status_filter)
+        return student_export_rows(query.order_by(Student.name, Student.id))
+    if report in ('fee_breakdown', 'outstanding'):
+        return fee_breakdown_export_rows(
+            query, current_academic_year, current_term, outstanding_only=report == 'outstanding'
+        )
+    if report == 'payments':
+        # A closed year's payments are only in the archive.
+        model = Payment
+        if args.get('academic_year') and db.session.get(ArchivedYear, args['academic_year']):
+            model = PaymentArchive
+        payments = db.session.query(model, Student.name).join(
+            Student, Student.reg_number == model.student_reg_number
+        )
+        payments = filter_students(payments, class_filter, term_filter, search_query)
+        if args.get('academic_year'):
+            payments = payments.filter(model.academic_year == args['academic_year'])
+        if args.get('payment_term'):
+            payments = payments.filter(model.term == args['payment_term'])
+        return payment_export_rows(payments.order_by(model.payment_date, model.id))
+    return None
+
+
+def export_response(rows, basename, fmt):
+    filename = f"{basename}-{date.today().isoformat()}.{fmt}"
+    if fmt == 'xlsx':
+        fh = tempfile.TemporaryFile()
+        write_xlsx(rows, fh)
+        fh.seek(0)
+        return send_file(
+            fh, as_attachment=True, download_name=filename,
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+    return Response(
+        stream_with_context(iter_csv(rows)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
@@ -0,0 +1,210 @@
+from datetime import datetime
+
+from flask import g
+
+from . import db
+from .models import Student, StudentBalance, FeeSchedule, Money
+from .cache import get_cache_version
+
+
+# Default fee per (class, term). Amounts saved in the FeeSchedule table for a
+# specific academic year take precedence; see expected_fee().
+FEE_STRUCTURE = {
+    ('Nur. 1', 'First Term'): 50000.00,
+    ('Nur. 1', 'Second Term'): 45000.00,
+    ('Nur. 1', 'Third Term'): 40000.00,
+    ('Nur. 2', 'First Term'): 52000.00,
+    ('Nur. 2', 'Second Term'): 47000.00,
+    ('Nur. 2', 'Third Term'): 42000.00,
+    ('Nur. 3', 'First Term'): 55000.00,
+    ('Nur. 3', 'Second Term'): 50000.00,
+    ('Nur. 3', 'Third Term'): 45000.00,
+    ('Basic 1', 'First Term'): 60000.00,
+    ('Basic 1', 'Second Term'): 55000.00,
+    ('Basic 1', 'Third Term'): 50000.00,
+    ('Basic 2', 'First Term'): 62000.00,
+    ('Basic 2', 'Second Term'): 57000.00,
+    ('Basic 2', 'Third Term'): 52000.00,
+    ('Basic 3', 'First Term'): 65000.00,
+    ('Basic 3', 'Second Term'): 60000.00,
+    ('Basic 3', 'Third Term'): 55000.00,
+    ('JSS 1', 'First Term'): 70000.00,
+    ('JSS 1', 'Second Term'): 65000.00,
+    ('JSS 1', 'Third Term'): 60000.00,
+    ('JSS 2', 'First Term'): 72000.00,
+    ('JSS 2', 'Second Term'): 67000.00,
+    ('JSS 2', 'Third Term'): 62000.00,
+    ('JSS 3', 'First Term'): 75000.00,
+    ('JSS 3', 'Second Term'): 70000.00,
+    ('JSS 3', 'Third Term'): 65000.00,
+    ('SS 1', 'First Term'): 80000.00,
+    ('SS 1', 'Second Term'): 75000.00,
+    ('SS 1', 'Third Term'): 70000.00,
+    ('SS 2', 'First Term'): 82000.00,
+    ('SS 2', 'Second Term'): 77000.00,
+    ('SS 2', 'Third Term'): 72000.00,
+    ('SS 3', 'First Term'): 85000.00,
+    ('SS 3', 'Second Term'): 80000.00,
+    ('SS 3', 'Third Term'): 75000.00,
+}
+
+
+def get_current_school_period():
+    current_year = datetime.now().year
+    if datetime.now().month < 8:
+        academic_year = f"{current_year - 1}/{current_year}"
+    else:
+        academic_year = f"{current_year}/{current_year + 1}"
+    current_month = datetime.now().month
+    if 9 <= current_month <= 12:
+        current_term = "First Term"
+    elif 1 <= current_month <= 4:
+        current_term = "Second Term"
+    else:
+        current_term = "Third Term"
+    return academic_year, current_term
+
+
+
+
+def format_currency_filter(value):
+    try:
+        return "{:,.2f}".format(float(value))
+    except (ValueError, TypeError):
+        return value
+
+
+# Per-worker copy of the fee_schedules table. It is reloaded when the
+# 'fee_schedule' version stamp changes, which is checked once per request.
+_fee_schedule_cache = {'version': None, 'fees': {}, 'resolved': {}}
+
+
+def current_fee_schedule():
+    global _fee_schedule_cache
+    if 'fee_schedule_version' not in g:
+        g.fee_schedule_version = get_cache_version('fee_schedule')
+    if _fee_schedule_cache['version'] != g.fee_schedule_version:
+        fees = {
+            (row.student_class, row.term, row.academic_year): row.amount
+            for row in FeeSchedule.query
+        }
+        _fee_schedule_cache = {'version': g.fee_schedule_version, 'fees': fees, 'resolved': {}}
+    return _fee_schedule_cache
+
+
+def expected_fee(student_class, term, academic_year):
+    """Fee for a class and term in a given academic year.
+
+    Uses the FeeSchedule amount for that year, else the most recent earlier
+    year that has one, else FEE_STRUCTURE. Answers are memoised per schedule
+    version, so repeated lookups are plain dictionary hits.
+    """
+    schedule = current_fee_schedule()
+    key = (student_class, term, academic_year)
+    resolved = schedule['resolved']
+    if key in resolved:
+        return resolved[key]
+
+    fees = schedule['fees']
+    amount = fees.get(key)
+    if amount is None:
+        earlier = [
+            year for (fee_class, fee_term, year) in fees
+            if fee_class == student_class and fee_term == term and academic_year and year < academic_year
+        ]
+        if earlier:
+            amount = fees[(student_class, term, max(earlier))]
+        else:
+            amount = FEE_STRUCTURE.get((student_class, term), 0.0)
+    resolved[key] = amount
+    return amount
+
+
+def years_priced_from(student_class, term, academic_year, years):
+    """The members of `years` whose fee for a class and term is academic_year's.
+
+    That is academic_year itself and every later year up to the next one
+    with its own FeeSchedule row for the class and term; see expected_fee().
+    """
+    later = [
+        year for (fee_class, fee_term, year) in current_fee_schedule()['fees']
+        if fee_class == student_class and fee_term == term and year > academic_year
+    ]
+    until = min(later, default=None)
+    return [year for year in years if year >= academic_year and (until is None or year < until)]
+
+
+def fee_classes():
+    """Every class that has a fee, in FEE_STRUCTURE order first."""
+    classes = list(dict.fromkeys(student_class for student_class, _ in FEE_STRUCTURE))
+    for student_class, _, _ in current_fee_schedule()['fees']:
+        if student_class not in classes:
+            classes.append(student_class)
+    return classes
+
+
+def fee_terms():
+    terms = list(dict.fromkeys(term for _, term in FEE_STRUCTURE))
+    for _, term, _ in current_fee_schedule()['fees']:
+        if term not in terms:
+            terms.append(term)
+    return terms
+
+
+def expected_fee_expression(academic_year, term):
+    """SQL CASE mapping Student.student_class to its fee for `term` in `academic_year`."""
+    fees = {
+        student_class: db.literal(expected_fee(student_class, term, academic_year), Money)
+        for student_class in fee_classes()
+    }
+    return db.case(fees, value=Student.student_class, else_=db.literal(0, Money))
+
+
+def fee_status_for(expected_fee, total_paid):
+    if expected_fee > 0:
+        if total_paid >= expected_fee:
+            return 'Paid'
+        return 'Defaulter'
+    return 'N/A'
+
+
+def with_fee_status(query, academic_year, term, status='all'):
+    """Attach fee status columns to a Student query.
+
+    The whole student set is resolved in a single statement: the students are
+    outer-joined to their StudentBalance row for the period, which carries
+    the price for periods with payments; the others are priced from the
+    cached fee schedule. Rows come back as
+    (Student, expected_fee, total_paid, fee_status). A `status` other than
+    'all' is applied as a SQL filter on the computed status.
+    """
+    expected = db.func.coalesce(StudentBalance.expected, expected_fee_expression(academic_year, term))
+    total_paid = db.func.coalesce(StudentBalance.paid, 0.0)
+    fee_status = db.case(
+        (expected <= 0, 'N/A'),
+        (total_paid >= expected, 'Paid'),
+        else_='Defaulter'
+    )
+
+    query = query.outerjoin(StudentBalance, db.and_(
+        StudentBalance.student_reg_number == Student.reg_number,
+        StudentBalance.academic_year == academic_year,
+        StudentBalance.term == term
+    )).add_columns(
+        expected.label('expected_fee'),
+        total_paid.label('total_paid'),
+        fee_status.label('fee_status')
+    )
+    if status and status != 'all':
+        query = query.filter(fee_status == status)
+    return query
+
+
+def attach_fee_status(rows):
+    """Copy the computed fee columns onto each Student so templates can read them."""
+    students = []
+    for student, expected_fee, total_paid, fee_status in rows:
+        student.fee_status = fee_status
+        student.outstanding_fee = max(expected_fee - total_paid, 0.0)
+        students.append(student)
+    return students
@@ -0,0 +1,310 @@
+import csv
+import hashlib
+import io
+import json
+import re
+from datetime import date, datetime
+from itertools import islice
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .models import Student, Payment, PaymentBatch, parse_amount, parse_date
+from .cache import touch_students
+from .fees import fee_classes, fee_terms
+from .ledger import apply_balance_deltas, record_daily_collections
+from .students import invalidate_student_facets
+
+
+IMPORT_COLUMN_ALIASES = {'class': 'student_class', 'reg_no': 'reg_number', 'amount': 'amount_paid'}
+ACADEMIC_YEAR_PATTERN = re.compile(r'^\d{4}/\d{4}$')
+# Per-row message when a whole chunk fails to write; the details go to the log.
+BATCH_REJECTED = 'Batch rejected by the database; no rows from it were saved.'
+
+
+def _import_column(header):
+    key = re.sub(r'[^a-z0-9]+', '_', str(header or '').strip().lower()).strip('_')
+    return IMPORT_COLUMN_ALIASES.get(key, key)
+
+
+def _import_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def iter_import_rows(stream, filename):
+    """Yield (line_number, row_dict) from a CSV or XLSX upload one row at a time.
+
+    Headers are normalised to column names ("Reg No" -> reg_number,
+    "Class" -> student_class). XLSX needs the optional openpyxl package and is
+    read in its streaming read-only mode.
+    """
+    if filename.lower().endswith('.xlsx'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError('XLSX import needs the openpyxl package; upload a CSV file instead.')
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [_import_column(h) for h in next(rows, ())]
+            for line_number, values in enumerate(rows, start=2):
+                if any(v is not None for v in values):
+                    yield line_number, dict(zip(header, (_import_value(v) for v in values)))
+        finally:
+            workbook.close()
+    else:
+        reader = csv.reader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+        header = [_import_column(h) for h in next(reader, [])]
+        for line_number, values in enumerate(reader, start=2):
+            if any(values):
+                yield line_number, dict(zip(header, (_import_value(v) for v in values)))
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _valid_period(row, errors, line_number):
+    valid_terms = set(fee_terms())
+    if row.get('term') not in valid_terms:
+        errors.append((line_number, row.get('reg_number', ''), f"Unknown term '{row.get('term', '')}'."))
+        return False
+    if not ACADEMIC_YEAR_PATTERN.match(row.get('academic_year', '')):
+        errors.append((line_number, row.get('reg_number', ''), 'Academic year must look like 2024/2025.'))
+        return False
+    return True
+
+
+def import_students(rows, batch_size=1000):
+    """Insert students from (line_number, row) pairs in batches.
+
+    Each batch is validated against the fee schedule's classes and terms,
+    checked for existing reg_numbers with one query, written with a single
+    executemany INSERT and committed. Returns {'inserted': n, 'errors': [...]}
+    where each error is (line_number, reg_number, message).
+    """
+    valid_classes = set(fee_classes())
+    report = {'inserted': 0, 'errors': []}
+    today = date.today()
+
+    for chunk in chunked(rows, batch_size):
+        candidates = {}
+        for line_number, row in chunk:
+            reg_number = row.get('reg_number', '')
+            if not reg_number or not row.get('name'):
+                report['errors'].append((line_number, reg_number, 'Registration number and name are required.'))
+            elif row.get('student_class') not in valid_classes:
+                report['errors'].append((line_number, reg_number, f"Unknown class '{row.get('student_class', '')}'."))
+            elif not _valid_period(row, report['errors'], line_number):
+                continue
+            elif reg_number in candidates:
+                report['errors'].append((line_number, reg_number, f'Duplicate of line {candidates[reg_number][0]}.'))
+            else:
+                try:
+                    dob = parse_date(row.get('dob'))
+                    admission_date = parse_date(row.get('admission_date')) or today
+                except ValueError as e:
+                    report['errors'].append((line_number, reg_number, str(e)))
+                    continue
+                candidates[reg_number] = (line_number, {
+                    'reg_number': reg_number,
+                    'name': row['name'],
+                    'dob': dob,
+                    'gender': row.get('gender', ''),
+                    'address': row.get('address', ''),
+                    'phone': row.get('phone', ''),
+                    'email': row.get('email', ''),
+                    'student_class': row['student_class'],
+                    'term': row['term'],
+                    'academic_year': row['academic_year'],
+                    'admission_date': admission_date,
+                })
+
+        if candidates:
+            existing = {r for (r,) in db.session.query(Student.reg_number).filter(Student.reg_number.in_(list(candidates)))}
+            for reg_number in existing:
+                line_number, _ = candidates.pop(reg_number)
+                report['errors'].append((line_number, reg_number, 'A student with this registration number already exists.'))
+        if not candidates:
+            continue
+        try:
+            db.session.execute(Student.__table__.insert(), [values for _, values in candidates.values()])
+            touch_students()
+            db.session.commit()
+            report['inserted'] += len(candidates)
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception('Student import batch rejected by the database')
+            for line_number, values in candidates.values():
+                report['errors'].append((line_number, values['reg_number'], BATCH_REJECTED))
+
+    invalidate_student_facets()
+    report['errors'].sort()
+    return report
+
+
+def prepare_payment_rows(numbered_rows, student_classes, recorded_by, errors):
+    """Validate (line_number, row) pairs into Payment insert dicts.
+
+    Problems are appended to `errors` as (line_number, reg_number, message).
+    Returns (payments, deltas, lines): the insert dicts, the per-period
+    ledger deltas and the (line_number, reg_number) of each accepted row.
+    """
+    today = date.today()
+    payments, deltas, lines = [], {}, []
+    for line_number, row in numbered_rows:
+        reg_number = row.get('reg_number', '')
+        if reg_number not in student_classes:
+            errors.append((line_number, reg_number, 'No student with this registration number.'))
+            continue
+        if not _valid_period(row, errors, line_number):
+            continue
+        try:
+            amount_paid = parse_amount(row.get('amount_paid', ''))
+        except ValueError as e:
+            errors.append((line_number, reg_number, str(e)))
+            continue
+        try:
+            payment_date = parse_date(row.get('payment_date')) or today
+        except ValueError as e:
+            errors.append((line_number, reg_number, str(e)))
+            continue
+        payments.append({
+            'student_reg_number': reg_number,
+            'term': row['term'],
+            'academic_year': row['academic_year'],
+            'amount_paid': amount_paid,
+            'payment_date': payment_date,
+            'recorded_by': recorded_by,
+        })
+        key = (reg_number, row['academic_year'], row['term'])
+        deltas[key] = deltas.get(key, 0.0) + amount_paid
+        lines.append((line_number, reg_number))
+    return payments, deltas, lines
+
+
+def write_payments(payments, deltas, student_classes, returning=False):
+    """Insert payment dicts and move the ledger and rollups with them. Does not commit.
+
+    With `returning`, the new payment ids come back in the order of `payments`.
+    """
+    insert = Payment.__table__.insert()
+    if returning:
+        insert = insert.returning(Payment.__table__.c.id, sort_by_parameter_order=True)
+    result = db.session.execute(insert, payments)
+    apply_balance_deltas(deltas, student_classes)
+    record_daily_collections(payments, student_classes)
+    touch_students({payment['student_reg_number'] for payment in payments})
+    return result.scalars().all() if returning else None
+
+
+def import_payments(rows, recorded_by, batch_size=1000):
+    """Insert payments from (line_number, row) pairs in batches.
+
+    Students are looked up once per batch, the payments go in with one
+    executemany INSERT and the ledger is updated in the same commit.
+    Returns the same report shape as import_students().
+    """
+    report = {'inserted': 0, 'errors': []}
+
+    for chunk in chunked(rows, batch_size):
+        regs = {row.get('reg_number', '') for _, row in chunk}
+        student_classes = dict(db.session.query(Student.reg_number, Student.student_class).filter(
+            Student.reg_number.in_(list(regs))))
+        payments, deltas, lines = prepare_payment_rows(chunk, student_classes, recorded_by, report['errors'])
+        if not payments:
+            continue
+        try:
+            write_payments(payments, deltas, student_classes)
+            db.session.commit()
+            report['inserted'] += len(payments)
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception('Payment import batch rejected by the database')
+            for line_number, reg_number in lines:
+                report['errors'].append((line_number, reg_number, BATCH_REJECTED))
+
+    report['errors'].sort()
+    return report
+
+
+class IdempotencyConflict(ValueError):
+    pass
+
+
+def _batch_replay(batch, fingerprint):
+    if batch.fingerprint != fingerprint:
+        raise IdempotencyConflict('This idempotency key was already used for a different batch.')
+    return json.loads(batch.results)
+
+
+def record_payment_batch(rows, recorded_by, idempotency_key):
+    """Record a list of payment dicts in one transaction, at most once per idempotency key.
+
+    Students for every row are fetched with one query, valid rows are
+    inserted together and invalid ones are reported without failing the
+    rest. The per-row results are stored with the batch, so resubmitting
+    the same key returns them again instead of posting twice.
+    Returns (result, replayed); raises IdempotencyConflict when the key was
+    used before for different rows.
+    """
+    numbered = [(n, {key: _import_value(value) for key, value in row.items()}) for n, row in enumerate(rows, 1)]
+    fingerprint = hashlib.sha256(
+        json.dumps([row for _, row in numbered], sort_keys=True).encode('utf-8')
+    ).hexdigest()
+    existing = PaymentBatch.query.filter_by(recorded_by=recorded_by, idempotency_key=idempotency_key).first()
+    if existing is not None:
+        return _batch_replay(existing, fingerprint), True
+
+    regs = {row.get('reg_number', '') for _, row in numbered}
+    student_classes = dict(db.session.query(Student.reg_number, Student.student_class).filter(
+        Student.reg_number.in_(list(regs))))
+    errors = []
+    payments, deltas, lines = prepare_payment_rows(numbered, student_classes, recorded_by, errors)
+
+    batch = PaymentBatch(idempotency_key=idempotency_key, recorded_by=recorded_by, fingerprint=fingerprint,
+                         payment_count=len(payments), total_amount=sum(p['amount_paid'] for p in payments))
+    db.session.add(batch)
+    try:
+        # Claims the key; a concurrent submission of the same batch fails here.
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        existing = PaymentBatch.query.filter_by(recorded_by=recorded_by, idempotency_key=idempotency_key).one()
+        return _batch_replay(existing, fingerprint), True
+
+    for payment in payments:
+        payment['batch_id'] = batch.id
+    payment_ids = write_payments(payments, deltas, student_classes, returning=True) if payments else []
+
+    outcome = {line_number: ('error', message, None) for line_number, _, message in errors}
+    outcome.update((line_number, ('recorded', '', payment_id))
+                   for (line_number, _), payment_id in zip(lines, payment_ids))
+    result = {
+        'batch_id': batch.id,
+        'recorded': len(payments),
+        'rejected': len(numbered) - len(payments),
+        'total_amount': batch.total_amount,
+        'rows': [
+            {'row': n, 'reg_number': row.get('reg_number', ''), 'status': outcome[n][0],
+             'message': outcome[n][1], 'payment_id': outcome[n][2]}
+            for n, row in numbered
+        ],
+    }
+    batch.results = json.dumps(result)
+    db.session.commit()
+    return result, False
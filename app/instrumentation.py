@@ -0,0 +1,158 @@
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+import traceback
+
+from flask import request, g, abort, current_app, Response, has_app_context, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+perf_logger = logging.getLogger('academy.perf')
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Per-worker Prometheus counters, keyed by (metric, labels). Each gunicorn
+# worker exposes its own numbers; scrape every worker or sum on the server.
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def inc_metric(name, labels, value=1.0):
+    key = (name, tuple(sorted(labels.items())))
+    with _metrics_lock:
+        _metrics[key] = _metrics.get(key, 0.0) + value
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_metrics():
+    """All counters in the Prometheus text exposition format."""
+    lines = []
+    with _metrics_lock:
+        items = sorted(_metrics.items())
+    seen = set()
+    for (name, labels), value in items:
+        if name not in seen:
+            seen.add(name)
+            lines.append(f'# TYPE {name} counter')
+        label_text = ','.join(f'{k}="{_escape_label(v)}"' for k, v in labels)
+        lines.append(f'{name}{{{label_text}}} {value:g}' if label_text else f'{name} {value:g}')
+    return '\n'.join(lines) + '\n'
+
+
+def _query_origin():
+    """Innermost application frames that led to the current SQL statement."""
+    frames = [
+        frame for frame in traceback.extract_stack()[:-3]
+        if frame.filename.startswith(APP_ROOT) and 'site-packages' not in frame.filename
+    ]
+    return [f'{os.path.relpath(f.filename, APP_ROOT)}:{f.lineno} in {f.name}' for f in frames[-3:]]
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+    if not has_app_context() or 'query_stats' not in g:
+        return
+    stats = g.query_stats
+    stats['count'] += 1
+    stats['time'] += elapsed
+    heapq.heappush(stats['slowest'], (elapsed, stats['count'], statement))
+    if len(stats['slowest']) > 3:
+        heapq.heappop(stats['slowest'])
+
+    if elapsed * 1000 >= current_app.config['SLOW_QUERY_MS']:
+        inc_metric('academy_db_slow_queries_total', {'endpoint': request.endpoint or 'unknown'})
+        perf_logger.warning(json.dumps({
+            'event': 'slow_query',
+            'endpoint': request.endpoint,
+            'duration_ms': round(elapsed * 1000, 2),
+            'statement': ' '.join(statement.split())[:1000],
+            'origin': _query_origin(),
+        }))
+
+
+def register_request_instrumentation(app):
+    """Count queries and DB time per request.
+
+    Results go out as a Server-Timing header, one JSON log line on the
+    'academy.perf' logger and, when METRICS_ENABLED is set, the /metrics
+    endpoint.
+    """
+
+    @app.before_request
+    def start_request_instrumentation():
+        g.request_started = time.perf_counter()
+        g.query_stats = {'count': 0, 'time': 0.0, 'slowest': []}
+        g.render_stats = {'time': 0.0, 'hit': 0, 'miss': 0}
+
+    @before_render_template.connect_via(app)
+    def start_render_timer(sender, template, context, **extra):
+        g.render_started = time.perf_counter()
+
+    @template_rendered.connect_via(app)
+    def stop_render_timer(sender, template, context, **extra):
+        started = g.pop('render_started', None)
+        if started is not None and 'render_stats' in g:
+            g.render_stats['time'] += time.perf_counter() - started
+
+    @app.after_request
+    def finish_request_instrumentation(response):
+        stats = g.pop('query_stats', None)
+        if stats is None:
+            return response
+        total = time.perf_counter() - g.request_started
+        endpoint = request.endpoint or 'unknown'
+        render = g.pop('render_stats')
+        fragments = render['hit'] + render['miss']
+
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={stats["time"] * 1000:.1f};desc="{stats["count"]} queries", '
+            f'render;dur={render["time"] * 1000:.1f};desc="{render["hit"]}/{fragments} fragments cached", '
+            f'app;dur={total * 1000:.1f}'
+        )
+        inc_metric('academy_http_requests_total',
+                    {'endpoint': endpoint, 'method': request.method, 'status': response.status_code})
+        inc_metric('academy_http_request_seconds_total', {'endpoint': endpoint}, total)
+        inc_metric('academy_db_queries_total', {'endpoint': endpoint}, stats['count'])
+        inc_metric('academy_db_query_seconds_total', {'endpoint': endpoint}, stats['time'])
+        inc_metric('academy_render_seconds_total', {'endpoint': endpoint}, render['time'])
+        for result in ('hit', 'miss'):
+            if render[result]:
+                inc_metric('academy_fragment_cache_total', {'result': result}, render[result])
+        perf_logger.info(json.dumps({
+            'event': 'request',
+            'method': request.method,
+            'path': request.path,
+            'endpoint': endpoint,
+            'status': response.status_code,
+            'duration_ms': round(total * 1000, 2),
+            'db_queries': stats['count'],
+            'db_ms': round(stats['time'] * 1000, 2),
+            'render_ms': round(render['time'] * 1000, 2),
+            'fragments': {'hit': render['hit'], 'miss': render['miss']},
+            'slowest': [
+                {'ms': round(elapsed * 1000, 2), 'statement': ' '.join(statement.split())[:200]}
+                for elapsed, _, statement in sorted(stats['slowest'], reverse=True)
+            ],
+        }))
+        return response
+
+    if app.config['METRICS_ENABLED']:
+        @app.route('/metrics')
+        def metrics():
+            token = app.config['METRICS_TOKEN']
+            if token and request.headers.get('Authorization') != f'Bearer {token}':
+                abort(401)
+            return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,250 @@
+import json
+import tempfile
+import time
+import traceback
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.exc import OperationalError
+
+from . import db
+from .models import Student, StudentBalance, Job
+from .cache import bump_cache_version
+from .exports import export_rows, iter_csv, write_xlsx
+from .fees import get_current_school_period, with_fee_status
+from .instrumentation import inc_metric
+from .ledger import (rebuild_balances, rebuild_daily_collections, refresh_class_term_summaries, reprice_balances,
+                     verify_balances)
+from .students import filter_students
+
+
+# Background jobs. The jobs table is the queue: the web process inserts a
+# row and `flask jobs worker` claims it with a compare-and-set UPDATE, so
+# several workers can share one database, SQLite or PostgreSQL, without a
+# broker. Handlers are registered with @job_handler and get a JobContext.
+JOB_HANDLERS = {}
+JOB_FINISHED = ('done', 'failed')
+
+
+def job_handler(kind, title):
+    def decorator(fn):
+        JOB_HANDLERS[kind] = {'run': fn, 'title': title}
+        return fn
+    return decorator
+
+
+class JobContext:
+    """What a handler sees of its job: params, progress reporting and a result file.
+
+    progress() writes through its own connection so the figures are visible
+    while the handler's transaction is still open. On SQLite that write
+    invalidates any read transaction the handler has open for later writing,
+    so handlers that write call it only right after a commit.
+    """
+
+    def __init__(self, job_id, params, live=True):
+        self.job_id = job_id
+        self.params = params
+        self.live = live
+        self.file = None
+        self._reported = (None, None)
+        self._reported_at = 0.0
+
+    def progress(self, done, total=None, message=None):
+        if not self.live:
+            return
+        percent = min(99, done * 100 // total) if total else None
+        now = time.monotonic()
+        # At most one write a second, and none when nothing changed.
+        if (percent, message) == self._reported or now - self._reported_at < 1.0:
+            return
+        self._reported, self._reported_at = (percent, message), now
+        values = {'message': message[:255] if message else message}
+        if percent is not None:
+            values['progress'] = percent
+        touch_job(self.job_id, **values)
+
+    def save_file(self, name, mimetype, data):
+        self.file = (name, mimetype, data)
+
+
+def touch_job(job_id, **values):
+    jobs = Job.__table__
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(jobs.update().where(jobs.c.id == job_id).values(heartbeat_at=datetime.utcnow(), **values))
+    except OperationalError:
+        # Progress is best effort; a busy database must not fail the job.
+        current_app.logger.warning('Could not record progress for job %s', job_id, exc_info=True)
+
+
+def enqueue_job(kind, params=None, created_by=None):
+    """Queue a job and commit. With JOBS_EAGER set it runs before returning."""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f'Unknown job kind {kind!r}.')
+    job = Job(kind=kind, params=json.dumps(params or {}, sort_keys=True, default=str), created_by=created_by)
+    db.session.add(job)
+    db.session.commit()
+    if current_app.config['JOBS_EAGER']:
+        job.status, job.worker, job.started_at, job.attempts = 'running', 'eager', datetime.utcnow(), 1
+        db.session.commit()
+        run_job(job.id, live=False)
+    return job
+
+
+def claim_next_job(worker):
+    """Mark the oldest queued job as running for `worker`; returns its id, or None when the queue is empty."""
+    jobs = Job.__table__
+    while True:
+        job_id = db.session.query(Job.id).filter(Job.status == 'queued').order_by(Job.id).limit(1).scalar()
+        if job_id is None:
+            db.session.rollback()
+            return None
+        now = datetime.utcnow()
+        claimed = db.session.execute(
+            jobs.update().where(jobs.c.id == job_id, jobs.c.status == 'queued').values(
+                status='running', worker=worker, started_at=now, heartbeat_at=now, attempts=jobs.c.attempts + 1
+            )
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return job_id
+
+
+def run_job(job_id, live=True):
+    """Run a claimed job's handler and record its outcome."""
+    job = db.session.get(Job, job_id)
+    handler = JOB_HANDLERS.get(job.kind)
+    context = JobContext(job.id, json.loads(job.params), live=live)
+    # Handlers start from a fresh transaction, and the outcome is written in
+    # another one, so neither sees a snapshot older than the progress writes.
+    db.session.commit()
+    started = time.perf_counter()
+    try:
+        if handler is None:
+            raise ValueError(f'No handler for job kind {job.kind!r}.')
+        result = handler['run'](context)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        job.status, job.message, job.error = 'failed', str(e)[:255], traceback.format_exc()
+    else:
+        job = db.session.get(Job, job_id)
+        job.status, job.progress, job.message = 'done', 100, None
+        job.result = json.dumps(result, default=str) if result is not None else None
+        if context.file:
+            job.result_name, job.result_mimetype, job.result_data = context.file
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    inc_metric('academy_jobs_total', {'kind': job.kind, 'status': job.status})
+    inc_metric('academy_job_seconds_total', {'kind': job.kind}, time.perf_counter() - started)
+    return job
+
+
+def requeue_stale_jobs(stale_seconds, max_attempts):
+    """Put running jobs whose worker went quiet back in the queue, or fail them after max_attempts."""
+    jobs = Job.__table__
+    stale = db.and_(jobs.c.status == 'running',
+                    jobs.c.heartbeat_at < datetime.utcnow() - timedelta(seconds=stale_seconds))
+    failed = db.session.execute(jobs.update().where(stale, jobs.c.attempts >= max_attempts).values(
+        status='failed', message='The worker stopped responding.', finished_at=datetime.utcnow()
+    )).rowcount
+    requeued = db.session.execute(jobs.update().where(stale).values(status='queued', worker=None)).rowcount
+    db.session.commit()
+    return requeued, failed
+
+
+def purge_finished_jobs(retention_days):
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    deleted = db.session.execute(
+        db.delete(Job).where(Job.status.in_(JOB_FINISHED), Job.finished_at < cutoff)
+    ).rowcount
+    db.session.commit()
+    return deleted
+
+
+def job_file(rows, basename, fmt, context, total=None):
+    """Write export rows to a CSV or XLSX result file, reporting progress as rows go out."""
+    def counted(rows):
+        for n, row in enumerate(rows):
+            if n and n % 500 == 0:
+                context.progress(n, total, f'{n:,} rows written')
+            yield row
+
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as fh:
+        if fmt == 'xlsx':
+            write_xlsx(counted(rows), fh)
+            mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        else:
+            for chunk in iter_csv(counted(rows)):
+                fh.write(chunk.encode('utf-8'))
+            mimetype = 'text/csv'
+        fh.seek(0)
+        context.save_file(f"{basename}-{date.today().isoformat()}.{fmt}", mimetype, fh.read())
+
+
+@job_handler('export', 'Report export')
+def export_job(context):
+    params = context.params
+    rows = export_rows(params['report'], params.get('filters', {}), params['academic_year'], params['term'])
+    if rows is None:
+        raise ValueError(f"Unknown report {params['report']!r}.")
+    total = None
+    if params['report'] in ('students', 'defaulters'):
+        filters = params.get('filters', {})
+        total = filter_students(Student.query, filters.get('class', 'all'), filters.get('term', 'all'),
+                                filters.get('search_query', '').strip()).count()
+    job_file(rows, params['report'], params['fmt'], context, total)
+    return {'report': params['report'], 'academic_year': params['academic_year'], 'term': params['term']}
+
+
+@job_handler('reprice_balances', 'Recalculate balances')
+def reprice_balances_job(context):
+    """Reprice the ledger and class summaries one academic year at a time, committing after each.
+
+    `periods` limits it to [class, academic year] pairs and `academic_year`
+    to one whole year; with neither, every year in the ledger is repriced.
+    """
+    if context.params.get('periods'):
+        classes_by_year = {}
+        for student_class, academic_year in context.params['periods']:
+            classes_by_year.setdefault(academic_year, []).append(student_class)
+    elif context.params.get('academic_year'):
+        classes_by_year = {context.params['academic_year']: None}
+    else:
+        classes_by_year = dict.fromkeys(
+            year for year, in db.session.query(StudentBalance.academic_year).distinct())
+    years = sorted(classes_by_year)
+    for n, academic_year in enumerate(years, 1):
+        reprice_balances(academic_year, classes_by_year[academic_year])
+        refresh_class_term_summaries(academic_year, classes_by_year[academic_year])
+        db.session.commit()
+        context.progress(n, len(years), f'Repriced {academic_year}')
+    # Student pages carry the fee_schedule stamp, so this makes them re-render.
+    bump_cache_version('fee_schedule')
+    db.session.commit()
+    return {'academic_years': years}
+
+
+@job_handler('reconcile_ledger', 'Reconcile ledger and defaulters')
+def reconcile_ledger_job(context):
+    """Check the ledger against payments and the fee schedule, rebuilding it and the rollups on drift."""
+    context.progress(0, 3, 'Comparing the ledger with payments')
+    problems = verify_balances()
+    db.session.commit()
+    if problems:
+        context.progress(1, 3, f'{len(problems)} mismatches; rebuilding')
+        rebuild_balances()
+        rebuild_daily_collections()
+        bump_cache_version('fee_schedule')
+        db.session.commit()
+    context.progress(2, 3, 'Counting defaulters')
+    academic_year, term = get_current_school_period()
+    defaulters = with_fee_status(Student.query, academic_year, term, 'Defaulter').count()
+    return {'mismatches': len(problems), 'examples': problems[:20], 'rebuilt': bool(problems),
+            'academic_year': academic_year, 'term': term, 'defaulters': defaulters}
+
+
+# Jobs an administrator can start from the /jobs page.
+ADMIN_JOBS = ('reprice_balances', 'reconcile_ledger')
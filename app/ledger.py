@@ -0,0 +1,499 @@
+from . import db
+from .models import (Student, Payment, StudentBalance, ClassTermSummary, DailyCollection, Money, PaymentArchive,
+                     PaymentHistory, Rollover, RolloverStudent, academic_year_start, term_ordinal)
+from .database import upsert
+from .fees import expected_fee, fee_classes, with_fee_status
+
+
+def get_fee_status(student_reg_number, academic_year_check, term_check):
+    row = with_fee_status(
+        Student.query.filter_by(reg_number=student_reg_number), academic_year_check, term_check
+    ).first()
+    if row is None:
+        return 'N/A'
+    return row.fee_status
+
+
+def apply_balance_deltas(deltas, student_classes):
+    """Add newly recorded payments to the StudentBalance ledger.
+
+    `deltas` maps (reg_number, academic_year, term) to the amount just paid
+    and `student_classes` maps reg_number to class for pricing new rows;
+    existing rows keep the class they were priced at. The
+    statements run on db.session without committing, so the ledger moves in
+    the same transaction as the Payment inserts.
+    """
+    if not deltas:
+        return
+    balances = StudentBalance.__table__
+    rows = []
+    for (reg, year, term), amount in deltas.items():
+        expected = expected_fee(student_classes.get(reg), term, year)
+        rows.append({
+            'student_reg_number': reg, 'academic_year': year, 'term': term, 'student_class': student_classes.get(reg),
+            'expected': expected, 'paid': amount, 'outstanding': expected - amount
+        })
+    # New keys are inserted priced at the current fee, existing ones add the
+    # payment SQL-side; RETURNING gives each row as it now stands for the
+    # summary deltas below.
+    statement = upsert(
+        balances, ('student_reg_number', 'academic_year', 'term'),
+        lambda excluded: {'paid': balances.c.paid + excluded.paid,
+                          'outstanding': balances.c.outstanding - excluded.paid}
+    ).returning(balances.c.student_reg_number, balances.c.academic_year, balances.c.term,
+                balances.c.student_class, balances.c.expected, balances.c.paid)
+
+    summary_deltas = {}
+    for reg, year, term, student_class, expected, paid_now in db.session.execute(statement, rows):
+        amount = deltas[(reg, year, term)]
+        paid = paid_now - amount
+        was_settled = expected > 0 and paid >= expected
+        is_settled = expected > 0 and paid_now >= expected
+        summary = summary_deltas.setdefault(
+            (student_class or '', year, term), {'collected': 0.0, 'paying': 0, 'paid_in_full': 0})
+        summary['collected'] += amount
+        summary['paying'] += int(paid <= 0 < paid_now)
+        summary['paid_in_full'] += int(is_settled) - int(was_settled)
+    increment_rollup(ClassTermSummary, ('student_class', 'academic_year', 'term'), summary_deltas)
+
+
+def reprice_student_balances(student, academic_year, term):
+    """Move a student's ledger rows from academic_year/term on to their current class.
+
+    Earlier terms keep the class they were priced at; correcting one of
+    those is a deliberate ledger fix, not a side effect of editing the
+    student. Returns {(academic_year, term): previous class} for the rows
+    that changed class. Does not commit.
+    """
+    start, ordinal = academic_year_start(academic_year), term_ordinal(term)
+    moved = {}
+    for balance in StudentBalance.query.filter(
+        StudentBalance.student_reg_number == student.reg_number,
+        db.or_(StudentBalance.academic_year_start > start,
+               db.and_(StudentBalance.academic_year_start == start, StudentBalance.term_ordinal >= ordinal))
+    ):
+        if balance.student_class != student.student_class:
+            moved[(balance.academic_year, balance.term)] = balance.student_class
+        balance.student_class = student.student_class
+        balance.expected = expected_fee(student.student_class, balance.term, balance.academic_year)
+        balance.outstanding = balance.expected - balance.paid
+    return moved
+
+
+def build_fee_breakdown(student, current_academic_year, current_term):
+    """Expected/paid/outstanding per "<term> <year>" for a student, newest first.
+
+    Covers the admission period, every period with a ledger row and the
+    current period, all from one StudentBalance lookup.
+    """
+    balances = {
+        (academic_year, term): (expected, paid)
+        for academic_year, term, expected, paid in db.session.query(
+            StudentBalance.academic_year, StudentBalance.term, StudentBalance.expected, StudentBalance.paid
+        ).filter_by(student_reg_number=student.reg_number)
+    }
+    return fee_breakdown_from_balances(student, balances, current_academic_year, current_term)
+
+
+def fee_breakdown_from_balances(student, balances, current_academic_year, current_term):
+    """Build the build_fee_breakdown() dict from already-fetched {(year, term): (expected, paid)} rows.
+
+    Periods with a ledger row keep the price on that row; the others are
+    priced at the student's current class.
+    """
+    all_years_terms = set(balances)
+    if student.academic_year and student.term:
+        all_years_terms.add((student.academic_year, student.term))
+    all_years_terms.add((current_academic_year, current_term))
+
+    fee_breakdown = {}
+    for year, term in all_years_terms:
+        expected_amount, total_paid_for_period = balances.get(
+            (year, term), (expected_fee(student.student_class, term, year), 0.0))
+        fee_breakdown[f"{term} {year}"] = {
+            'academic_year': year,
+            'term': term,
+            'expected': expected_amount,
+            'paid': total_paid_for_period,
+            'outstanding': expected_amount - total_paid_for_period
+        }
+
+    def sort_key_for_fee_breakdown(item):
+        period = item[1]
+        return (academic_year_start(period['academic_year']) or 0, term_ordinal(period['term']) or 0)
+
+    return dict(sorted(fee_breakdown.items(), key=sort_key_for_fee_breakdown, reverse=True))
+
+
+def payment_totals_query():
+    """SUM(amount_paid) per (reg_number, academic_year, term) from payments plus archived-year history."""
+    live = db.select(
+        Payment.student_reg_number,
+        Payment.academic_year,
+        Payment.term,
+        db.func.sum(Payment.amount_paid).label('total_paid')
+    ).where(
+        Payment.academic_year.isnot(None),
+        Payment.term.isnot(None)
+    ).group_by(Payment.student_reg_number, Payment.academic_year, Payment.term)
+    archived = db.select(
+        PaymentHistory.student_reg_number, PaymentHistory.academic_year, PaymentHistory.term, PaymentHistory.amount_paid
+    )
+    totals = db.union_all(live, archived).subquery()
+    return db.session.query(
+        totals.c.student_reg_number,
+        totals.c.academic_year,
+        totals.c.term,
+        db.func.sum(totals.c.total_paid).label('total_paid')
+    ).group_by(totals.c.student_reg_number, totals.c.academic_year, totals.c.term)
+
+
+def all_payments():
+    """payments and payments_archive as one subquery, for rebuilds that need every payment ever taken."""
+    columns = ('student_reg_number', 'academic_year', 'term', 'amount_paid', 'payment_date')
+    return db.union_all(
+        db.select(*[Payment.__table__.c[name] for name in columns]),
+        db.select(*[PaymentArchive.__table__.c[name] for name in columns])
+    ).subquery('all_payments')
+
+
+def reprice_balances(academic_year=None, classes=None):
+    """Reset expected/outstanding on ledger rows from the current fee schedule.
+
+    Optionally limited to one academic year and/or some classes; each row is
+    priced at its own class. Runs one set-based UPDATE per
+    (class, term, academic year) combination rather than touching rows
+    individually. Does not commit.
+    """
+    balances = StudentBalance.__table__
+    periods = db.session.query(
+        StudentBalance.student_class, StudentBalance.term, StudentBalance.academic_year
+    ).filter(StudentBalance.student_class.isnot(None)).distinct()
+    if academic_year:
+        periods = periods.filter(StudentBalance.academic_year == academic_year)
+    if classes is not None:
+        periods = periods.filter(StudentBalance.student_class.in_(classes))
+    params = [
+        {'p_class': student_class, 'p_term': term, 'p_year': year, 'amount': expected_fee(student_class, term, year)}
+        for student_class, term, year in periods
+    ]
+    if params:
+        db.session.execute(
+            balances.update().where(
+                balances.c.term == db.bindparam('p_term'),
+                balances.c.academic_year == db.bindparam('p_year'),
+                balances.c.student_class == db.bindparam('p_class')
+            ).values(
+                expected=db.bindparam('amount', type_=Money),
+                outstanding=db.bindparam('amount', type_=Money) - balances.c.paid
+            ),
+            params
+        )
+
+
+def rebuild_balances():
+    """Recreate the whole StudentBalance ledger from raw payments.
+
+    Paid totals go in with one INSERT ... SELECT over grouped payments and are
+    then priced by reprice_balances(). Periods already in the ledger keep the
+    class they were priced at; new ones take the student's current class.
+    """
+    balances = StudentBalance.__table__
+    current_classes = dict(db.session.query(Student.reg_number, Student.student_class))
+    kept_classes = [
+        {'b_reg': reg, 'b_year': year, 'b_term': term, 'b_class': student_class}
+        for reg, year, term, student_class in db.session.query(
+            StudentBalance.student_reg_number, StudentBalance.academic_year, StudentBalance.term,
+            StudentBalance.student_class
+        ) if student_class != current_classes.get(reg)
+    ]
+    totals = payment_totals_query().subquery()
+    select = db.select(
+        totals.c.student_reg_number,
+        totals.c.academic_year,
+        totals.c.term,
+        db.select(Student.student_class).where(Student.reg_number == totals.c.student_reg_number).scalar_subquery(),
+        db.literal(0, Money),
+        totals.c.total_paid,
+        -totals.c.total_paid
+    )
+
+    db.session.execute(db.delete(StudentBalance))
+    result = db.session.execute(balances.insert().from_select(
+        ['student_reg_number', 'academic_year', 'term', 'student_class', 'expected', 'paid', 'outstanding'], select
+    ))
+    if kept_classes:
+        db.session.execute(
+            balances.update().where(
+                balances.c.student_reg_number == db.bindparam('b_reg'),
+                balances.c.academic_year == db.bindparam('b_year'),
+                balances.c.term == db.bindparam('b_term')
+            ).values(student_class=db.bindparam('b_class')),
+            kept_classes
+        )
+    fill_period_columns(StudentBalance)
+    reprice_balances()
+    refresh_class_term_summaries()
+    db.session.commit()
+    return result.rowcount
+
+
+def fill_period_columns(model):
+    """Set academic_year_start/term_ordinal on rows written by bulk SQL that skipped the Python defaults."""
+    table = model.__table__
+    periods = db.session.query(model.academic_year, model.term).filter(
+        db.or_(model.academic_year_start.is_(None), model.term_ordinal.is_(None))
+    ).distinct().all()
+    params = [
+        {'p_year': year, 'p_term': term, 'start': academic_year_start(year), 'ordinal': term_ordinal(term)}
+        for year, term in periods
+    ]
+    if params:
+        db.session.execute(
+            table.update().where(
+                table.c.academic_year == db.bindparam('p_year'),
+                table.c.term == db.bindparam('p_term')
+            ).values(academic_year_start=db.bindparam('start'), term_ordinal=db.bindparam('ordinal')),
+            params
+        )
+
+
+def verify_balances(tolerance=0.005):
+    """Compare the ledger with raw payments; returns a list of human-readable mismatches."""
+    actual = {
+        (reg, year, term): total or 0.0
+        for reg, year, term, total in payment_totals_query()
+    }
+    problems = []
+    for balance in StudentBalance.query.yield_per(1000):
+        key = (balance.student_reg_number, balance.academic_year, balance.term)
+        paid = actual.pop(key, None)
+        expected = expected_fee(balance.student_class, key[2], key[1])
+        if paid is None:
+            if abs(balance.paid) > tolerance:
+                problems.append(f'{key}: ledger has {balance.paid:.2f} paid but there are no payments')
+        elif abs(balance.paid - paid) > tolerance:
+            problems.append(f'{key}: ledger paid {balance.paid:.2f}, payments sum to {paid:.2f}')
+        if abs(balance.expected - expected) > tolerance:
+            problems.append(f'{key}: ledger expects {balance.expected:.2f}, fee schedule says {expected:.2f}')
+        if abs(balance.outstanding - (balance.expected - balance.paid)) > tolerance:
+            problems.append(f'{key}: outstanding {balance.outstanding:.2f} does not equal expected - paid')
+    for key, paid in actual.items():
+        problems.append(f'{key}: {paid:.2f} paid but no ledger row')
+    return problems
+
+
+def increment_rollup(model, key_columns, increments):
+    """Add {key tuple: {column: delta}} onto a rollup table, inserting missing keys.
+
+    One executemany upsert does the SQL-side addition, so concurrent writers
+    neither overwrite each other's totals nor race to insert the same key.
+    Does not commit.
+    """
+    if not increments:
+        return
+    table = model.__table__
+    columns = sorted({name for delta in increments.values() for name in delta})
+    db.session.execute(
+        upsert(table, key_columns, lambda excluded: {name: table.c[name] + excluded[name] for name in columns}),
+        [
+            dict(zip(key_columns, key), **{name: delta.get(name, 0) for name in columns})
+            for key, delta in increments.items()
+        ]
+    )
+
+
+def record_daily_collections(payments, student_classes):
+    """Add payment dicts (as inserted into payments) to the daily_collections rollup."""
+    increments = {}
+    for payment in payments:
+        if payment['payment_date'] is None:
+            continue
+        key = (payment['payment_date'], student_classes.get(payment['student_reg_number']) or '',
+               payment['academic_year'], payment['term'])
+        delta = increments.setdefault(key, {'amount': 0.0, 'payments': 0})
+        delta['amount'] += payment['amount_paid']
+        delta['payments'] += 1
+    increment_rollup(DailyCollection, ('collection_date', 'student_class', 'academic_year', 'term'), increments)
+
+
+def move_daily_collections(reg_number, moved, new_class):
+    """Re-bucket a student's payments for the periods in `moved` under their new class.
+
+    `moved` is reprice_student_balances()'s {(academic_year, term): old class}.
+    Does not commit.
+    """
+    increments = {}
+    payments = all_payments()
+    for day, year, term, amount, count in db.session.query(
+        payments.c.payment_date, payments.c.academic_year, payments.c.term,
+        db.func.sum(payments.c.amount_paid), db.func.count()
+    ).filter(
+        payments.c.student_reg_number == reg_number,
+        payments.c.payment_date.isnot(None),
+        payments.c.academic_year.isnot(None),
+        payments.c.term.isnot(None)
+    ).group_by(payments.c.payment_date, payments.c.academic_year, payments.c.term):
+        if (year, term) not in moved:
+            continue
+        increments[(day, moved[(year, term)] or '', year, term)] = {'amount': -amount, 'payments': -count}
+        increments[(day, new_class or '', year, term)] = {'amount': amount, 'payments': count}
+    increment_rollup(DailyCollection, ('collection_date', 'student_class', 'academic_year', 'term'), increments)
+    db.session.execute(db.delete(DailyCollection).where(DailyCollection.payments <= 0))
+
+
+def refresh_class_term_summaries(academic_year=None, classes=None):
+    """Recompute class/term summary rows from the ledger, optionally for one year or some classes.
+
+    Used after anything that reprices the ledger (fee edits, class changes),
+    where the paid-in-full counts cannot be adjusted incrementally. Does not commit.
+    """
+    student_class = db.func.coalesce(StudentBalance.student_class, '')
+    select = db.select(
+        student_class,
+        StudentBalance.academic_year,
+        StudentBalance.term,
+        db.func.sum(StudentBalance.paid),
+        db.func.sum(db.case((StudentBalance.paid > 0, 1), else_=0)),
+        db.func.sum(db.case(
+            (db.and_(StudentBalance.expected > 0, StudentBalance.paid >= StudentBalance.expected), 1), else_=0))
+    ).group_by(student_class, StudentBalance.academic_year, StudentBalance.term)
+    delete = db.delete(ClassTermSummary)
+    if academic_year:
+        select = select.where(StudentBalance.academic_year == academic_year)
+        delete = delete.where(ClassTermSummary.academic_year == academic_year)
+    if classes is not None:
+        classes = [student_class or '' for student_class in classes]
+        select = select.where(student_class.in_(classes))
+        delete = delete.where(ClassTermSummary.student_class.in_(classes))
+
+    db.session.execute(delete)
+    db.session.execute(ClassTermSummary.__table__.insert().from_select(
+        ['student_class', 'academic_year', 'term', 'collected', 'paying', 'paid_in_full'], select
+    ))
+
+
+def rebuild_daily_collections():
+    """Recreate daily_collections from the payments table and its archive. Does not commit.
+
+    Payments are bucketed under the class their term was priced at in the
+    ledger, falling back to the student's current class.
+    """
+    payments = all_payments()
+    student_class = db.func.coalesce(StudentBalance.student_class, Student.student_class, '')
+    select = db.select(
+        payments.c.payment_date, student_class, payments.c.academic_year, payments.c.term,
+        db.func.sum(payments.c.amount_paid), db.func.count()
+    ).join(Student, Student.reg_number == payments.c.student_reg_number).outerjoin(StudentBalance, db.and_(
+        StudentBalance.student_reg_number == payments.c.student_reg_number,
+        StudentBalance.academic_year == payments.c.academic_year,
+        StudentBalance.term == payments.c.term
+    )).where(
+        payments.c.payment_date.isnot(None),
+        payments.c.academic_year.isnot(None),
+        payments.c.term.isnot(None)
+    ).group_by(payments.c.payment_date, student_class, payments.c.academic_year, payments.c.term)
+    db.session.execute(db.delete(DailyCollection))
+    result = db.session.execute(DailyCollection.__table__.insert().from_select(
+        ['collection_date', 'student_class', 'academic_year', 'term', 'amount', 'payments'], select
+    ))
+    return result.rowcount
+
+
+def unbilled_students(academic_year, term):
+    """{class: students} enrolled in a period who have no ledger row for it.
+
+    The roll is whoever the period's rollover (the latest one not reverted)
+    moved on, at the class recorded for them then, plus the students still
+    in the period at their current class.
+    """
+    def no_ledger_row(reg_number):
+        return ~db.exists().where(
+            StudentBalance.student_reg_number == reg_number,
+            StudentBalance.academic_year == academic_year,
+            StudentBalance.term == term
+        )
+
+    unbilled = {}
+    student_class = db.func.coalesce(Student.student_class, '')
+    queries = [db.session.query(student_class, db.func.count(Student.id)).filter(
+        Student.academic_year == academic_year, Student.term == term, no_ledger_row(Student.reg_number)
+    ).group_by(student_class)]
+    rollover = Rollover.query.filter_by(from_year=academic_year, from_term=term, reverted_at=None).order_by(
+        Rollover.id.desc()).first()
+    if rollover is not None:
+        rolled_class = db.func.coalesce(RolloverStudent.student_class, '')
+        queries.append(db.session.query(rolled_class, db.func.count()).filter(
+            RolloverStudent.rollover_id == rollover.id, no_ledger_row(RolloverStudent.student_reg_number)
+        ).group_by(rolled_class))
+    for query in queries:
+        for student_class, students in query:
+            unbilled[student_class] = unbilled.get(student_class, 0) + students
+    return unbilled
+
+
+def collection_summary(academic_year, term):
+    """School-wide collected vs expected for one period, per class and in total.
+
+    Students with a ledger row for the period count at that row's class and
+    price; the rest of the period's roll (see unbilled_students()) at the
+    class they had then and the fee schedule's price. Promotions and later
+    class changes therefore leave past periods' figures as they were.
+    """
+    student_class = db.func.coalesce(StudentBalance.student_class, '')
+    billed = {
+        row[0]: row[1:]
+        for row in db.session.query(
+            student_class, db.func.count(), db.func.sum(StudentBalance.expected),
+            db.func.sum(db.case((StudentBalance.expected > 0, 1), else_=0))
+        ).filter(
+            StudentBalance.academic_year == academic_year, StudentBalance.term == term
+        ).group_by(student_class)
+    }
+    unbilled = unbilled_students(academic_year, term)
+    summaries = {
+        row.student_class: row
+        for row in ClassTermSummary.query.filter_by(academic_year=academic_year, term=term)
+    }
+    order = {student_class: i for i, student_class in enumerate(fee_classes())}
+
+    classes = []
+    totals = dict.fromkeys(('students', 'expected', 'collected', 'outstanding',
+                            'paid_in_full', 'part_paid', 'unpaid', 'defaulters'), 0)
+    for student_class in sorted(set(billed) | set(unbilled) | set(summaries),
+                                key=lambda c: (order.get(c, len(order)), c)):
+        billed_students, billed_expected, billed_with_fee = billed.get(student_class, (0, 0.0, 0))
+        unbilled_count = unbilled.get(student_class, 0)
+        fee = expected_fee(student_class, term, academic_year)
+        students = billed_students + unbilled_count
+        expected = (billed_expected or 0.0) + fee * unbilled_count
+        summary = summaries.get(student_class)
+        collected = summary.collected if summary else 0.0
+        paying = summary.paying if summary else 0
+        paid_in_full = summary.paid_in_full if summary else 0
+        row = {
+            'student_class': student_class or 'Unassigned',
+            'students': students,
+            'expected': round(expected, 2),
+            'collected': collected,
+            'outstanding': round(expected - collected, 2),
+            'paid_in_full': paid_in_full,
+            'part_paid': paying - paid_in_full,
+            'unpaid': max(students - paying, 0),
+            'defaulters': billed_with_fee - paid_in_full + (unbilled_count if fee > 0 else 0),
+        }
+        classes.append(row)
+        for name in totals:
+            totals[name] = round(totals[name] + row[name], 2)
+    return {'academic_year': academic_year, 'term': term, 'classes': classes, 'totals': totals}
+
+
+def daily_collection_totals(start, end):
+    """[{'date', 'amount', 'payments'}] per day between start and end inclusive."""
+    rows = db.session.query(
+        DailyCollection.collection_date,
+        db.func.sum(DailyCollection.amount),
+        db.func.sum(DailyCollection.payments)
+    ).filter(DailyCollection.collection_date.between(start, end)).group_by(
+        DailyCollection.collection_date).order_by(DailyCollection.collection_date)
+    return [{'date': day, 'amount': amount or 0.0, 'payments': count or 0} for day, amount, count in rows]
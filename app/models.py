@@ -1,18 +1,366 @@
-from . import db
+import math
+from datetime import date, datetime
+from decimal import ROUND_HALF_UP, Decimal
+
 from flask_login import UserMixin
+from sqlalchemy.sql import operators
 
-class User(UserMixin, db.Model):
+from . import db
+
+
+TERM_ORDER = ('First Term', 'Second Term', 'Third Term')
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%Y/%m/%d')
+# Larger single payments are typing mistakes; the ceiling also keeps
+# amounts well inside the BIGINT kobo column.
+MAX_PAYMENT_AMOUNT = 100_000_000
+
+
+def academic_year_start(academic_year):
+    """2024 for '2024/2025'; None when the year is missing or malformed."""
+    try:
+        return int(academic_year.split('/')[0])
+    except (AttributeError, ValueError):
+        return None
+
+
+def term_ordinal(term):
+    """1, 2 or 3 for First, Second or Third Term; None for anything else."""
+    return TERM_ORDER.index(term) + 1 if term in TERM_ORDER else None
+
+
+def parse_date(value):
+    """A date from a date, ISO or day-first string; None for blanks, ValueError for garbage."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date) or value is None:
+        return value
+    value = value.strip()
+    if not value:
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Unrecognised date '{value}'; use YYYY-MM-DD.")
+
+
+def parse_amount(value):
+    """A payment amount in naira from a number or a string like '12,500.50'.
+
+    Raises ValueError unless it is a finite amount of at least one kobo and
+    no more than MAX_PAYMENT_AMOUNT; float() alone accepts 'nan' and 'inf'.
     """
-    A User model for storing user account details.
+    try:
+        amount = float(str(value).replace(',', '').strip())
+    except ValueError:
+        amount = 0.0
+    if not math.isfinite(amount) or amount < 0.01:
+        raise ValueError('Amount must be a positive number.')
+    if amount > MAX_PAYMENT_AMOUNT:
+        raise ValueError(f'Amount cannot be more than ₦{MAX_PAYMENT_AMOUNT:,}.')
+    return amount
+
+
+def _academic_year_start_default(context):
+    return academic_year_start(context.get_current_parameters().get('academic_year'))
+
+
+def _term_ordinal_default(context):
+    return term_ordinal(context.get_current_parameters().get('term'))
+
+
+class Money(db.TypeDecorator):
+    """Naira amounts stored as a whole number of kobo.
+
+    Integers keep SUMs and running balances exact on SQLite as well, where
+    NUMERIC columns hold REAL. Values are bound in naira (int, float or
+    Decimal, rounded to the kobo) and come back as float naira, so the
+    arithmetic in views is unchanged. Sums and differences of Money
+    expressions stay Money, so they are converted back too.
     """
-    __tablename__ = 'users'
+    impl = db.BigInteger
+    cache_ok = True
+
+    class comparator_factory(db.TypeDecorator.Comparator):
+        def _adapt_expression(self, op, other_comparator):
+            if op in (operators.add, operators.sub):
+                return op, self.type
+            return super()._adapt_expression(op, other_comparator)
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return int((Decimal(str(value)) * 100).to_integral_value(ROUND_HALF_UP))
+
+    def process_result_value(self, value, dialect):
+        # PostgreSQL returns SUM(bigint) as a Decimal.
+        return None if value is None else float(value) / 100
+
 
+class User(UserMixin, db.Model):
+    __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(120), unique=True, nullable=False)
-    # Corrected column name to password_hash
-    password_hash = db.Column(db.String(128), nullable=False) 
+    password = db.Column(db.String(255), nullable=False)
     role = db.Column(db.String(20))
 
-    def __repr__(self):
-        return f'<User {self.username}>'
+class Student(db.Model):
+    __tablename__ = 'students'
+    __table_args__ = (
+        # (name, id) is the keyset order of /students; the class/term variants
+        # serve the filtered listings and the facet dropdowns.
+        db.Index('ix_students_name_id', 'name', 'id'),
+        db.Index('ix_students_class_name_id', 'student_class', 'name', 'id'),
+        db.Index('ix_students_term_name_id', 'term', 'name', 'id'),
+        db.Index('ix_students_admission_date', 'admission_date'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    reg_number = db.Column(db.String(50), unique=True, nullable=False)
+    name = db.Column(db.String(120), nullable=False)
+    dob = db.Column(db.Date)
+    gender = db.Column(db.String(10))
+    address = db.Column(db.String(255))
+    phone = db.Column(db.String(20))
+    email = db.Column(db.String(120))
+    student_class = db.Column(db.String(50))
+    term = db.Column(db.String(50))
+    academic_year = db.Column(db.String(20))
+    admission_date = db.Column(db.Date)
+    # Bumped by touch_students() whenever anything on the student's pages changes.
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime)
+
+class Payment(db.Model):
+    __tablename__ = 'payments'
+    __table_args__ = (
+        # Trailing amount_paid makes the per-period SUM an index-only scan.
+        db.Index('ix_payments_student_period', 'student_reg_number', 'academic_year', 'term', 'amount_paid'),
+        db.Index('ix_payments_student_date', 'student_reg_number', 'payment_date'),
+        db.Index('ix_payments_payment_date', 'payment_date'),
+        # Archived payments keep their ids, so SQLite must not hand them out
+        # again once they have left this table (PostgreSQL sequences never do).
+        {'sqlite_autoincrement': True},
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    student_reg_number = db.Column(db.String(50), db.ForeignKey('students.reg_number'), nullable=False)
+    term = db.Column(db.String(50))
+    academic_year = db.Column(db.String(20))
+    amount_paid = db.Column(Money)
+    payment_date = db.Column(db.Date)
+    academic_year_start = db.Column(db.Integer, default=_academic_year_start_default)
+    term_ordinal = db.Column(db.Integer, default=_term_ordinal_default)
+    recorded_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    batch_id = db.Column(db.Integer, db.ForeignKey('payment_batches.id'), index=True)
+
+class PaymentBatch(db.Model):
+    """One submission of the batch payment form or API.
+
+    The idempotency key is unique per user, and the per-row results are kept
+    so a resubmitted batch gets the original answer instead of posting twice.
+    """
+    __tablename__ = 'payment_batches'
+    __table_args__ = (
+        db.UniqueConstraint('recorded_by', 'idempotency_key', name='uq_payment_batches_key'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(64), nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    recorded_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    payment_count = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(Money, nullable=False, default=0.0)
+    results = db.Column(db.Text)
+
+class PaymentArchive(db.Model):
+    """Payments from academic years closed by archive_academic_year().
+
+    Same columns as payments, ids included, so a year can be moved back
+    with restore_academic_year(). Only reports and rebuilds read it.
+    """
+    __tablename__ = 'payments_archive'
+    __table_args__ = (
+        db.Index('ix_payments_archive_year', 'academic_year'),
+        db.Index('ix_payments_archive_student_date', 'student_reg_number', 'payment_date'),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    student_reg_number = db.Column(db.String(50), nullable=False)
+    term = db.Column(db.String(50))
+    academic_year = db.Column(db.String(20))
+    amount_paid = db.Column(Money)
+    payment_date = db.Column(db.Date)
+    academic_year_start = db.Column(db.Integer)
+    term_ordinal = db.Column(db.Integer)
+    recorded_by = db.Column(db.Integer, nullable=False)
+    batch_id = db.Column(db.Integer)
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+class PaymentHistory(db.Model):
+    """Per-student, per-term payment totals for archived academic years.
+
+    Stands in for the archived rows wherever payments are summed, and is
+    what student_details() lists for terms no longer in the payments table.
+    """
+    __tablename__ = 'payment_history'
+    __table_args__ = (
+        db.UniqueConstraint('student_reg_number', 'academic_year', 'term', name='uq_payment_history_period'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    student_reg_number = db.Column(db.String(50), nullable=False)
+    academic_year = db.Column(db.String(20), nullable=False)
+    term = db.Column(db.String(50), nullable=False)
+    academic_year_start = db.Column(db.Integer)
+    term_ordinal = db.Column(db.Integer)
+    payments = db.Column(db.Integer, nullable=False, default=0)
+    amount_paid = db.Column(Money, nullable=False, default=0.0)
+    last_payment_date = db.Column(db.Date)
+
+class ArchivedYear(db.Model):
+    __tablename__ = 'archived_years'
+    academic_year = db.Column(db.String(20), primary_key=True)
+    payments = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(Money, nullable=False, default=0.0)
+    archived_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class StudentBalance(db.Model):
+    """Running expected/paid/outstanding totals for one student and term.
+
+    Maintained in the same transaction as every Payment insert, so fee reads
+    are a single indexed lookup instead of a SUM over payments. Each row keeps
+    the class the period is priced at, so promoting a student changes what
+    later terms cost without repricing the ones already behind them.
+    """
+    __tablename__ = 'student_balances'
+    __table_args__ = (
+        db.UniqueConstraint('student_reg_number', 'academic_year', 'term', name='uq_student_balances_period'),
+        # collection_summary() reads one period across every student.
+        db.Index('ix_student_balances_academic_year_term', 'academic_year', 'term'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    student_reg_number = db.Column(db.String(50), db.ForeignKey('students.reg_number'), nullable=False)
+    academic_year = db.Column(db.String(20), nullable=False)
+    term = db.Column(db.String(50), nullable=False)
+    academic_year_start = db.Column(db.Integer, default=_academic_year_start_default)
+    term_ordinal = db.Column(db.Integer, default=_term_ordinal_default)
+    student_class = db.Column(db.String(50))
+    expected = db.Column(Money, nullable=False, default=0.0, server_default='0')
+    paid = db.Column(Money, nullable=False, default=0.0, server_default='0')
+    outstanding = db.Column(Money, nullable=False, default=0.0, server_default='0')
+
+
+class FeeSchedule(db.Model):
+    __tablename__ = 'fee_schedules'
+    __table_args__ = (
+        db.UniqueConstraint('student_class', 'term', 'academic_year', name='uq_fee_schedules_period'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    student_class = db.Column(db.String(50), nullable=False)
+    term = db.Column(db.String(50), nullable=False)
+    academic_year = db.Column(db.String(20), nullable=False)
+    amount = db.Column(Money, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ClassTermSummary(db.Model):
+    """Collections and payment counts per class and term, kept in step with the ledger.
+
+    Expected totals and defaulter counts are not stored: they follow from the
+    number of students in the class and the fee schedule at read time.
+    """
+    __tablename__ = 'class_term_summaries'
+    __table_args__ = (
+        db.UniqueConstraint('academic_year', 'term', 'student_class', name='uq_class_term_summaries_period'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    student_class = db.Column(db.String(50), nullable=False)
+    academic_year = db.Column(db.String(20), nullable=False)
+    term = db.Column(db.String(50), nullable=False)
+    collected = db.Column(Money, nullable=False, default=0.0)
+    paying = db.Column(db.Integer, nullable=False, default=0)
+    paid_in_full = db.Column(db.Integer, nullable=False, default=0)
+
+
+class DailyCollection(db.Model):
+    """Money received per day, split by class and the term it was paid for."""
+    __tablename__ = 'daily_collections'
+    __table_args__ = (
+        db.UniqueConstraint('collection_date', 'student_class', 'academic_year', 'term',
+                            name='uq_daily_collections_key'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    collection_date = db.Column(db.Date, nullable=False)
+    student_class = db.Column(db.String(50), nullable=False)
+    academic_year = db.Column(db.String(20), nullable=False)
+    term = db.Column(db.String(50), nullable=False)
+    amount = db.Column(Money, nullable=False, default=0.0)
+    payments = db.Column(db.Integer, nullable=False, default=0)
+
+
+class CacheVersion(db.Model):
+    """Monotonic version stamps that per-worker caches compare against."""
+    __tablename__ = 'cache_versions'
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime)
+
+
+class Job(db.Model):
+    """A unit of background work, claimed and run by `flask jobs worker`.
+
+    status moves queued -> running -> done | failed. Handlers report
+    progress as they go; downloads are kept in result_data until the
+    worker purges finished jobs after JOBS_RETENTION_DAYS.
+    """
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_status_id', 'status', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    message = db.Column(db.String(255))
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    worker = db.Column(db.String(100))
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    result = db.Column(db.Text)
+    result_name = db.Column(db.String(255))
+    result_mimetype = db.Column(db.String(100))
+    result_data = db.Column(db.LargeBinary)
+    error = db.Column(db.Text)
+
+
+class Rollover(db.Model):
+    """One end-of-term/year rollover, as applied by apply_rollover().
+
+    The students it moved are listed in rollover_students with the class,
+    term and year they had before, so the latest rollover can be undone.
+    """
+    __tablename__ = 'rollovers'
+    id = db.Column(db.Integer, primary_key=True)
+    from_year = db.Column(db.String(20), nullable=False)
+    from_term = db.Column(db.String(50), nullable=False)
+    to_year = db.Column(db.String(20), nullable=False)
+    to_term = db.Column(db.String(50), nullable=False)
+    promoted = db.Column(db.Boolean, nullable=False, default=False)
+    student_count = db.Column(db.Integer, nullable=False, default=0)
+    promoted_count = db.Column(db.Integer, nullable=False, default=0)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    reverted_at = db.Column(db.DateTime)
+    reverted_count = db.Column(db.Integer)
+
 
+class RolloverStudent(db.Model):
+    __tablename__ = 'rollover_students'
+    rollover_id = db.Column(db.Integer, db.ForeignKey('rollovers.id'), primary_key=True)
+    student_reg_number = db.Column(db.String(50), primary_key=True)
+    student_class = db.Column(db.String(50))
+    term = db.Column(db.String(50))
+    academic_year = db.Column(db.String(20))
+    new_class = db.Column(db.String(50))
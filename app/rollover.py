@@ -0,0 +1,187 @@
+from datetime import datetime
+
+from . import db
+from .models import (TERM_ORDER, Student, StudentBalance, Rollover, RolloverStudent, academic_year_start,
+                     term_ordinal)
+from .cache import bump_cache_version
+from .fees import FEE_STRUCTURE
+from .ledger import rebuild_daily_collections, refresh_class_term_summaries, reprice_balances
+from .students import invalidate_student_facets
+
+
+def class_ladder():
+    """Classes in promotion order: the FEE_STRUCTURE order, Nur. 1 up to SS 3."""
+    return list(dict.fromkeys(student_class for student_class, _ in FEE_STRUCTURE))
+
+
+def next_school_period(academic_year, term):
+    """The (academic_year, term) after the given one; the year turns over after Third Term."""
+    start, ordinal = academic_year_start(academic_year), term_ordinal(term)
+    if start is None or ordinal is None:
+        raise ValueError(f"Cannot roll over from '{term} {academic_year}'.")
+    if ordinal < len(TERM_ORDER):
+        return academic_year, TERM_ORDER[ordinal]
+    return f'{start + 1}/{start + 2}', TERM_ORDER[0]
+
+
+def student_periods():
+    """[(academic_year, term, students)] for every period students are currently in, newest first."""
+    rows = db.session.query(Student.academic_year, Student.term, db.func.count(Student.id)).filter(
+        Student.academic_year.isnot(None), Student.term.isnot(None)
+    ).group_by(Student.academic_year, Student.term).all()
+    return sorted(rows, key=lambda row: (academic_year_start(row[0]) or 0, term_ordinal(row[1]) or 0), reverse=True)
+
+
+def _rollover_selection(academic_year, term, promote, held):
+    """(WHERE clause, new class expression) for the students a rollover moves.
+
+    At the end of the year everyone moves one rung up class_ladder() except
+    the `held` reg numbers, who repeat their class; students finishing the top
+    class are left where they are. Classes not on the ladder keep their name.
+    """
+    condition = db.and_(Student.academic_year == academic_year, Student.term == term)
+    if not promote:
+        return condition, Student.student_class
+    ladder = class_ladder()
+    new_class = db.case(dict(zip(ladder, ladder[1:])), value=Student.student_class, else_=Student.student_class)
+    leaving = db.func.coalesce(Student.student_class, '') == ladder[-1]
+    if held:
+        new_class = db.case((Student.reg_number.in_(held), Student.student_class), else_=new_class)
+        leaving = db.and_(leaving, Student.reg_number.notin_(held))
+    return db.and_(condition, db.not_(leaving)), new_class
+
+
+def rollover_plan(academic_year, term, held=()):
+    """What apply_rollover() would do, without changing anything.
+
+    Returns the target period and a list of (from class, to class, students)
+    moves, plus the number of students leaving the top class.
+    """
+    to_year, to_term = next_school_period(academic_year, term)
+    promote = to_year != academic_year
+    held = sorted(set(held)) if promote else []
+    ladder = class_ladder()
+    promotions = dict(zip(ladder, ladder[1:])) if promote else {}
+
+    period = Student.query.with_entities(Student.student_class, db.func.count(Student.id)).filter(
+        Student.academic_year == academic_year, Student.term == term
+    ).group_by(Student.student_class)
+    counts = dict(period.all())
+    held_counts = dict(period.filter(Student.reg_number.in_(held)).all()) if held else {}
+
+    moves, graduating = [], 0
+    for student_class in sorted(counts, key=lambda name: (ladder.index(name) if name in ladder else len(ladder),
+                                                          name or '')):
+        repeating = held_counts.get(student_class, 0)
+        moving = counts[student_class] - repeating
+        if promote and student_class == ladder[-1]:
+            graduating += moving
+        elif moving:
+            moves.append((student_class, promotions.get(student_class, student_class), moving))
+        if repeating:
+            moves.append((student_class, student_class, repeating))
+    return {
+        'from_year': academic_year, 'from_term': term, 'to_year': to_year, 'to_term': to_term,
+        'promote': promote, 'held': held, 'moves': moves, 'graduating': graduating,
+        'students': sum(count for _, _, count in moves),
+        'promoted': sum(count for old, new, count in moves if old != new),
+    }
+
+
+def _after_rollover(rollover):
+    """Bring the ledger and rollups in line with the students' new classes. Does not commit.
+
+    A promotion changes what a student's terms cost from the rollover's
+    target year on; earlier terms stay priced, and bucketed, at the class
+    the student was in then.
+    """
+    bump_cache_version('students')
+    if rollover.promoted:
+        balances = StudentBalance.__table__
+        moved = db.select(RolloverStudent.student_reg_number).where(RolloverStudent.rollover_id == rollover.id)
+        current_class = db.select(Student.student_class).where(
+            Student.reg_number == balances.c.student_reg_number).scalar_subquery()
+        db.session.execute(balances.update().where(
+            balances.c.student_reg_number.in_(moved),
+            balances.c.academic_year_start >= academic_year_start(rollover.to_year)
+        ).values(student_class=current_class))
+        reprice_balances()
+        refresh_class_term_summaries()
+        rebuild_daily_collections()
+
+
+def apply_rollover(academic_year, term, created_by=None, held=()):
+    """Move every student in (academic_year, term) on to the next period, in one transaction.
+
+    At a year boundary classes are promoted as described in
+    _rollover_selection(). Each moved student's old class, term and year are
+    copied into rollover_students with one INSERT ... SELECT and the students
+    are then changed by one UPDATE, so the cost does not grow with requests
+    per student. Commits and returns the Rollover.
+    """
+    plan = rollover_plan(academic_year, term, held)
+    if not plan['students']:
+        raise ValueError(f'No students to roll over from {term} {academic_year}.')
+    rollover = Rollover(from_year=academic_year, from_term=term, to_year=plan['to_year'], to_term=plan['to_term'],
+                        promoted=plan['promote'], created_by=created_by)
+    db.session.add(rollover)
+    db.session.flush()
+
+    condition, new_class = _rollover_selection(academic_year, term, plan['promote'], plan['held'])
+    db.session.execute(RolloverStudent.__table__.insert().from_select(
+        ['rollover_id', 'student_reg_number', 'student_class', 'term', 'academic_year', 'new_class'],
+        db.select(db.literal(rollover.id), Student.reg_number, Student.student_class, Student.term,
+                  Student.academic_year, new_class).where(condition)
+    ))
+    students = Student.__table__
+    moved = db.select(RolloverStudent.student_reg_number).where(RolloverStudent.rollover_id == rollover.id)
+    result = db.session.execute(students.update().where(students.c.reg_number.in_(moved)).values(
+        student_class=new_class, term=plan['to_term'], academic_year=plan['to_year'],
+        data_version=students.c.data_version + 1, updated_at=datetime.utcnow()
+    ))
+    rollover.student_count = result.rowcount
+    rollover.promoted_count = db.session.query(db.func.count()).select_from(RolloverStudent).filter(
+        RolloverStudent.rollover_id == rollover.id,
+        RolloverStudent.student_class != RolloverStudent.new_class
+    ).scalar()
+    _after_rollover(rollover)
+    db.session.commit()
+    invalidate_student_facets()
+    return rollover
+
+
+def revert_rollover(rollover_id=None):
+    """Put students back where the most recent rollover found them. Commits and returns the Rollover.
+
+    Only the latest rollover that has not been reverted can be undone, and
+    only students still in the period it moved them to are touched, so later
+    edits to a student are not overwritten.
+    """
+    rollover = Rollover.query.filter(Rollover.reverted_at.is_(None)).order_by(Rollover.id.desc()).first()
+    if rollover is None:
+        raise ValueError('There is no rollover to revert.')
+    if rollover_id is not None and rollover.id != rollover_id:
+        raise ValueError(f'Only the most recent rollover (#{rollover.id}) can be reverted.')
+
+    students = Student.__table__
+    records = RolloverStudent.__table__
+
+    def previous(column):
+        return db.select(records.c[column]).where(
+            records.c.rollover_id == rollover.id, records.c.student_reg_number == students.c.reg_number
+        ).scalar_subquery()
+
+    result = db.session.execute(students.update().where(
+        students.c.reg_number.in_(db.select(records.c.student_reg_number).where(records.c.rollover_id == rollover.id)),
+        students.c.academic_year == rollover.to_year,
+        students.c.term == rollover.to_term
+    ).values(
+        student_class=previous('student_class'), term=previous('term'), academic_year=previous('academic_year'),
+        data_version=students.c.data_version + 1, updated_at=datetime.utcnow()
+    ))
+    rollover.reverted_at = datetime.utcnow()
+    rollover.reverted_count = result.rowcount
+    _after_rollover(rollover)
+    db.session.commit()
+    invalidate_student_facets()
+    return rollover
@@ -1,97 +1,730 @@
-from flask import render_template, redirect, url_for, flash, request, Blueprint
-from . import db, bcrypt
-from .forms import LoginForm, CreateUserForm
-from .models import User
+import csv
+import io
+import json
+import secrets
+import time
+from datetime import date, datetime, timedelta
+
+from flask import render_template, request, redirect, url_for, flash, g, abort, jsonify, send_file
 from flask_login import login_user, logout_user, login_required, current_user
+from sqlalchemy.orm import defer
 
-main_bp = Blueprint('main', __name__)
+from . import db
+from .models import (FeeSchedule, Job, Payment, PaymentBatch, PaymentHistory, Rollover, Student, StudentBalance, User,
+                     parse_amount, parse_date)
+from .assets import send_asset
+from .auth import authenticate, hash_password
+from .cache import bump_cache_version, cached_page, touch_students
+from .documents import receipt_number, receipt_pdf, render_statement_pdf, safe_filename, statement_data
+from .exports import BACKGROUND_EXPORTS, EXPORT_FORMATS, export_response, export_rows
+from .fees import (FEE_STRUCTURE, attach_fee_status, current_fee_schedule, expected_fee, fee_classes, fee_status_for,
+                   fee_terms, get_current_school_period, with_fee_status, years_priced_from)
+from .imports import IdempotencyConflict, import_payments, import_students, iter_import_rows, record_payment_batch
+from .jobs import ADMIN_JOBS, JOB_HANDLERS, enqueue_job
+from .ledger import (apply_balance_deltas, build_fee_breakdown, collection_summary, daily_collection_totals,
+                     move_daily_collections, record_daily_collections, refresh_class_term_summaries,
+                     reprice_student_balances)
+from .rollover import apply_rollover, class_ladder, revert_rollover, rollover_plan, student_periods
+from .students import (count_students, decode_cursor, filter_students, get_student_facets, invalidate_student_facets,
+                       keyset_page, student_list_stamp, student_page_stamp, typeahead_students)
 
-@main_bp.route('/create_first_admin')
-def create_first_admin():
-    try:
-        # Check if an admin user already exists to prevent misuse
-        existing_user = User.query.filter_by(username='admin').first()
-        if existing_user:
-            flash('Admin user already exists. You can log in.', 'info')
-            return redirect(url_for('main.login'))
 
-        # Hash the password for the new admin user
-        hashed_password = bcrypt.generate_password_hash('admin').decode('utf-8')
-        
-        # Create the new user object
-        first_admin = User(username='admin', password=hashed_password, role='admin')
-        
-        # Add to the database
-        db.session.add(first_admin)
-        db.session.commit()
-        
-        flash('First admin user created successfully. You can now log in.', 'success')
-        return redirect(url_for('main.login'))
+def register_routes(app):
+    """Attach the page views to `app`; called once by create_app()."""
+
+    @app.route('/assets/<path:filename>')
+    def asset(filename):
+        return send_asset(filename)
+
+    @app.route('/create_first_admin')
+    def create_first_admin():
+        try:
+            existing_user = User.query.filter_by(username='admin').first()
+            if existing_user:
+                flash('Admin user already exists. You can log in.', 'info')
+                return redirect(url_for('login'))
+
+            hashed_password = hash_password('admin')
+            first_admin = User(username='admin', password=hashed_password, role='admin')
+            db.session.add(first_admin)
+            db.session.commit()
+            
+            flash('First admin user created successfully. You can now log in.', 'success')
+            return redirect(url_for('login'))
+        except Exception as e:
+            db.session.rollback()
+            flash(f'An error occurred: {str(e)}', 'error')
+            return redirect(url_for('login'))
+
+    @app.route('/')
+    @login_required
+    def index():
+        current_academic_year, current_term = get_current_school_period()
+        query = with_fee_status(Student.query, current_academic_year, current_term)
+        students_with_status = attach_fee_status(
+            query.order_by(Student.admission_date.desc()).limit(5).all()
+        )
+
+        return render_template('index.html', students=students_with_status)
+
+    @app.route('/login', methods=['GET', 'POST'])
+    def login():
+        if current_user.is_authenticated:
+            return redirect(url_for('index'))
+            
+        if request.method == 'POST':
+            username = request.form['username']
+            password = request.form['password']
+            user = authenticate(username, password)
+            if user:
+                login_user(user)
+                flash('Login successful!', 'success')
+                return redirect(url_for('index'))
+            else:
+                flash('Invalid username or password.', 'error')
+        return render_template('login.html')
+
+    @app.route('/register', methods=['GET', 'POST'])
+    def register():
+        if request.method == 'POST':
+            username = request.form['username']
+            password = request.form['password']
+            existing_user = User.query.filter_by(username=username).first()
+            if existing_user:
+                flash('Username already exists. Please choose a different one.', 'error')
+            else:
+                hashed_password = hash_password(password)
+                new_user = User(username=username, password=hashed_password, role='user')
+                db.session.add(new_user)
+                db.session.commit()
+                flash('Registration successful! You can now log in.', 'success')
+                return redirect(url_for('login'))
+        return render_template('register.html')
+
+    @app.route('/logout')
+    @login_required
+    def logout():
+        logout_user()
+        flash('You have been logged out.', 'info')
+        return redirect(url_for('login'))
         
-    except Exception as e:
-        # Catch any errors and provide a specific flash message
-        db.session.rollback()
-        flash(f'An error occurred while creating the admin user: {str(e)}', 'danger')
-        return redirect(url_for('main.login'))
-
-@main_bp.route('/', methods=['GET', 'POST'])
-@main_bp.route('/login', methods=['GET', 'POST'])
-def login():
-    if current_user.is_authenticated:
-        return redirect(url_for('main.dashboard'))
-
-    form = LoginForm()
-    
-    if form.validate_on_submit():
-        user = User.query.filter_by(username=form.username.data).first()
+    @app.route('/register_student', methods=('GET', 'POST'))
+    @login_required
+    def register_student():
+        if current_user.role != 'admin':
+            abort(403)
+            
+        if request.method == 'POST':
+            reg_number = request.form['reg_number'].strip()
+            name = request.form['name'].strip()
+            dob = request.form['dob'].strip()
+            gender = request.form['gender'].strip()
+            address = request.form['address'].strip()
+            phone = request.form['phone'].strip()
+            email = request.form['email'].strip()
+            student_class = request.form['class'].strip()
+            term = request.form['term'].strip()
+            academic_year = request.form['academic_year'].strip()
+            admission_date = date.today()
+            
+            existing_student = Student.query.filter_by(reg_number=reg_number).first()
+            if existing_student:
+                flash(f'Error: Student with Registration Number {reg_number} already exists.', 'error')
+            else:
+                try:
+                    new_student = Student(
+                        reg_number=reg_number,
+                        name=name,
+                        dob=parse_date(dob),
+                        gender=gender,
+                        address=address,
+                        phone=phone,
+                        email=email,
+                        student_class=student_class,
+                        term=term,
+                        academic_year=academic_year,
+                        admission_date=admission_date
+                    )
+                    db.session.add(new_student)
+                    touch_students()
+                    db.session.commit()
+                    invalidate_student_facets()
+                    flash(f'Student {name} registered successfully!', 'success')
+                    return redirect(url_for('student_details', reg_number=reg_number))
+                except Exception as e:
+                    db.session.rollback()
+                    flash(f'Database error: {e}', 'error')
+
+        classes = sorted(list(set(item[0] for item in FEE_STRUCTURE.keys())))
+        terms = sorted(list(set(item[1] for item in FEE_STRUCTURE.keys())))
+        current_year_val = datetime.now().year
+        academic_years = [f"{y}/{y+1}" for y in range(current_year_val - 2, current_year_val + 3)]
+
+        return render_template('register_student.html', classes=classes, terms=terms, academic_years=academic_years)
         
-        if user and bcrypt.check_password_hash(user.password, form.password.data):
-            login_user(user)
-            return redirect(url_for('main.dashboard'))
+    @app.route('/import/<kind>', methods=['GET', 'POST'])
+    @login_required
+    def bulk_import(kind):
+        if current_user.role != 'admin':
+            abort(403)
+        if kind not in ('students', 'payments'):
+            abort(404)
+
+        report = None
+        if request.method == 'POST':
+            upload = request.files.get('file')
+            if upload is None or not upload.filename:
+                flash('Please choose a CSV or XLSX file to import.', 'error')
+            else:
+                rows = iter_import_rows(upload.stream, upload.filename)
+                batch_size = app.config['IMPORT_BATCH_SIZE']
+                try:
+                    if kind == 'students':
+                        report = import_students(rows, batch_size=batch_size)
+                    else:
+                        report = import_payments(rows, current_user.id, batch_size=batch_size)
+                    flash(f"Imported {report['inserted']} {kind}; {len(report['errors'])} rows rejected.",
+                          'success' if not report['errors'] else 'warning')
+                except (ValueError, UnicodeDecodeError, csv.Error) as e:
+                    db.session.rollback()
+                    flash(f'Could not read {upload.filename}: {e}', 'error')
+
+        return render_template('bulk_import.html', kind=kind, report=report)
+
+    @app.route('/fees', methods=['GET', 'POST'])
+    @login_required
+    def fee_schedule():
+        if current_user.role != 'admin':
+            abort(403)
+
+        current_academic_year, _ = get_current_school_period()
+        academic_year = request.values.get('academic_year', current_academic_year).strip()
+        classes, terms = fee_classes(), fee_terms()
+
+        if request.method == 'POST':
+            existing = {
+                (row.student_class, row.term): row
+                for row in FeeSchedule.query.filter_by(academic_year=academic_year)
+            }
+            changed = []
+            try:
+                for i, student_class in enumerate(classes):
+                    for j, term in enumerate(terms):
+                        raw = request.form.get(f'fee_{i}_{j}', '').replace(',', '').strip()
+                        if not raw:
+                            continue
+                        amount = float(raw)
+                        if amount < 0:
+                            raise ValueError(f'The fee for {student_class} {term} cannot be negative.')
+                        row = existing.get((student_class, term))
+                        if row is None:
+                            db.session.add(FeeSchedule(
+                                student_class=student_class, term=term, academic_year=academic_year, amount=amount
+                            ))
+                            changed.append((student_class, term))
+                        elif row.amount != amount:
+                            row.amount = amount
+                            changed.append((student_class, term))
+                if changed:
+                    bump_cache_version('fee_schedule')
+                    g.pop('fee_schedule_version', None)
+                db.session.commit()
+                flash(f'Saved {len(changed)} fee changes for {academic_year}.', 'success')
+                ledger_years = [year for year, in db.session.query(StudentBalance.academic_year).distinct()]
+                periods = sorted({
+                    (student_class, year)
+                    for student_class, term in changed
+                    for year in years_priced_from(student_class, term, academic_year, ledger_years)
+                })
+                if periods:
+                    job = enqueue_job('reprice_balances', {'periods': periods}, current_user.id)
+                    years = ', '.join(sorted({year for _, year in periods}))
+                    flash(f'Balances for {years} are being recalculated (job #{job.id}).', 'info')
+                return redirect(url_for('fee_schedule', academic_year=academic_year))
+            except ValueError as e:
+                db.session.rollback()
+                flash(f'Invalid fee: {e}', 'error')
+            except Exception as e:
+                db.session.rollback()
+                flash(f'Database error: {e}', 'error')
+
+        overrides = current_fee_schedule()['fees']
+        rows = [
+            (student_class, [
+                (term, expected_fee(student_class, term, academic_year),
+                 (student_class, term, academic_year) in overrides)
+                for term in terms
+            ])
+            for student_class in classes
+        ]
+        current_year_val = datetime.now().year
+        academic_years = [f"{y}/{y+1}" for y in range(current_year_val - 2, current_year_val + 3)]
+        return render_template('fee_schedule.html', rows=rows, terms=terms,
+                               academic_year=academic_year, academic_years=academic_years)
+
+    @app.route('/rollover', methods=['GET', 'POST'])
+    @login_required
+    def rollover():
+        if current_user.role != 'admin':
+            abort(403)
+
+        periods = student_periods()
+        if 'period' in request.values:
+            academic_year, _, term = request.values['period'].partition('|')
+        elif periods:
+            academic_year, term, _ = max(periods, key=lambda row: row[2])
         else:
-            flash('Invalid username or password', 'danger')
-            
-    return render_template('login.html', form=form)
-
-@main_bp.route('/dashboard')
-@login_required
-def dashboard():
-    return render_template('dashboard.html')
-
-@main_bp.route('/logout')
-@login_required
-def logout():
-    logout_user()
-    flash('You have been logged out successfully.', 'success')
-    return redirect(url_for('main.login'))
-
-@main_bp.route('/register', methods=['GET', 'POST'])
-@login_required
-def register():
-    return render_template('register.html')
-
-@main_bp.route('/add_student', methods=['GET', 'POST'])
-@login_required
-def add_student():
-    return render_template('add_student.html')
-
-@main_bp.route('/create_user', methods=['GET', 'POST'])
-@login_required
-def create_user():
-    form = CreateUserForm()
-    if form.validate_on_submit():
-        existing_user = User.query.filter_by(username=form.username.data).first()
-        if existing_user:
-            flash('Username already exists. Please choose a different one.', 'warning')
-            return render_template('create_user.html', form=form)
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
-        new_user = User(
-            username=form.username.data,
-            password=hashed_password,
-            role=form.role.data
+            academic_year = term = None
+        held = request.values.get('hold', '').replace(',', ' ').split()
+
+        plan = None
+        if academic_year and term:
+            try:
+                plan = rollover_plan(academic_year, term, held)
+            except ValueError as e:
+                flash(str(e), 'error')
+
+        if request.method == 'POST' and plan:
+            if str(plan['students']) != request.form.get('students'):
+                flash('Students have changed since the preview; check the counts and apply again.', 'error')
+            else:
+                try:
+                    record = apply_rollover(academic_year, term, current_user.id, held)
+                    flash(f'Rollover #{record.id} moved {record.student_count} students to '
+                          f'{record.to_term} {record.to_year}.', 'success')
+                    return redirect(url_for('rollover'))
+                except ValueError as e:
+                    db.session.rollback()
+                    flash(str(e), 'error')
+                except Exception as e:
+                    db.session.rollback()
+                    flash(f'Database error: {e}', 'error')
+
+        latest = Rollover.query.filter(Rollover.reverted_at.is_(None)).order_by(Rollover.id.desc()).first()
+        return render_template('rollover.html', periods=periods, academic_year=academic_year, from_term=term,
+                               hold=' '.join(held), plan=plan, top_class=class_ladder()[-1],
+                               rollovers=Rollover.query.order_by(Rollover.id.desc()).limit(20).all(),
+                               revertible_id=latest.id if latest else None)
+
+    @app.route('/rollover/<int:rollover_id>/revert', methods=['POST'])
+    @login_required
+    def rollover_revert(rollover_id):
+        if current_user.role != 'admin':
+            abort(403)
+        try:
+            record = revert_rollover(rollover_id)
+            flash(f'Rollover #{record.id} reverted; {record.reverted_count} students moved back to '
+                  f'{record.from_term} {record.from_year}.', 'success')
+        except ValueError as e:
+            db.session.rollback()
+            flash(str(e), 'error')
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Database error: {e}', 'error')
+        return redirect(url_for('rollover'))
+
+    @app.route('/api/students/typeahead')
+    @login_required
+    def student_typeahead():
+        search_query = request.args.get('q', '').strip()
+        limit = max(1, min(request.args.get('limit', 10, type=int), 25))
+        started = time.perf_counter()
+        results = typeahead_students(search_query, limit) if len(search_query) >= 2 else []
+        for result in results:
+            result['url'] = url_for('student_details', reg_number=result['reg_number'])
+        response = jsonify({
+            'query': search_query,
+            'results': results,
+            'took_ms': round((time.perf_counter() - started) * 1000, 2),
+        })
+        response.headers['Cache-Control'] = 'private, max-age=30'
+        return response
+
+    @app.route('/students')
+    @login_required
+    @cached_page(student_list_stamp)
+    def student_list():
+        status_filter = request.args.get('status', 'all')
+        class_filter = request.args.get('class', 'all')
+        term_filter = request.args.get('term', 'all')
+        search_query = request.args.get('search_query', '').strip()
+        page_size = request.args.get('page_size', type=int) or app.config['STUDENTS_PAGE_SIZE']
+        page_size = max(1, min(page_size, app.config['STUDENTS_MAX_PAGE_SIZE']))
+        after = decode_cursor(request.args.get('after'))
+        before = decode_cursor(request.args.get('before'))
+
+        query = filter_students(Student.query, class_filter, term_filter, search_query)
+
+        current_academic_year, current_term_for_status = get_current_school_period()
+        status_query = with_fee_status(query, current_academic_year, current_term_for_status, status=status_filter)
+        rows, next_cursor, prev_cursor = keyset_page(status_query, page_size, after=after, before=before)
+        students_with_status = attach_fee_status(rows)
+
+        filtered = bool(search_query) or class_filter != 'all' or term_filter != 'all' or status_filter != 'all'
+        total_count, count_is_estimate = count_students(
+            status_query if status_filter != 'all' else query, filtered
         )
-        db.session.add(new_user)
-        db.session.commit()
-        flash('New user created successfully!', 'success')
-        return redirect(url_for('main.dashboard'))
-    return render_template('create_user.html', form=form)
+        filter_args = {
+            'status': status_filter,
+            'class': class_filter,
+            'term': term_filter,
+            'search_query': search_query,
+            'page_size': page_size,
+        }
+
+        all_classes, all_terms = get_student_facets()
+
+        return render_template(
+            'student_list.html',
+            students=students_with_status,
+            status_filter=status_filter,
+            class_filter=class_filter,
+            term_filter=term_filter,
+            search_query=search_query,
+            classes=all_classes,
+            terms=all_terms,
+            fee_statuses=['Paid', 'Defaulter', 'N/A'],
+            filter_args=filter_args,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor,
+            total_count=total_count,
+            count_is_estimate=count_is_estimate
+        )
+
+    def summary_args():
+        current_year, current_term = get_current_school_period()
+        academic_year = request.args.get('academic_year', current_year)
+        term = request.args.get('term', current_term)
+        days = max(1, min(request.args.get('days', 30, type=int), 366))
+        end = date.today()
+        return academic_year, term, end - timedelta(days=days - 1), end
+
+    @app.route('/summary')
+    @login_required
+    def collections_summary():
+        if current_user.role != 'admin':
+            abort(403)
+        academic_year, term, start, end = summary_args()
+        summary = collection_summary(academic_year, term)
+        daily = daily_collection_totals(start, end)
+        current_year_val = datetime.now().year
+        academic_years = [f"{y}/{y+1}" for y in range(current_year_val - 2, current_year_val + 3)]
+        return render_template('collections_summary.html', summary=summary, daily=daily,
+                               academic_years=academic_years, terms=fee_terms())
+
+    @app.route('/api/summary')
+    @login_required
+    def collections_summary_api():
+        if current_user.role != 'admin':
+            abort(403)
+        academic_year, term, start, end = summary_args()
+        summary = collection_summary(academic_year, term)
+        summary['daily'] = [dict(day, date=day['date'].isoformat()) for day in daily_collection_totals(start, end)]
+        return jsonify(summary)
+
+    @app.route('/export/<report>.<fmt>')
+    @login_required
+    def export_report(report, fmt):
+        if fmt not in EXPORT_FORMATS:
+            abort(404)
+        current_academic_year, current_term = get_current_school_period()
+
+        # The per-term breakdowns walk every student's ledger, so they always
+        # go to the job worker; the others stream unless ?background=1.
+        if report in BACKGROUND_EXPORTS or request.args.get('background'):
+            if current_user.role != 'admin':
+                abort(403)
+            if export_rows(report, {}, current_academic_year, current_term) is None:
+                abort(404)
+            job = enqueue_job('export', {
+                'report': report, 'fmt': fmt, 'filters': request.args.to_dict(),
+                'academic_year': current_academic_year, 'term': current_term,
+            }, current_user.id)
+            return redirect(url_for('job_status', job_id=job.id))
+
+        rows = export_rows(report, request.args, current_academic_year, current_term)
+        if rows is None:
+            abort(404)
+        try:
+            return export_response(rows, report, fmt)
+        except ValueError as e:
+            flash(str(e), 'error')
+            return redirect(url_for('student_list'))
+
+    @app.route('/jobs', methods=['GET', 'POST'])
+    @login_required
+    def jobs():
+        if request.method == 'POST':
+            if current_user.role != 'admin':
+                abort(403)
+            kind = request.form.get('kind')
+            if kind not in ADMIN_JOBS:
+                abort(400)
+            params = {'academic_year': request.form['academic_year']} if request.form.get('academic_year') else {}
+            job = enqueue_job(kind, params, current_user.id)
+            return redirect(url_for('job_status', job_id=job.id))
+
+        query = Job.query.options(defer(Job.result_data), defer(Job.error))
+        if current_user.role != 'admin':
+            query = query.filter(Job.created_by == current_user.id)
+        current_year_val = datetime.now().year
+        return render_template('jobs.html',
+                               jobs=query.order_by(Job.id.desc()).limit(50).all(),
+                               handlers=JOB_HANDLERS,
+                               admin_jobs=ADMIN_JOBS,
+                               academic_years=[f"{y}/{y+1}" for y in range(current_year_val - 2, current_year_val + 3)])
+
+    def visible_job(job_id):
+        job = db.session.get(Job, job_id, options=[defer(Job.result_data)])
+        if job is None or (current_user.role != 'admin' and job.created_by != current_user.id):
+            abort(404)
+        return job
+
+    @app.route('/jobs/<int:job_id>')
+    @login_required
+    def job_status(job_id):
+        job = visible_job(job_id)
+        return render_template('job_status.html', job=job, title=JOB_HANDLERS.get(job.kind, {}).get('title', job.kind),
+                               result=json.loads(job.result) if job.result else None)
+
+    @app.route('/jobs/<int:job_id>/download')
+    @login_required
+    def job_download(job_id):
+        job = visible_job(job_id)
+        if job.status != 'done' or job.result_name is None:
+            abort(404)
+        return send_file(io.BytesIO(job.result_data), as_attachment=True, download_name=job.result_name,
+                         mimetype=job.result_mimetype)
+
+    @app.route('/student/<reg_number>')
+    @login_required
+    @cached_page(student_page_stamp)
+    def student_details(reg_number):
+        student = Student.query.filter_by(reg_number=reg_number).first()
+        if student is None:
+            flash('Student not found!', 'error')
+            return redirect(url_for('student_list'))
+
+        payments = Payment.query.filter_by(student_reg_number=reg_number).order_by(
+            Payment.payment_date.desc(),
+            Payment.academic_year.desc(),
+            Payment.term.desc()
+        ).all()
+        # Closed years only survive as per-term totals.
+        archived_terms = PaymentHistory.query.filter_by(student_reg_number=reg_number).order_by(
+            PaymentHistory.academic_year_start.desc(),
+            PaymentHistory.term_ordinal.desc()
+        ).all()
+        current_academic_year, current_term = get_current_school_period()
+        sorted_fee_breakdown_dict = build_fee_breakdown(student, current_academic_year, current_term)
+        current_period = sorted_fee_breakdown_dict[f"{current_term} {current_academic_year}"]
+        student_fee_status = fee_status_for(current_period['expected'], current_period['paid'])
+
+        return render_template('student_details.html',
+                               student=student,
+                               payments=payments,
+                               archived_terms=archived_terms,
+                               fee_status=student_fee_status,
+                               fee_breakdown=sorted_fee_breakdown_dict,
+                               fee_breakdown_key=[reg_number, student.data_version, g.fee_schedule_version,
+                                                  current_academic_year, current_term],
+                               current_academic_year=current_academic_year,
+                               current_term=current_term
+                               )
+
+    @app.route('/student/<reg_number>/statement.pdf')
+    @login_required
+    def student_statement(reg_number):
+        current_academic_year, current_term = get_current_school_period()
+        academic_year = request.args.get('academic_year', current_academic_year)
+        term = request.args.get('term', current_term)
+        statements = statement_data(Student.query.filter_by(reg_number=reg_number), academic_year, term)
+        if not statements:
+            abort(404)
+        return send_file(io.BytesIO(render_statement_pdf(statements[0])), mimetype='application/pdf',
+                         download_name=f'statement-{safe_filename(reg_number)}-{safe_filename(term)}-'
+                                       f'{safe_filename(academic_year)}.pdf')
+
+    @app.route('/statements.zip')
+    @login_required
+    def class_statements():
+        if current_user.role != 'admin':
+            abort(403)
+        # A statement per student of the filtered list, rendered by the job worker.
+        current_academic_year, current_term = get_current_school_period()
+        job = enqueue_job('statements', {
+            'filters': request.args.to_dict(), 'academic_year': current_academic_year, 'term': current_term,
+        }, current_user.id)
+        return redirect(url_for('job_status', job_id=job.id))
+
+    @app.route('/payments/<int:payment_id>/receipt.pdf')
+    @login_required
+    def payment_receipt(payment_id):
+        pdf = receipt_pdf(payment_id)
+        if pdf is None:
+            abort(404)
+        return send_file(io.BytesIO(pdf), mimetype='application/pdf',
+                         download_name=f'receipt-{receipt_number(payment_id)}.pdf')
+
+    @app.route('/payments/batch/<int:batch_id>/receipts.zip')
+    @login_required
+    def batch_receipts(batch_id):
+        if current_user.role != 'admin':
+            abort(403)
+        if db.session.get(PaymentBatch, batch_id) is None:
+            abort(404)
+        job = enqueue_job('receipts', {'batch_id': batch_id}, current_user.id)
+        return redirect(url_for('job_status', job_id=job.id))
+
+    @app.route('/payments/batch', methods=['GET', 'POST'])
+    @login_required
+    def batch_payments():
+        if current_user.role != 'admin':
+            abort(403)
+
+        default_academic_year, default_term = get_current_school_period()
+        result = None
+        if request.method == 'POST':
+            default_academic_year = request.form.get('academic_year', default_academic_year)
+            default_term = request.form.get('term', default_term)
+            rows = []
+            for i in range(app.config['PAYMENT_BATCH_MAX_ROWS']):
+                reg_number = request.form.get(f'reg_number_{i}', '').strip()
+                if reg_number:
+                    rows.append({
+                        'reg_number': reg_number,
+                        'term': request.form.get(f'term_{i}', '').strip() or default_term,
+                        'academic_year': request.form.get(f'academic_year_{i}', '').strip() or default_academic_year,
+                        'amount_paid': request.form.get(f'amount_{i}', '').strip(),
+                    })
+            if not rows:
+                flash('Enter at least one registration number.', 'error')
+            else:
+                try:
+                    result, replayed = record_payment_batch(rows, current_user.id, request.form['idempotency_key'])
+                    if replayed:
+                        flash('This batch was already submitted; showing the original result.', 'info')
+                    else:
+                        flash(f"Recorded {result['recorded']} payments totalling "
+                              f"₦{result['total_amount']:,.2f}; {result['rejected']} rows need attention.",
+                              'success' if not result['rejected'] else 'warning')
+                except IdempotencyConflict as e:
+                    flash(str(e), 'error')
+
+        current_year_val = datetime.now().year
+        academic_years = [f"{y}/{y+1}" for y in range(current_year_val - 2, current_year_val + 3)]
+        return render_template('batch_payments.html',
+                               result=result,
+                               idempotency_key=secrets.token_urlsafe(16),
+                               row_count=app.config['PAYMENT_BATCH_FORM_ROWS'],
+                               terms=fee_terms(),
+                               academic_years=academic_years,
+                               default_term=default_term,
+                               default_academic_year=default_academic_year)
+
+    @app.route('/make_payment/<reg_number>', methods=['GET', 'POST'])
+    @login_required
+    def make_payment(reg_number):
+        if current_user.role != 'admin':
+            abort(403)
+            
+        student = Student.query.filter_by(reg_number=reg_number).first()
+        if student is None:
+            flash('Student not found!', 'error')
+            return redirect(url_for('student_list'))
+
+        if request.method == 'POST':
+            amount_str = request.form['amount_paid'].strip()
+            term = request.form['term'].strip()
+            academic_year = request.form['academic_year'].strip()
+            recorded_by_user = current_user.id
+            
+            try:
+                amount_paid = parse_amount(amount_str)
+            except ValueError as e:
+                flash(str(e), 'error')
+            else:
+                try:
+                    payment_date = date.today()
+                    new_payment = Payment(
+                        student_reg_number=reg_number,
+                        term=term,
+                        academic_year=academic_year,
+                        amount_paid=amount_paid,
+                        payment_date=payment_date,
+                        recorded_by=recorded_by_user
+                    )
+                    db.session.add(new_payment)
+                    apply_balance_deltas(
+                        {(reg_number, academic_year, term): amount_paid},
+                        {reg_number: student.student_class}
+                    )
+                    record_daily_collections(
+                        [{'student_reg_number': reg_number, 'academic_year': academic_year, 'term': term,
+                          'amount_paid': amount_paid, 'payment_date': payment_date}],
+                        {reg_number: student.student_class}
+                    )
+                    touch_students([reg_number])
+                    db.session.commit()
+                    flash(f'Payment of ₦{amount_paid:,.2f} recorded for {student.name} for {term} {academic_year}; '
+                          f'receipt {receipt_number(new_payment.id)} is in the payment history below.', 'success')
+                    return redirect(url_for('student_details', reg_number=reg_number))
+                except Exception as e:
+                    db.session.rollback()
+                    flash(f'Database error: {e}', 'error')
+
+        terms = sorted(list(set(item[1] for item in FEE_STRUCTURE.keys())))
+        current_year_val = datetime.now().year
+        academic_years = [f"{y}/{y+1}" for y in range(current_year_val - 2, current_year_val + 3)]
+        
+        pre_selected_academic_year, pre_selected_term = get_current_school_period()
+
+        return render_template('make_payment.html',
+                               student=student,
+                               terms=terms,
+                               academic_years=academic_years,
+                               pre_selected_term=pre_selected_term,
+                               pre_selected_academic_year=pre_selected_academic_year)
+
+    @app.route('/edit_student/<reg_number>', methods=['GET', 'POST'])
+    @login_required
+    def edit_student(reg_number):
+        student = Student.query.filter_by(reg_number=reg_number).first_or_404()
+        if current_user.role != 'admin':
+            abort(403)
+            
+        if request.method == 'POST':
+            try:
+                previous_class = student.student_class
+                student.name = request.form['name'].strip()
+                student.dob = parse_date(request.form['dob'])
+                student.gender = request.form['gender'].strip()
+                student.address = request.form['address'].strip()
+                student.phone = request.form['phone'].strip()
+                student.email = request.form['email'].strip()
+                student.student_class = request.form['class'].strip()
+                student.term = request.form['term'].strip()
+                student.academic_year = request.form['academic_year'].strip()
+                if student.student_class != previous_class:
+                    # A class correction reprices the current term onwards;
+                    # terms already behind the student keep their class.
+                    moved = reprice_student_balances(student, *get_current_school_period())
+                    db.session.flush()
+                    refresh_class_term_summaries(
+                        classes=[previous_class, student.student_class, *set(moved.values())])
+                    move_daily_collections(student.reg_number, moved, student.student_class)
+                touch_students([student.reg_number])
+                db.session.commit()
+                invalidate_student_facets()
+                flash(f'Student {student.name} updated successfully!', 'success')
+                return redirect(url_for('student_details', reg_number=reg_number))
+            except Exception as e:
+                db.session.rollback()
+                flash(f'Error updating student: {e}', 'error')
+
+        classes = sorted(list(set(item[0] for item in FEE_STRUCTURE.keys())))
+        terms = sorted(list(set(item[1] for item in FEE_STRUCTURE.keys())))
+        current_year_val = datetime.now().year
+        academic_years = [f"{y}/{y+1}" for y in range(current_year_val - 2, current_year_val + 3)]
+
+        return render_template('edit_student.html', student=student, classes=classes, terms=terms, academic_years=academic_years)
@@ -0,0 +1,285 @@
+import base64
+import binascii
+import json
+import re
+import time
+
+import click
+from flask import current_app
+
+from . import db
+from .models import Student
+from .cache import cache_stamps
+from .fees import get_current_school_period
+
+
+# Search objects live outside the models: an FTS5 table kept in sync by
+# triggers on SQLite, and a generated tsvector column plus trigram indexes on
+# Postgres, plus a lower(reg_number) index for SQLite's reg_number prefix search.
+# Migrations 0005 and 0017 create them; `flask search rebuild` recreates them.
+SQLITE_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS students_fts USING fts5(
+        name, reg_number, content='students', content_rowid='id', tokenize='unicode61', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS students_fts_ai AFTER INSERT ON students BEGIN
+        INSERT INTO students_fts(rowid, name, reg_number) VALUES (new.id, new.name, new.reg_number);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS students_fts_ad AFTER DELETE ON students BEGIN
+        INSERT INTO students_fts(students_fts, rowid, name, reg_number) VALUES ('delete', old.id, old.name, old.reg_number);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS students_fts_au AFTER UPDATE OF name, reg_number ON students BEGIN
+        INSERT INTO students_fts(students_fts, rowid, name, reg_number) VALUES ('delete', old.id, old.name, old.reg_number);
+        INSERT INTO students_fts(rowid, name, reg_number) VALUES (new.id, new.name, new.reg_number);
+    END""",
+    "INSERT INTO students_fts(students_fts) VALUES ('rebuild')",
+    "CREATE INDEX IF NOT EXISTS ix_students_reg_number_lower ON students (lower(reg_number))",
+]
+POSTGRES_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """ALTER TABLE students ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(reg_number, ''))
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_students_search_vector ON students USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_students_name_trgm ON students USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_students_reg_number_trgm ON students USING gin (reg_number gin_trgm_ops)",
+]
+SEARCH_OBJECT_NAMES = {
+    'students_fts', 'search_vector', 'ix_students_search_vector', 'ix_students_name_trgm', 'ix_students_reg_number_trgm',
+    'ix_students_reg_number_lower',
+}
+
+_search_backends = {}
+
+
+def include_in_migrations(obj, name, type_, reflected, compare_to):
+    """Keep autogenerate from dropping the search objects the models do not declare."""
+    return not (name in SEARCH_OBJECT_NAMES or (name or '').startswith('students_fts'))
+
+
+def search_backend():
+    """'fts5', 'postgres' or 'like', depending on which search objects the database has."""
+    engine = db.engine
+    key = engine.url.render_as_string()
+    if key not in _search_backends:
+        backend = 'like'
+        if engine.dialect.name == 'sqlite':
+            if db.session.execute(db.text("SELECT 1 FROM sqlite_master WHERE name = 'students_fts'")).scalar():
+                backend = 'fts5'
+        elif engine.dialect.name == 'postgresql':
+            if db.session.execute(db.text(
+                "SELECT 1 FROM information_schema.columns WHERE table_name = 'students' AND column_name = 'search_vector'"
+            )).scalar():
+                backend = 'postgres'
+        _search_backends[key] = backend
+    return _search_backends[key]
+
+
+def rebuild_search_index():
+    engine = db.engine
+    statements = {'sqlite': SQLITE_SEARCH_DDL, 'postgresql': POSTGRES_SEARCH_DDL}.get(engine.dialect.name)
+    if statements is None:
+        raise click.ClickException(f'No search index support for {engine.dialect.name}.')
+    for statement in statements:
+        db.session.execute(db.text(statement))
+    db.session.commit()
+    _search_backends.clear()
+
+
+def search_tokens(search_query):
+    return re.findall(r'\w+', search_query.lower())
+
+
+def _like_escape(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _reg_number_prefix(search_query):
+    # A half-open range rather than LIKE 'x%' so an index is used. Compared in lower
+    # case (ix_students_reg_number_lower) so 'afa-2024' still finds 'AFA-2024/...'.
+    prefix = search_query.lower()
+    reg_number = db.func.lower(Student.reg_number)
+    return db.and_(reg_number >= prefix, reg_number < prefix + '\uffff')
+
+
+def search_condition(search_query):
+    """WHERE clause matching a name or reg_number search through the database's text index."""
+    backend = search_backend()
+    tokens = search_tokens(search_query)
+    if backend == 'fts5':
+        condition = _reg_number_prefix(search_query)
+        if tokens:
+            match = ' '.join(f'"{token}"*' for token in tokens)
+            matches = db.select(db.literal_column('rowid')).select_from(db.table('students_fts')).where(
+                db.text('students_fts MATCH :fts_match').bindparams(fts_match=match))
+            condition = db.or_(condition, Student.id.in_(matches))
+        return condition
+    pattern = _like_escape(search_query)
+    if backend == 'postgres':
+        # ILIKE with a leading wildcard is served by the gin_trgm_ops indexes.
+        return db.or_(Student.name.ilike(f'%{pattern}%', escape='\\'),
+                      Student.reg_number.ilike(f'{pattern}%', escape='\\'))
+    return db.or_(Student.name.like(f'%{pattern}%', escape='\\'),
+                  Student.reg_number.like(f'%{pattern}%', escape='\\'))
+
+
+def typeahead_students(search_query, limit=10):
+    """Best matches for a search box, reg_number prefix hits first, then by text rank."""
+    columns = (Student.reg_number, Student.name, Student.student_class)
+    results = db.session.query(*columns).filter(
+        _reg_number_prefix(search_query) if search_backend() == 'fts5'
+        else Student.reg_number.ilike(f'{_like_escape(search_query)}%', escape='\\')
+    ).order_by(Student.reg_number).limit(limit).all()
+
+    remaining = limit - len(results)
+    tokens = search_tokens(search_query)
+    if remaining > 0 and tokens:
+        backend = search_backend()
+        if backend == 'fts5':
+            ranked = db.session.execute(db.text(
+                "SELECT s.reg_number, s.name, s.student_class FROM students_fts "
+                "JOIN students AS s ON s.id = students_fts.rowid "
+                "WHERE students_fts MATCH :match ORDER BY bm25(students_fts) LIMIT :limit"
+            ), {'match': ' '.join(f'"{token}"*' for token in tokens), 'limit': limit}).all()
+        elif backend == 'postgres':
+            ranked = db.session.execute(db.text(
+                "SELECT reg_number, name, student_class FROM students "
+                "WHERE search_vector @@ to_tsquery('simple', :tsquery) "
+                "ORDER BY ts_rank(search_vector, to_tsquery('simple', :tsquery)) DESC, similarity(name, :q) DESC "
+                "LIMIT :limit"
+            ), {'tsquery': ' & '.join(f'{token}:*' for token in tokens), 'q': search_query, 'limit': limit}).all()
+        else:
+            ranked = db.session.query(*columns).filter(search_condition(search_query)).order_by(
+                Student.name).limit(limit).all()
+        seen = {row[0] for row in results}
+        results += [row for row in ranked if row[0] not in seen][:remaining]
+
+    return [{'reg_number': reg, 'name': name, 'student_class': student_class}
+            for reg, name, student_class in results]
+
+
+def filter_students(query, class_filter='all', term_filter='all', search_query=''):
+    """Apply the /students search and class/term filters to a Student query."""
+    if search_query:
+        query = query.filter(search_condition(search_query))
+    if class_filter != 'all':
+        query = query.filter(Student.student_class == class_filter)
+    if term_filter != 'all':
+        query = query.filter(Student.term == term_filter)
+    return query
+
+
+# Per-worker cache of the distinct class/term values shown in the /students
+# filters. Writes in this worker invalidate it; other workers pick changes up
+# within FACET_CACHE_TTL seconds.
+_facet_cache = {'facets': None, 'expires': 0.0}
+
+
+def get_student_facets():
+    """Return (classes, terms) present in the students table, cached."""
+    now = time.monotonic()
+    facets = _facet_cache['facets']
+    if facets is not None and _facet_cache['expires'] > now:
+        return facets
+
+    classes = sorted(c for (c,) in db.session.query(Student.student_class).distinct() if c)
+    terms = sorted(t for (t,) in db.session.query(Student.term).distinct() if t)
+    facets = (classes, terms)
+    _facet_cache['facets'] = facets
+    _facet_cache['expires'] = now + current_app.config['FACET_CACHE_TTL']
+    return facets
+
+
+def invalidate_student_facets():
+    _facet_cache['facets'] = None
+
+
+def encode_cursor(name, student_id):
+    payload = json.dumps([name, student_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the (name, id) pair in a listing cursor, or None if it is malformed."""
+    if not cursor:
+        return None
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        name, student_id = json.loads(payload)
+        return str(name), int(student_id)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+
+
+def keyset_page(query, page_size, after=None, before=None, key=lambda row: row[0]):
+    """Fetch one page of a Student query ordered by (name, id).
+
+    `after`/`before` are decoded cursors; seeking on the (name, id) key means
+    every page costs the same regardless of how deep the user has paged.
+    `key` picks the object carrying .name/.id out of a row; column-only
+    queries that select Student.name and Student.id can pass the row itself.
+    Returns (rows, next_cursor, prev_cursor).
+    """
+    if before is not None:
+        name, student_id = before
+        query = query.filter(db.or_(
+            Student.name < name,
+            db.and_(Student.name == name, Student.id < student_id)
+        )).order_by(Student.name.desc(), Student.id.desc())
+    else:
+        if after is not None:
+            name, student_id = after
+            query = query.filter(db.or_(
+                Student.name > name,
+                db.and_(Student.name == name, Student.id > student_id)
+            ))
+        query = query.order_by(Student.name, Student.id)
+
+    rows = query.limit(page_size + 1).all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if before is not None:
+        rows.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, after is not None
+
+    if not rows:
+        return rows, None, None
+    first, last = key(rows[0]), key(rows[-1])
+    next_cursor = encode_cursor(last.name, last.id) if has_next else None
+    prev_cursor = encode_cursor(first.name, first.id) if has_prev else None
+    return rows, next_cursor, prev_cursor
+
+
+def count_students(query, filtered):
+    """Total rows for a listing, as (count, is_estimate).
+
+    Unfiltered listings on Postgres use the planner's row estimate once the
+    table is large enough for an exact COUNT(*) to matter.
+    """
+    if not filtered and db.session.get_bind().dialect.name == 'postgresql':
+        estimate = db.session.execute(
+            db.text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'students'")
+        ).scalar()
+        if estimate and estimate >= 10000:
+            return estimate, True
+    return query.order_by(None).count(), False
+
+
+def _latest(*timestamps):
+    timestamps = [timestamp for timestamp in timestamps if timestamp is not None]
+    return max(timestamps) if timestamps else None
+
+
+def student_page_stamp(reg_number):
+    row = db.session.query(Student.data_version, Student.updated_at).filter_by(reg_number=reg_number).first()
+    if row is None:
+        return None
+    fee_version, fees_updated = cache_stamps('fee_schedule')['fee_schedule']
+    return [row.data_version, fee_version, get_current_school_period()], _latest(row.updated_at, fees_updated)
+
+
+def student_list_stamp():
+    stamps = cache_stamps('students', 'fee_schedule')
+    return ([stamps['students'][0], stamps['fee_schedule'][0], get_current_school_period()],
+            _latest(stamps['students'][1], stamps['fee_schedule'][1]))
@@ -0,0 +1,55 @@
+# /gunicorn.conf.py
+
+# Gunicorn settings matched to the database profile. Run with:
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#
+# SQLite allows one writer at a time, so it gets few processes and a handful
+# of threads each; WAL lets the readers carry on while a payment is written.
+# Postgres scales with CPUs. Every worker opens its own connection pool, and
+# the app sizes that pool from WEB_THREADS, which is exported below.
+#
+# SECRET_KEY has to be set in the environment. Without it every worker makes
+# up its own random key and can't read sessions signed by the others, so
+# logins and flash messages fail at random; the config refuses to start.
+
+import multiprocessing
+import os
+
+PROFILES = {
+    'sqlite': {'workers': 2, 'threads': 4},
+    'postgres': {'workers': multiprocessing.cpu_count() * 2 + 1, 'threads': 4},
+}
+
+if not os.environ.get('SECRET_KEY'):
+    raise RuntimeError('SECRET_KEY is not set; every gunicorn worker needs the same one (see gunicorn.conf.py).')
+
+database_url = os.environ.get('DATABASE_URL', '')
+profile_name = os.environ.get('DEPLOY_PROFILE') or ('postgres' if database_url.startswith('postgres') else 'sqlite')
+profile = PROFILES[profile_name]
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', profile['workers']))
+threads = int(os.environ.get('WEB_THREADS', profile['threads']))
+os.environ['WEB_THREADS'] = str(threads)
+# Workers compile every template at boot (from the shared bytecode cache
+# after the first one) instead of on their first requests.
+os.environ.setdefault('TEMPLATE_PRELOAD', '1')
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then so slow leaks never build up.
+max_requests = 2000
+max_requests_jitter = 200
+# Each worker must build its own engine and pool after the fork.
+preload_app = False
+accesslog = '-'
+
+
+def post_worker_init(worker):
+    # create_app() records how long the worker took to build the app.
+    startup = getattr(worker.wsgi, 'extensions', {}).get('startup_ms')
+    if startup:
+        worker.log.info('Worker %s app ready in %.1f ms (%s)', worker.pid, startup['total'],
+                        ', '.join(f'{phase} {ms}' for phase, ms in startup.items() if phase != 'total'))
@@ -0,0 +1,64 @@
+"""initial schema
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-17 22:19:09.360959
+
+Existing databases created with db.create_all() already have these tables;
+mark them with `flask db stamp 0001` before the first `flask db upgrade`.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=120), nullable=False),
+    sa.Column('password', sa.String(length=128), nullable=False),
+    sa.Column('role', sa.String(length=20), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('username')
+    )
+    op.create_table('students',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('reg_number', sa.String(length=50), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.Column('dob', sa.String(length=20), nullable=True),
+    sa.Column('gender', sa.String(length=10), nullable=True),
+    sa.Column('address', sa.String(length=255), nullable=True),
+    sa.Column('phone', sa.String(length=20), nullable=True),
+    sa.Column('email', sa.String(length=120), nullable=True),
+    sa.Column('student_class', sa.String(length=50), nullable=True),
+    sa.Column('term', sa.String(length=50), nullable=True),
+    sa.Column('academic_year', sa.String(length=20), nullable=True),
+    sa.Column('admission_date', sa.String(length=20), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('reg_number')
+    )
+    op.create_table('payments',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('student_reg_number', sa.String(length=50), nullable=False),
+    sa.Column('term', sa.String(length=50), nullable=True),
+    sa.Column('academic_year', sa.String(length=20), nullable=True),
+    sa.Column('amount_paid', sa.Float(), nullable=True),
+    sa.Column('payment_date', sa.String(length=20), nullable=True),
+    sa.Column('recorded_by', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['recorded_by'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['student_reg_number'], ['students.reg_number'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('payments')
+    op.drop_table('students')
+    op.drop_table('users')
@@ -0,0 +1,72 @@
+"""student balance ledger
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 22:31:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+# Snapshot of FEE_STRUCTURE at the time of this migration, used to price the
+# backfilled rows. Later fee changes are applied with `flask ledger rebuild`.
+FEES = {
+    'Nur. 1': (50000.00, 45000.00, 40000.00),
+    'Nur. 2': (52000.00, 47000.00, 42000.00),
+    'Nur. 3': (55000.00, 50000.00, 45000.00),
+    'Basic 1': (60000.00, 55000.00, 50000.00),
+    'Basic 2': (62000.00, 57000.00, 52000.00),
+    'Basic 3': (65000.00, 60000.00, 55000.00),
+    'JSS 1': (70000.00, 65000.00, 60000.00),
+    'JSS 2': (72000.00, 67000.00, 62000.00),
+    'JSS 3': (75000.00, 70000.00, 65000.00),
+    'SS 1': (80000.00, 75000.00, 70000.00),
+    'SS 2': (82000.00, 77000.00, 72000.00),
+    'SS 3': (85000.00, 80000.00, 75000.00),
+}
+TERMS = ('First Term', 'Second Term', 'Third Term')
+
+
+def upgrade():
+    op.create_table('student_balances',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('student_reg_number', sa.String(length=50), nullable=False),
+    sa.Column('academic_year', sa.String(length=20), nullable=False),
+    sa.Column('term', sa.String(length=50), nullable=False),
+    sa.Column('expected', sa.Float(), nullable=False),
+    sa.Column('paid', sa.Float(), nullable=False),
+    sa.Column('outstanding', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['student_reg_number'], ['students.reg_number'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('student_reg_number', 'academic_year', 'term', name='uq_student_balances_period')
+    )
+
+    whens = ' '.join(
+        f"WHEN s.student_class = '{student_class}' AND t.term = '{term}' THEN {amount}"
+        for student_class, amounts in FEES.items()
+        for term, amount in zip(TERMS, amounts)
+    )
+    expected = f'(CASE {whens} ELSE 0.0 END)'
+    op.execute(f"""
+        INSERT INTO student_balances (student_reg_number, academic_year, term, expected, paid, outstanding)
+        SELECT t.student_reg_number, t.academic_year, t.term, {expected}, t.total_paid, {expected} - t.total_paid
+        FROM (
+            SELECT student_reg_number, academic_year, term, SUM(amount_paid) AS total_paid
+            FROM payments
+            WHERE academic_year IS NOT NULL AND term IS NOT NULL
+            GROUP BY student_reg_number, academic_year, term
+        ) AS t
+        LEFT OUTER JOIN students AS s ON s.reg_number = t.student_reg_number
+    """)
+
+
+def downgrade():
+    op.drop_table('student_balances')
@@ -0,0 +1,67 @@
+"""student search index
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 23:02:51.774310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+SQLITE_UPGRADE = [
+    """CREATE VIRTUAL TABLE students_fts USING fts5(
+        name, reg_number, content='students', content_rowid='id', tokenize='unicode61', prefix='2 3'
+    )""",
+    """CREATE TRIGGER students_fts_ai AFTER INSERT ON students BEGIN
+        INSERT INTO students_fts(rowid, name, reg_number) VALUES (new.id, new.name, new.reg_number);
+    END""",
+    """CREATE TRIGGER students_fts_ad AFTER DELETE ON students BEGIN
+        INSERT INTO students_fts(students_fts, rowid, name, reg_number) VALUES ('delete', old.id, old.name, old.reg_number);
+    END""",
+    """CREATE TRIGGER students_fts_au AFTER UPDATE OF name, reg_number ON students BEGIN
+        INSERT INTO students_fts(students_fts, rowid, name, reg_number) VALUES ('delete', old.id, old.name, old.reg_number);
+        INSERT INTO students_fts(rowid, name, reg_number) VALUES (new.id, new.name, new.reg_number);
+    END""",
+    "INSERT INTO students_fts(students_fts) VALUES ('rebuild')",
+]
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS students_fts_au",
+    "DROP TRIGGER IF EXISTS students_fts_ad",
+    "DROP TRIGGER IF EXISTS students_fts_ai",
+    "DROP TABLE IF EXISTS students_fts",
+]
+POSTGRES_UPGRADE = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """ALTER TABLE students ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(reg_number, ''))
+    ) STORED""",
+    "CREATE INDEX ix_students_search_vector ON students USING gin (search_vector)",
+    "CREATE INDEX ix_students_name_trgm ON students USING gin (name gin_trgm_ops)",
+    "CREATE INDEX ix_students_reg_number_trgm ON students USING gin (reg_number gin_trgm_ops)",
+]
+POSTGRES_DOWNGRADE = [
+    "DROP INDEX IF EXISTS ix_students_reg_number_trgm",
+    "DROP INDEX IF EXISTS ix_students_name_trgm",
+    "DROP INDEX IF EXISTS ix_students_search_vector",
+    "ALTER TABLE students DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for statement in {'sqlite': SQLITE_UPGRADE, 'postgresql': POSTGRES_UPGRADE}.get(dialect, []):
+        op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for statement in {'sqlite': SQLITE_DOWNGRADE, 'postgresql': POSTGRES_DOWNGRADE}.get(dialect, []):
+        op.execute(statement)
@@ -0,0 +1,183 @@
+"""typed money, date and period columns
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 23:41:08.112954
+
+Expand / backfill / contract so it can run against a live database: the new
+columns are added next to the old ones, filled in id-ordered batches that
+each commit on their own, and only then swapped in. Values that do not parse
+as dates become NULL rather than failing the migration.
+
+"""
+from datetime import date, datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+BATCH_SIZE = 5000
+TERM_ORDER = ('First Term', 'Second Term', 'Third Term')
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%Y/%m/%d')
+MONEY = sa.Numeric(12, 2)
+
+# table -> {old column: (new type, converter)}
+CONVERSIONS = {
+    'students': {
+        'dob': (sa.Date(), lambda value: _parse_date(value)),
+        'admission_date': (sa.Date(), lambda value: _parse_date(value)),
+    },
+    'payments': {
+        'amount_paid': (MONEY, lambda value: value),
+        'payment_date': (sa.Date(), lambda value: _parse_date(value)),
+    },
+    'student_balances': {
+        'expected': (MONEY, lambda value: value or 0),
+        'paid': (MONEY, lambda value: value or 0),
+        'outstanding': (MONEY, lambda value: value or 0),
+    },
+    'fee_schedules': {
+        'amount': (MONEY, lambda value: value or 0),
+    },
+}
+NOT_NULL = {('student_balances', 'expected'), ('student_balances', 'paid'),
+            ('student_balances', 'outstanding'), ('fee_schedules', 'amount')}
+PERIOD_TABLES = ('payments', 'student_balances')
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), fmt).date()
+        except ValueError:
+            pass
+    return None
+
+
+def _academic_year_start(value):
+    try:
+        return int(value.split('/')[0])
+    except (AttributeError, ValueError):
+        return None
+
+
+def _term_ordinal(value):
+    return TERM_ORDER.index(value) + 1 if value in TERM_ORDER else None
+
+
+def _backfill(table_name, columns, convert):
+    """Write convert(row) into `columns` for every row, one committed batch at a time."""
+    source = [sa.column('id')] + [sa.column(name) for name in convert.source_columns]
+    targets = [sa.column(name) for name in columns]
+    table = sa.table(table_name, *source, *targets)
+    last_id = 0
+    while True:
+        with op.get_context().autocommit_block():
+            bind = op.get_bind()
+            rows = bind.execute(
+                sa.select(*source).where(table.c.id > last_id).order_by(table.c.id).limit(BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            bind.execute(
+                table.update().where(table.c.id == sa.bindparam('row_id')).values(
+                    {name: sa.bindparam(f'v_{name}') for name in columns}
+                ),
+                [dict(row_id=row.id, **{f'v_{name}': value for name, value in zip(columns, convert(row))})
+                 for row in rows]
+            )
+            last_id = rows[-1].id
+
+
+def _converter(table_name, include_period):
+    conversions = CONVERSIONS[table_name]
+    source_columns = list(conversions)
+    if include_period:
+        source_columns += ['academic_year', 'term']
+
+    def convert(row):
+        values = [convert_value(getattr(row, name)) for name, (_, convert_value) in conversions.items()]
+        if include_period:
+            values += [_academic_year_start(row.academic_year), _term_ordinal(row.term)]
+        return values
+
+    convert.source_columns = source_columns
+    return convert
+
+
+def upgrade():
+    op.drop_index('ix_students_admission_date', table_name='students')
+    op.drop_index('ix_payments_student_period', table_name='payments')
+    op.drop_index('ix_payments_student_date', table_name='payments')
+
+    # expand
+    for table_name, conversions in CONVERSIONS.items():
+        for name, (type_, _) in conversions.items():
+            if (table_name, name) in NOT_NULL:
+                column = sa.Column(f'{name}_new', type_, nullable=False, server_default='0')
+            else:
+                column = sa.Column(f'{name}_new', type_, nullable=True)
+            op.add_column(table_name, column)
+    for table_name in PERIOD_TABLES:
+        op.add_column(table_name, sa.Column('academic_year_start', sa.Integer(), nullable=True))
+        op.add_column(table_name, sa.Column('term_ordinal', sa.Integer(), nullable=True))
+
+    # backfill
+    for table_name, conversions in CONVERSIONS.items():
+        include_period = table_name in PERIOD_TABLES
+        columns = [f'{name}_new' for name in conversions]
+        if include_period:
+            columns += ['academic_year_start', 'term_ordinal']
+        _backfill(table_name, columns, _converter(table_name, include_period))
+
+    # contract
+    for table_name, conversions in CONVERSIONS.items():
+        for name in conversions:
+            op.drop_column(table_name, name)
+            op.alter_column(table_name, f'{name}_new', new_column_name=name)
+
+    op.create_index('ix_students_admission_date', 'students', ['admission_date'], unique=False)
+    op.create_index('ix_payments_student_period', 'payments',
+                    ['student_reg_number', 'academic_year', 'term', 'amount_paid'], unique=False)
+    op.create_index('ix_payments_student_date', 'payments', ['student_reg_number', 'payment_date'], unique=False)
+    op.create_index('ix_payments_payment_date', 'payments', ['payment_date'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_payments_payment_date', table_name='payments')
+    op.drop_index('ix_payments_student_date', table_name='payments')
+    op.drop_index('ix_payments_student_period', table_name='payments')
+    op.drop_index('ix_students_admission_date', table_name='students')
+
+    for table_name in PERIOD_TABLES:
+        op.drop_column(table_name, 'term_ordinal')
+        op.drop_column(table_name, 'academic_year_start')
+
+    dialect = op.get_bind().dialect.name
+    for table_name, conversions in CONVERSIONS.items():
+        for name, (type_, _) in conversions.items():
+            old_type = sa.String(length=20) if isinstance(type_, sa.Date) else sa.Float()
+            if dialect == 'sqlite':
+                # SQLite keeps dates as ISO text and numerics as REAL, so the
+                # data is already in the old representation.
+                op.add_column(table_name, sa.Column(f'{name}_old', old_type))
+                op.execute(f'UPDATE {table_name} SET {name}_old = {name}')
+                op.drop_column(table_name, name)
+                op.alter_column(table_name, f'{name}_old', new_column_name=name)
+            else:
+                op.alter_column(table_name, name, type_=old_type, existing_type=type_,
+                                postgresql_using=f'{name}::{"varchar(20)" if old_type.__class__ is sa.String else "float8"}')
+
+    op.create_index('ix_students_admission_date', 'students', ['admission_date'], unique=False)
+    op.create_index('ix_payments_student_period', 'payments',
+                    ['student_reg_number', 'academic_year', 'term', 'amount_paid'], unique=False)
+    op.create_index('ix_payments_student_date', 'payments', ['student_reg_number', 'payment_date'], unique=False)
@@ -0,0 +1,46 @@
+"""payment ids are never reused
+
+Revision ID: 0015
+Revises: 0014
+Create Date: 2026-10-18 09:12:05.318442
+
+Archived payments keep their ids, but a SQLite INTEGER PRIMARY KEY without
+AUTOINCREMENT hands out max(id) + 1, so ids that moved to payments_archive
+were given to new payments and restoring the year then failed on the
+primary key. The table is rebuilt with AUTOINCREMENT and its sequence
+started past every archived id. PostgreSQL sequences never go backwards,
+so there is nothing to do there.
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0015'
+down_revision = '0014'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('payments', recreate='always', table_kwargs={'sqlite_autoincrement': True}):
+        pass
+    op.execute("""
+        INSERT INTO sqlite_sequence (name, seq)
+        SELECT 'payments', 0 WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'payments')
+    """)
+    op.execute("""
+        UPDATE sqlite_sequence
+        SET seq = max(seq, (SELECT coalesce(max(id), 0) FROM payments),
+                      (SELECT coalesce(max(id), 0) FROM payments_archive))
+        WHERE name = 'payments'
+    """)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('payments', recreate='always', table_kwargs={'sqlite_autoincrement': False}):
+        pass
@@ -0,0 +1,70 @@
+"""money in kobo
+
+Revision ID: 0016
+Revises: 0015
+Create Date: 2026-10-18 10:04:51.902117
+
+Money columns become BIGINT counts of kobo. SQLite stores NUMERIC as REAL,
+so SUMs and running balances picked up binary rounding errors (ten 0.10
+payments summed to 0.9999999999999999); whole numbers of kobo add up
+exactly on every backend.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0016'
+down_revision = '0015'
+branch_labels = None
+depends_on = None
+
+
+MONEY_COLUMNS = {
+    'payments': ('amount_paid',),
+    'payment_batches': ('total_amount',),
+    'payments_archive': ('amount_paid',),
+    'payment_history': ('amount_paid',),
+    'archived_years': ('amount',),
+    'student_balances': ('expected', 'paid', 'outstanding'),
+    'fee_schedules': ('amount',),
+    'class_term_summaries': ('collected',),
+    'daily_collections': ('amount',),
+}
+NUMERIC = sa.Numeric(precision=12, scale=2, asdecimal=False)
+
+
+def _convert(type_, expression):
+    """Retype every money column, rewriting each value with `expression`, a format string over the column name."""
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    for table_name, columns in MONEY_COLUMNS.items():
+        if not sqlite:
+            for name in columns:
+                op.alter_column(table_name, name, type_=type_, postgresql_using=expression.format(name))
+            continue
+        op.execute(f"UPDATE {table_name} SET {', '.join(f'{name} = {expression.format(name)}' for name in columns)}")
+        table_kwargs = {'sqlite_autoincrement': True} if table_name == 'payments' else {}
+        with op.batch_alter_table(table_name, recreate='always', table_kwargs=table_kwargs) as batch_op:
+            for name in columns:
+                batch_op.alter_column(name, type_=type_)
+    if sqlite:
+        # Rebuilding payments restarts its AUTOINCREMENT sequence at max(id);
+        # archived ids must stay used (see 0015).
+        op.execute("""
+            INSERT INTO sqlite_sequence (name, seq)
+            SELECT 'payments', 0 WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'payments')
+        """)
+        op.execute("""
+            UPDATE sqlite_sequence
+            SET seq = max(seq, (SELECT coalesce(max(id), 0) FROM payments_archive))
+            WHERE name = 'payments'
+        """)
+
+
+def upgrade():
+    _convert(sa.BigInteger(), 'round({} * 100)')
+
+
+def downgrade():
+    _convert(NUMERIC, '{} / 100.0')
@@ -0,0 +1,28 @@
+"""case-insensitive reg number search
+
+Revision ID: 0017
+Revises: 0016
+Create Date: 2026-10-18 11:20:37.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0017'
+down_revision = '0016'
+branch_labels = None
+depends_on = None
+
+
+# SQLite matches reg_number prefixes on lower(reg_number); Postgres uses the
+# trigram index from 0005 with ILIKE and needs nothing here.
+def upgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.create_index('ix_students_reg_number_lower', 'students', [sa.text('lower(reg_number)')])
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.drop_index('ix_students_reg_number_lower', table_name='students')
@@ -0,0 +1,88 @@
+import os
+import shutil
+
+import pytest
+from flask_migrate import upgrade
+
+from app import create_app, db, fees, students
+from app.auth import hash_password
+from app.models import Student, User
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+def _make_app(monkeypatch, database_path):
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{database_path}')
+    monkeypatch.setenv('SECRET_KEY', 'test')
+    monkeypatch.setenv('TEMPLATE_CACHE_DIR', '')
+    monkeypatch.setenv('JOBS_EAGER', '1')
+    app = create_app()
+    # Tests post forms without tokens; tests/test_csrf.py turns the check back on.
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    return app
+
+
+@pytest.fixture(scope='session')
+def migrated_database(tmp_path_factory):
+    """A SQLite file at the head migration with one admin user, copied per test."""
+    path = tmp_path_factory.mktemp('template') / 'academy.sqlite'
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        app = _make_app(monkeypatch, path)
+        with app.app_context():
+            upgrade(directory=MIGRATIONS)
+            db.session.add(User(username='admin', password=hash_password('admin'), role='admin'))
+            db.session.add(User(username='clerk', password=hash_password('clerk'), role='user'))
+            db.session.commit()
+            db.engine.dispose()
+    return path
+
+
+@pytest.fixture
+def app(migrated_database, tmp_path, monkeypatch):
+    path = tmp_path / 'academy.sqlite'
+    shutil.copy(migrated_database, path)
+    # Module-level caches outlive the database they were filled from.
+    monkeypatch.setattr(fees, '_fee_schedule_cache', {'version': None, 'fees': {}, 'resolved': {}})
+    students.invalidate_student_facets()
+    app = _make_app(monkeypatch, path)
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+def login(client, user_id):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+@pytest.fixture
+def admin_client(app):
+    return login(app.test_client(), 1)
+
+
+@pytest.fixture
+def clerk_client(app):
+    return login(app.test_client(), 2)
+
+
+@pytest.fixture
+def add_student(app):
+    def add(reg_number, student_class='Nur. 1', term='First Term', academic_year='2025/2026', name=None):
+        with app.app_context():
+            db.session.add(Student(reg_number=reg_number, name=name or f'Student {reg_number}',
+                                   student_class=student_class, term=term, academic_year=academic_year))
+            db.session.commit()
+        return reg_number
+    return add
+
+
+@pytest.fixture
+def pay(admin_client):
+    def pay(reg_number, amount, term='First Term', academic_year='2025/2026'):
+        response = admin_client.post(f'/make_payment/{reg_number}', data={
+            'amount_paid': str(amount), 'term': term, 'academic_year': academic_year})
+        assert response.status_code == 302, response.get_data(as_text=True)
+        return response
+    return pay
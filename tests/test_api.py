@@ -0,0 +1,20 @@
+def student_fees(client, reg_number):
+    response = client.get(f'/api/v1/students/{reg_number}?fields=expected_fee,total_paid,outstanding,fee_status'
+                          '&academic_year=2025/2026&fee_term=First Term')
+    assert response.status_code == 200
+    return response.get_json()['data']
+
+
+def test_overpayment_is_not_negative_outstanding(app, admin_client, add_student, pay):
+    add_student('AFA-001')
+    pay('AFA-001', 60000)
+
+    assert student_fees(admin_client, 'AFA-001') == {
+        'expected_fee': 50000, 'total_paid': 60000, 'outstanding': 0, 'fee_status': 'Paid'}
+
+
+def test_part_payment_outstanding(app, admin_client, add_student, pay):
+    add_student('AFA-001')
+    pay('AFA-001', 20000.5)
+
+    assert student_fees(admin_client, 'AFA-001')['outstanding'] == 29999.5
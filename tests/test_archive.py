@@ -0,0 +1,61 @@
+from app.archive import archive_academic_year, restore_academic_year
+from app.ledger import verify_balances
+from app.models import ArchivedYear, Payment, PaymentArchive, StudentBalance
+
+
+def payment_ids():
+    return sorted(payment_id for payment_id, in Payment.query.with_entities(Payment.id))
+
+
+def archived_ids():
+    return sorted(payment_id for payment_id, in PaymentArchive.query.with_entities(PaymentArchive.id))
+
+
+def test_archive_pay_restore_round_trip(app, add_student, pay):
+    add_student('AFA-001', academic_year='2024/2025')
+    pay('AFA-001', 40000, academic_year='2025/2026')
+    pay('AFA-001', 20000, academic_year='2024/2025')
+    pay('AFA-001', 30000, academic_year='2024/2025')
+
+    with app.app_context():
+        assert archive_academic_year('2024/2025') == 2
+        assert payment_ids() == [1]
+        assert archived_ids() == [2, 3]
+        assert verify_balances() == []
+
+    # The archived ids must not be handed out again.
+    pay('AFA-001', 5000, academic_year='2025/2026')
+    with app.app_context():
+        assert payment_ids() == [1, 4]
+
+        assert restore_academic_year('2024/2025') == 2
+        assert payment_ids() == [1, 2, 3, 4]
+        assert archived_ids() == []
+        assert ArchivedYear.query.count() == 0
+        balance = StudentBalance.query.filter_by(
+            student_reg_number='AFA-001', academic_year='2024/2025', term='First Term').one()
+        assert balance.paid == 50000
+        assert verify_balances() == []
+
+
+def test_rearchiving_picks_up_late_payments(app, add_student, pay):
+    add_student('AFA-001', academic_year='2024/2025')
+    pay('AFA-001', 20000, academic_year='2024/2025')
+    pay('AFA-001', 30000, academic_year='2024/2025')
+
+    with app.app_context():
+        assert archive_academic_year('2024/2025') == 2
+
+    pay('AFA-001', 10000, academic_year='2024/2025')
+    with app.app_context():
+        assert payment_ids() == [3]
+        assert archive_academic_year('2024/2025') == 1
+        assert payment_ids() == []
+        assert archived_ids() == [1, 2, 3]
+        year = ArchivedYear.query.one()
+        assert (year.payments, year.amount) == (3, 60000)
+        assert verify_balances() == []
+
+        assert restore_academic_year('2024/2025') == 3
+        assert payment_ids() == [1, 2, 3]
+        assert verify_balances() == []
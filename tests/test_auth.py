@@ -0,0 +1,38 @@
+from app import create_app, db
+from app.models import User
+
+
+def change_elsewhere(change):
+    """Run `change(user_session)` in a second app, as another worker would, then commit."""
+    other = create_app()
+    with other.app_context():
+        change(db.session)
+        db.session.commit()
+        db.engine.dispose()
+
+
+def test_demoted_user_loses_admin_at_once(app, admin_client):
+    assert admin_client.get('/summary').status_code == 200
+
+    change_elsewhere(lambda session: setattr(session.get(User, 1), 'role', 'user'))
+
+    assert admin_client.get('/summary').status_code == 403
+
+
+def test_deleted_user_is_logged_out_at_once(app, clerk_client):
+    assert clerk_client.get('/students').status_code == 200
+
+    change_elsewhere(lambda session: session.delete(session.get(User, 2)))
+
+    assert clerk_client.get('/students').status_code == 302
+
+
+def test_cached_user_is_loaded_without_querying_the_users_table(app, clerk_client):
+    clerk_client.get('/students')
+    statements = []
+    with app.app_context():
+        db.event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    clerk_client.get('/students')
+
+    assert not [statement for statement in statements if 'FROM users' in statement]
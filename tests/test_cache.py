@@ -0,0 +1,135 @@
+import re
+
+import pytest
+from jinja2 import DictLoader, Environment
+
+from app import routes, students
+from app.cache import NullCache, make_bytecode_cache, preload_templates
+
+
+@pytest.fixture(autouse=True)
+def current_period(monkeypatch):
+    for module in (routes, students):
+        monkeypatch.setattr(module, 'get_current_school_period', lambda: ('2025/2026', 'First Term'))
+
+
+def clear_flashes(client):
+    # A pending flash message bypasses the response cache.
+    with client.session_transaction() as session:
+        session.pop('_flashes', None)
+
+
+def pay_quietly(pay, client, reg_number, amount):
+    pay(reg_number, amount)
+    clear_flashes(client)
+
+
+@pytest.mark.parametrize('url', ['/students', '/student/AFA-001'])
+def test_matching_etag_gets_not_modified(app, admin_client, add_student, url):
+    add_student('AFA-001')
+
+    first = admin_client.get(url)
+    again = admin_client.get(url, headers={'If-None-Match': first.headers['ETag']})
+
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+    assert again.status_code == 304
+    assert again.get_data() == b''
+    assert again.headers['ETag'] == first.headers['ETag']
+
+
+@pytest.mark.parametrize('url', ['/students', '/student/AFA-001'])
+def test_payment_invalidates_cached_pages(app, admin_client, add_student, pay, url):
+    add_student('AFA-001')
+    before = admin_client.get(url)
+    assert '₦50,000.00' in before.get_data(as_text=True)
+
+    pay_quietly(pay, admin_client, 'AFA-001', 12345)
+    after = admin_client.get(url, headers={'If-None-Match': before.headers['ETag']})
+
+    assert after.status_code == 200
+    assert after.headers['ETag'] != before.headers['ETag']
+    assert '₦37,655.00' in after.get_data(as_text=True)
+
+
+def test_payment_leaves_other_students_pages_cached(app, admin_client, add_student, pay):
+    add_student('AFA-001')
+    add_student('AFA-002')
+    before = admin_client.get('/student/AFA-002')
+
+    pay_quietly(pay, admin_client, 'AFA-001', 12345)
+
+    assert admin_client.get('/student/AFA-002', headers={'If-None-Match': before.headers['ETag']}).status_code == 304
+
+
+def test_roles_do_not_share_cached_pages(app, admin_client, clerk_client, add_student):
+    add_student('AFA-001')
+
+    admin_etag = admin_client.get('/students').headers['ETag']
+
+    assert clerk_client.get('/students', headers={'If-None-Match': admin_etag}).status_code == 200
+
+
+def fragments_cached(response):
+    """(hits, fragments) from the render entry of the Server-Timing header."""
+    hits, total = re.search(r'(\d+)/(\d+) fragments cached', response.headers['Server-Timing']).groups()
+    return int(hits), int(total)
+
+
+@pytest.fixture
+def uncached_pages(app):
+    # Render every request so the fragment cache is what gets exercised.
+    app.extensions['response_cache'] = NullCache()
+
+
+def test_student_rows_are_served_from_the_fragment_cache(app, admin_client, add_student, uncached_pages):
+    add_student('AFA-001')
+    add_student('AFA-002')
+
+    assert fragments_cached(admin_client.get('/students')) == (0, 2)
+    assert fragments_cached(admin_client.get('/students')) == (2, 2)
+
+
+def test_renaming_a_student_rerenders_their_row(app, admin_client, add_student, uncached_pages):
+    add_student('AFA-001', name='Ada')
+    add_student('AFA-002', name='Bola')
+    admin_client.get('/students')
+
+    response = admin_client.post('/edit_student/AFA-001', data={
+        'name': 'Adaeze', 'dob': '', 'gender': '', 'address': '', 'phone': '', 'email': '',
+        'class': 'Nur. 1', 'term': 'First Term', 'academic_year': '2025/2026'})
+    assert response.status_code == 302
+    clear_flashes(admin_client)
+    listing = admin_client.get('/students')
+
+    assert fragments_cached(listing) == (1, 2)
+    assert '<td>Adaeze</td>' in listing.get_data(as_text=True)
+
+
+def test_payment_rerenders_the_fee_breakdown(app, admin_client, add_student, pay, uncached_pages):
+    add_student('AFA-001')
+    assert fragments_cached(admin_client.get('/student/AFA-001')) == (0, 1)
+    assert fragments_cached(admin_client.get('/student/AFA-001')) == (1, 1)
+
+    pay_quietly(pay, admin_client, 'AFA-001', 12345)
+    page = admin_client.get('/student/AFA-001')
+
+    assert fragments_cached(page) == (0, 1)
+    assert '₦37,655.00' in page.get_data(as_text=True)
+
+
+def test_bytecode_cache_writes_compiled_templates(tmp_path):
+    directory = tmp_path / 'jinja'
+    env = Environment(loader=DictLoader({'page.html': 'Hello {{ name }}'}),
+                      bytecode_cache=make_bytecode_cache(str(directory)))
+
+    assert env.get_template('page.html').render(name='Ada') == 'Hello Ada'
+    assert [path.name.startswith('academy-') for path in directory.iterdir()] == [True]
+
+
+def test_blank_template_cache_dir_disables_bytecode_cache():
+    assert make_bytecode_cache('') is None
+
+
+def test_preload_templates_loads_every_page(app):
+    assert preload_templates(app) == len(app.jinja_env.list_templates(extensions=['html'])) > 0
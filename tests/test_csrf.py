@@ -0,0 +1,44 @@
+import re
+
+import pytest
+
+from app.models import Payment
+
+
+@pytest.fixture
+def csrf_app(app):
+    app.config['WTF_CSRF_ENABLED'] = True
+    return app
+
+
+PAYMENT = {'amount_paid': '5000', 'term': 'First Term', 'academic_year': '2025/2026'}
+
+
+def test_form_post_without_token_is_rejected(csrf_app, admin_client, add_student):
+    add_student('AFA-001')
+
+    assert admin_client.post('/make_payment/AFA-001', data=PAYMENT).status_code == 400
+
+    with csrf_app.app_context():
+        assert Payment.query.count() == 0
+
+
+def test_form_post_with_the_page_token_is_accepted(csrf_app, admin_client, add_student):
+    add_student('AFA-001')
+    page = admin_client.get('/make_payment/AFA-001').get_data(as_text=True)
+    token = re.search(r'name="csrf_token" value="([^"]+)"', page).group(1)
+
+    assert admin_client.post('/make_payment/AFA-001', data=dict(PAYMENT, csrf_token=token)).status_code == 302
+
+    with csrf_app.app_context():
+        assert Payment.query.count() == 1
+
+
+def test_json_api_is_exempt(csrf_app, admin_client, add_student):
+    add_student('AFA-001')
+    payment = dict(PAYMENT, reg_number='AFA-001')
+
+    response = admin_client.post('/api/v1/payments/batch', json={'payments': [payment]},
+                                 headers={'Idempotency-Key': 'batch-1'})
+
+    assert response.status_code == 201
@@ -0,0 +1,116 @@
+import io
+import re
+import zipfile
+import zlib
+
+from app import routes
+from app.archive import archive_academic_year
+from app.models import Job, Payment, PaymentBatch
+
+from .test_fee_schedule import set_fee
+from .test_payment_batches import PAYMENTS, post_batch
+
+
+def pdf_text(pdf):
+    assert pdf.startswith(b'%PDF-1.4')
+    streams = re.findall(rb'stream\n(.*?)\nendstream', pdf, re.S)
+    return b'\n'.join(zlib.decompress(stream) for stream in streams).decode('latin-1')
+
+
+def receipt_text(client, payment_id):
+    response = client.get(f'/payments/{payment_id}/receipt.pdf')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/pdf'
+    return pdf_text(response.get_data())
+
+
+def job_archive(app, client, response):
+    """The ZIP a document job saved, after checking the request redirected to the job."""
+    assert response.status_code == 302
+    with app.app_context():
+        job = Job.query.one()
+        assert job.status == 'done'
+        job_id = job.id
+    download = client.get(f'/jobs/{job_id}/download')
+    assert download.mimetype == 'application/zip'
+    return zipfile.ZipFile(io.BytesIO(download.get_data()))
+
+
+def test_receipt_shows_the_term_figures(app, clerk_client, add_student, pay):
+    add_student('AFA-001')
+    pay('AFA-001', 20000)
+
+    text = receipt_text(clerk_client, 1)
+
+    assert 'AFA-001' in text
+    assert '20,000.00' in text
+    assert '50,000.00' in text
+    assert 'NGN 30,000.00 remains due for First Term 2025/2026.' in text
+
+
+def test_receipt_is_redrawn_after_repricing(app, admin_client, add_student, pay):
+    add_student('AFA-001')
+    pay('AFA-001', 20000)
+    assert '50,000.00' in receipt_text(admin_client, 1)
+
+    set_fee(app, admin_client, '2025/2026', 'Nur. 1', 'First Term', 60000)
+
+    text = receipt_text(admin_client, 1)
+    assert '60,000.00' in text
+    assert 'NGN 40,000.00 remains due' in text
+
+
+def test_archived_payment_still_has_a_receipt(app, clerk_client, add_student, pay):
+    add_student('AFA-001', academic_year='2024/2025')
+    pay('AFA-001', 20000, academic_year='2024/2025')
+    pay('AFA-001', 10000, academic_year='2024/2025')
+    with app.app_context():
+        archive_academic_year('2024/2025')
+        assert Payment.query.count() == 0
+
+    text = receipt_text(clerk_client, 2)
+
+    assert 'First Term 2024/2025' in text
+    assert '30,000.00' in text
+    assert clerk_client.get('/payments/99/receipt.pdf').status_code == 404
+
+
+def test_statement_lists_earlier_arrears_and_the_terms_payments(app, clerk_client, add_student, pay):
+    add_student('AFA-001', student_class='Nur. 3', term='Second Term')
+    pay('AFA-001', 55000, term='First Term')
+    pay('AFA-001', 20000, term='Second Term')
+
+    response = clerk_client.get('/student/AFA-001/statement.pdf?academic_year=2025/2026&term=Second Term')
+
+    assert response.status_code == 200
+    text = pdf_text(response.get_data())
+    assert 'Second Term 2025/2026' in text
+    assert 'Third Term' not in text
+    assert 'R0000002' in text
+    assert 'R0000001' not in text
+    assert '30,000.00' in text
+    assert clerk_client.get('/student/AFA-404/statement.pdf').status_code == 404
+
+
+def test_statements_job_files_a_pdf_per_student_by_class(app, admin_client, add_student, monkeypatch):
+    monkeypatch.setattr(routes, 'get_current_school_period', lambda: ('2025/2026', 'First Term'))
+    add_student('AFA-001')
+    add_student('AFA-002', student_class='Nur. 2')
+
+    archive = job_archive(app, admin_client, admin_client.get('/statements.zip'))
+
+    assert sorted(archive.namelist()) == ['Nur.-1/AFA-001.pdf', 'Nur.-2/AFA-002.pdf']
+    assert 'AFA-002' in pdf_text(archive.read('Nur.-2/AFA-002.pdf'))
+
+
+def test_batch_receipts_job_has_a_receipt_per_payment(app, admin_client, add_student):
+    add_student('AFA-001')
+    add_student('AFA-002')
+    assert post_batch(admin_client, PAYMENTS, 'batch-1').status_code == 201
+    with app.app_context():
+        batch_id = PaymentBatch.query.one().id
+
+    archive = job_archive(app, admin_client, admin_client.get(f'/payments/batch/{batch_id}/receipts.zip'))
+
+    assert sorted(archive.namelist()) == ['AFA-001-R0000001.pdf', 'AFA-002-R0000002.pdf']
+    assert 'NGN 45,000.00 remains due' in pdf_text(archive.read('AFA-002-R0000002.pdf'))
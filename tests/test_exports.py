@@ -0,0 +1,81 @@
+import csv
+import io
+
+import pytest
+
+from app import routes
+from app.models import Job
+
+
+@pytest.fixture(autouse=True)
+def current_period(monkeypatch):
+    monkeypatch.setattr(routes, 'get_current_school_period', lambda: ('2025/2026', 'First Term'))
+
+
+def read_csv(response):
+    return list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+
+
+def test_students_export_lists_fee_status(app, clerk_client, add_student, pay):
+    add_student('AFA-001', name='Ada')
+    add_student('AFA-002', name='Bola')
+    pay('AFA-001', 50000)
+
+    response = clerk_client.get('/export/students.csv')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'].startswith('attachment; filename="students-')
+    header, *rows = read_csv(response)
+    assert header == ['Reg. No.', 'Name', 'Class', 'Term', 'Academic Year', 'Fee Status', 'Expected', 'Paid',
+                      'Outstanding']
+    assert [(row[0], row[6], row[7], row[8]) for row in rows] == [
+        ('AFA-001', '50000.0', '50000.0', '0.0'),
+        ('AFA-002', '50000.0', '0.0', '50000.0'),
+    ]
+
+
+def test_defaulters_export_skips_students_who_paid(app, clerk_client, add_student, pay):
+    add_student('AFA-001', name='Ada')
+    add_student('AFA-002', name='Bola', student_class='Nur. 2')
+    pay('AFA-001', 50000)
+
+    rows = read_csv(clerk_client.get('/export/defaulters.csv'))
+
+    assert [row[0] for row in rows[1:]] == ['AFA-002']
+
+
+def test_export_honours_class_filter(app, clerk_client, add_student):
+    add_student('AFA-001')
+    add_student('AFA-002', student_class='Nur. 2')
+
+    rows = read_csv(clerk_client.get('/export/students.csv?class=Nur. 2'))
+
+    assert [row[0] for row in rows[1:]] == ['AFA-002']
+
+
+def test_unknown_export_is_not_found(app, clerk_client):
+    assert clerk_client.get('/export/nothing.csv').status_code == 404
+    assert clerk_client.get('/export/students.pdf').status_code == 404
+
+
+def test_background_export_redirects_to_its_job(app, admin_client, add_student, pay):
+    add_student('AFA-001')
+    add_student('AFA-002')
+    pay('AFA-001', 50000)
+
+    response = admin_client.get('/export/outstanding.csv')
+
+    with app.app_context():
+        job = Job.query.one()
+        assert (job.kind, job.status) == ('export', 'done')
+        job_id = job.id
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith(f'/jobs/{job_id}')
+    assert admin_client.get(f'/jobs/{job_id}').status_code == 200
+
+    download = admin_client.get(f'/jobs/{job_id}/download')
+    assert download.status_code == 200
+    header, *rows = read_csv(download)
+    assert header[0] == 'Reg. No.'
+    assert [(row[0], row[3], row[7]) for row in rows] == [('AFA-002', 'First Term', '50000.0')]
@@ -0,0 +1,51 @@
+from app.fees import fee_classes, fee_terms
+from app.ledger import verify_balances
+from app.models import ClassTermSummary, Job, StudentBalance
+
+
+def set_fee(app, client, academic_year, student_class, term, amount):
+    with app.app_context():
+        field = f'fee_{fee_classes().index(student_class)}_{fee_terms().index(term)}'
+    response = client.post('/fees', data={'academic_year': academic_year, field: str(amount)})
+    assert response.status_code == 302
+
+
+def expected(reg_number, academic_year):
+    return StudentBalance.query.filter_by(
+        student_reg_number=reg_number, academic_year=academic_year, term='First Term').one().expected
+
+
+def paid_in_full(student_class, academic_year):
+    return ClassTermSummary.query.filter_by(
+        student_class=student_class, academic_year=academic_year, term='First Term').one().paid_in_full
+
+
+def test_fee_edit_reprices_later_years_that_inherit_it(app, admin_client, add_student, pay):
+    add_student('AFA-001')
+    add_student('AFA-002', student_class='Nur. 2')
+    for academic_year in ('2025/2026', '2026/2027'):
+        pay('AFA-001', 50000, academic_year=academic_year)
+        pay('AFA-002', 52000, academic_year=academic_year)
+
+    set_fee(app, admin_client, '2025/2026', 'Nur. 1', 'First Term', 60000)
+    with app.app_context():
+        assert expected('AFA-001', '2025/2026') == 60000
+        assert expected('AFA-001', '2026/2027') == 60000
+        assert paid_in_full('Nur. 1', '2026/2027') == 0
+        assert expected('AFA-002', '2026/2027') == 52000
+        assert paid_in_full('Nur. 2', '2026/2027') == 1
+        assert verify_balances() == []
+
+
+def test_fee_edit_stops_at_a_later_year_with_its_own_fee(app, admin_client, add_student, pay):
+    add_student('AFA-001')
+    for academic_year in ('2025/2026', '2026/2027'):
+        pay('AFA-001', 50000, academic_year=academic_year)
+
+    set_fee(app, admin_client, '2026/2027', 'Nur. 1', 'First Term', 70000)
+    set_fee(app, admin_client, '2025/2026', 'Nur. 1', 'First Term', 65000)
+    with app.app_context():
+        assert expected('AFA-001', '2025/2026') == 65000
+        assert expected('AFA-001', '2026/2027') == 70000
+        assert Job.query.order_by(Job.id.desc()).first().params == '{"periods": [["Nur. 1", "2025/2026"]]}'
+        assert verify_balances() == []
@@ -0,0 +1,93 @@
+import io
+
+from app import imports
+from app.imports import iter_import_rows
+from app.models import Payment, Student, StudentBalance
+
+
+def upload(client, kind, text):
+    return client.post(f'/import/{kind}', data={'file': (io.BytesIO(text.encode('utf-8')), f'{kind}.csv')},
+                       content_type='multipart/form-data')
+
+
+def test_student_import_reports_bad_rows(app, admin_client, add_student):
+    add_student('AFA-001')
+    response = upload(admin_client, 'students', (
+        'Reg No,Name,Class,Term,Academic Year\n'
+        'AFA-001,Existing,Nur. 1,First Term,2025/2026\n'
+        'AFA-002,New Student,Nur. 1,First Term,2025/2026\n'
+        'AFA-003,Bad Class,Nur. 9,First Term,2025/2026\n'
+        'AFA-004,Bad Year,Nur. 1,First Term,2025\n'
+        'AFA-002,Again,Nur. 1,First Term,2025/2026\n'
+    ))
+
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    assert 'Imported 1 students; 4 rows rejected.' in page
+    assert 'already exists' in page
+    assert "Unknown class &#39;Nur. 9&#39;." in page
+    assert 'Academic year must look like 2024/2025.' in page
+    assert 'Duplicate of line 3.' in page
+    with app.app_context():
+        assert Student.query.filter_by(reg_number='AFA-002').one().name == 'New Student'
+
+
+def test_payment_import_rejects_bad_amounts_without_failing_the_chunk(app, admin_client, add_student):
+    add_student('AFA-001')
+    response = upload(admin_client, 'payments', (
+        'reg_number,amount,term,academic_year\n'
+        'AFA-001,"12,500",First Term,2025/2026\n'
+        'AFA-001,nan,First Term,2025/2026\n'
+        'AFA-001,inf,First Term,2025/2026\n'
+        'AFA-404,100,First Term,2025/2026\n'
+    ))
+
+    page = response.get_data(as_text=True)
+    assert 'Imported 1 payments; 3 rows rejected.' in page
+    assert page.count('Amount must be a positive number.') == 2
+    assert 'No student with this registration number.' in page
+    assert 'Batch rejected' not in page
+    with app.app_context():
+        assert [payment.amount_paid for payment in Payment.query] == [12500]
+
+
+def test_make_payment_rejects_non_finite_amounts(app, admin_client, add_student):
+    add_student('AFA-001')
+    for amount in ('nan', 'inf', '1e12', 'abc'):
+        response = admin_client.post('/make_payment/AFA-001', data={
+            'amount_paid': amount, 'term': 'First Term', 'academic_year': '2025/2026'})
+        assert response.status_code == 200
+
+    with app.app_context():
+        assert Payment.query.count() == 0
+
+
+def test_rows_are_read_with_normalised_headers_and_blank_lines_skipped():
+    text = '\ufeffReg No,Full Name,Class,Amount\n\nAFA-001, Amina ,Nur. 1,"5,000"\n,,,\n'
+
+    rows = list(iter_import_rows(io.BytesIO(text.encode('utf-8')), 'payments.csv'))
+
+    assert rows == [(3, {'reg_number': 'AFA-001', 'full_name': 'Amina', 'student_class': 'Nur. 1',
+                         'amount_paid': '5,000'})]
+
+
+def test_a_chunk_the_database_rejects_does_not_stop_the_others(app, add_student, monkeypatch):
+    for reg_number in ('AFA-001', 'AFA-002', 'AFA-003'):
+        add_student(reg_number)
+    rows = [(n, {'reg_number': f'AFA-00{n - 1}', 'amount_paid': '1000', 'term': 'First Term',
+                 'academic_year': '2025/2026'}) for n in (2, 3, 4)]
+    real_write_payments = imports.write_payments
+
+    def write_payments(payments, *args, **kwargs):
+        if any(payment['student_reg_number'] == 'AFA-002' for payment in payments):
+            raise RuntimeError('INSERT INTO payments ... secret parameters')
+        return real_write_payments(payments, *args, **kwargs)
+
+    monkeypatch.setattr(imports, 'write_payments', write_payments)
+    with app.app_context():
+        report = imports.import_payments(rows, recorded_by=1, batch_size=2)
+
+        assert report == {'inserted': 1, 'errors': [(2, 'AFA-001', imports.BATCH_REJECTED),
+                                                    (3, 'AFA-002', imports.BATCH_REJECTED)]}
+        assert [payment.student_reg_number for payment in Payment.query] == ['AFA-003']
+        assert StudentBalance.query.count() == 1
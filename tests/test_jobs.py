@@ -0,0 +1,32 @@
+from app.models import Job
+
+
+def test_clerk_cannot_queue_statements(app, clerk_client):
+    assert clerk_client.get('/statements.zip').status_code == 403
+
+
+def test_clerk_cannot_queue_exports(app, clerk_client):
+    assert clerk_client.get('/export/outstanding.csv').status_code == 403
+    assert clerk_client.get('/export/students.csv?background=1').status_code == 403
+
+    with app.app_context():
+        assert Job.query.count() == 0
+
+
+def test_clerk_can_stream_exports(app, clerk_client, add_student):
+    add_student('AFA-001')
+
+    response = clerk_client.get('/export/students.csv')
+
+    assert response.status_code == 200
+    assert 'AFA-001' in response.get_data(as_text=True)
+
+
+def test_admin_queues_statements(app, admin_client, add_student):
+    add_student('AFA-001')
+
+    response = admin_client.get('/statements.zip')
+
+    assert response.status_code == 302
+    with app.app_context():
+        assert Job.query.one().kind == 'statements'
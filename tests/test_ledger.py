@@ -0,0 +1,77 @@
+from app import db, routes
+from app.ledger import apply_balance_deltas, verify_balances
+from app.models import ClassTermSummary, DailyCollection, Payment, StudentBalance
+
+
+def balance(reg_number, academic_year='2025/2026', term='First Term'):
+    row = StudentBalance.query.filter_by(
+        student_reg_number=reg_number, academic_year=academic_year, term=term).one()
+    return row.expected, row.paid, row.outstanding
+
+
+def summary(student_class, academic_year='2025/2026', term='First Term'):
+    row = ClassTermSummary.query.filter_by(
+        student_class=student_class, academic_year=academic_year, term=term).one_or_none()
+    return None if row is None else (row.collected, row.paying, row.paid_in_full)
+
+
+def collections(student_class):
+    return sum(row.amount for row in DailyCollection.query.filter_by(student_class=student_class))
+
+
+def test_payments_add_up_in_ledger_and_rollups(app, add_student, pay):
+    add_student('AFA-001')
+    add_student('AFA-002')
+    pay('AFA-001', 20000)
+    pay('AFA-001', 30000)
+    pay('AFA-002', 10000)
+
+    with app.app_context():
+        assert balance('AFA-001') == (50000, 50000, 0)
+        assert balance('AFA-002') == (50000, 10000, 40000)
+        assert summary('Nur. 1') == (60000, 2, 1)
+        assert collections('Nur. 1') == 60000
+        assert verify_balances() == []
+
+
+def test_upsert_adds_to_rows_inserted_in_the_same_transaction(app, add_student):
+    add_student('AFA-001')
+    with app.app_context():
+        key = ('AFA-001', '2025/2026', 'First Term')
+        apply_balance_deltas({key: 15000}, {'AFA-001': 'Nur. 1'})
+        apply_balance_deltas({key: 35000}, {'AFA-001': 'Nur. 1'})
+        db.session.commit()
+
+        assert balance('AFA-001') == (50000, 50000, 0)
+        assert summary('Nur. 1') == (50000, 1, 1)
+
+
+def test_class_change_reprices_ledger_and_moves_rollups(app, admin_client, add_student, pay, monkeypatch):
+    monkeypatch.setattr(routes, 'get_current_school_period', lambda: ('2025/2026', 'First Term'))
+    add_student('AFA-001')
+    pay('AFA-001', 50000)
+
+    response = admin_client.post('/edit_student/AFA-001', data={
+        'name': 'Student AFA-001', 'dob': '', 'gender': '', 'address': '', 'phone': '', 'email': '',
+        'class': 'Nur. 2', 'term': 'First Term', 'academic_year': '2025/2026'})
+    assert response.status_code == 302
+
+    with app.app_context():
+        assert balance('AFA-001') == (52000, 50000, 2000)
+        assert summary('Nur. 1') is None
+        assert summary('Nur. 2') == (50000, 1, 0)
+        assert collections('Nur. 1') == 0
+        assert collections('Nur. 2') == 50000
+        assert verify_balances() == []
+
+
+def test_money_adds_up_to_the_kobo(app, add_student, pay):
+    add_student('AFA-001')
+    for _ in range(10):
+        pay('AFA-001', 0.1)
+
+    with app.app_context():
+        assert balance('AFA-001') == (50000, 1.0, 49999.0)
+        assert db.session.query(db.func.sum(Payment.amount_paid)).scalar() == 1.0
+        assert summary('Nur. 1') == (1.0, 1, 0)
+        assert collections('Nur. 1') == 1.0
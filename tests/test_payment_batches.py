@@ -0,0 +1,71 @@
+from app.models import Payment, PaymentBatch, StudentBalance
+
+
+def post_batch(client, payments, key):
+    return client.post('/api/v1/payments/batch', json={'payments': payments}, headers={'Idempotency-Key': key})
+
+
+PAYMENTS = [
+    {'reg_number': 'AFA-001', 'amount_paid': 20000, 'term': 'First Term', 'academic_year': '2025/2026'},
+    {'reg_number': 'AFA-002', 'amount_paid': 5000, 'term': 'First Term', 'academic_year': '2025/2026'},
+]
+
+
+def test_replaying_a_key_returns_the_stored_result_without_paying_twice(app, admin_client, add_student):
+    add_student('AFA-001')
+    add_student('AFA-002')
+
+    first = post_batch(admin_client, PAYMENTS, 'batch-1')
+    assert first.status_code == 201
+    assert first.get_json()['replayed'] is False
+
+    replay = post_batch(admin_client, PAYMENTS, 'batch-1')
+    assert replay.status_code == 200
+    body = replay.get_json()
+    assert body['replayed'] is True
+    assert dict(body, replayed=False) == first.get_json()
+
+    with app.app_context():
+        assert Payment.query.count() == 2
+        assert PaymentBatch.query.count() == 1
+        assert StudentBalance.query.filter_by(student_reg_number='AFA-001').one().paid == 20000
+
+
+def test_reusing_a_key_for_different_payments_is_a_conflict(app, admin_client, add_student):
+    add_student('AFA-001')
+    add_student('AFA-002')
+    assert post_batch(admin_client, PAYMENTS, 'batch-1').status_code == 201
+
+    changed = [dict(PAYMENTS[0], amount_paid=25000), PAYMENTS[1]]
+    response = post_batch(admin_client, changed, 'batch-1')
+    assert response.status_code == 422
+    assert 'already used' in response.get_json()['error']
+
+    with app.app_context():
+        assert Payment.query.count() == 2
+        assert StudentBalance.query.filter_by(student_reg_number='AFA-001').one().paid == 20000
+
+
+def test_a_new_key_records_the_same_payments_again(app, admin_client, add_student):
+    add_student('AFA-001')
+    add_student('AFA-002')
+    assert post_batch(admin_client, PAYMENTS, 'batch-1').status_code == 201
+    assert post_batch(admin_client, PAYMENTS, 'batch-2').status_code == 201
+
+    with app.app_context():
+        assert Payment.query.count() == 4
+        assert StudentBalance.query.filter_by(student_reg_number='AFA-001').one().paid == 40000
+
+
+def test_non_finite_and_huge_amounts_are_rejected_per_row(app, admin_client, add_student):
+    add_student('AFA-001')
+    payments = [dict(PAYMENTS[0], amount_paid=amount) for amount in ('inf', 'nan', '1e12', '-5', 20000)]
+
+    response = post_batch(admin_client, payments, 'batch-1')
+
+    assert response.status_code == 201
+    body = response.get_json()
+    assert [row['status'] for row in body['rows']] == ['error'] * 4 + ['recorded']
+    assert body['rows'][2]['message'] == 'Amount cannot be more than ₦100,000,000.'
+    with app.app_context():
+        assert StudentBalance.query.one().paid == 20000
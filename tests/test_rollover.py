@@ -0,0 +1,132 @@
+from app import db, routes
+from app.fees import with_fee_status
+from app.ledger import build_fee_breakdown, collection_summary, verify_balances
+from app.models import ClassTermSummary, DailyCollection, Student, StudentBalance
+from app.rollover import apply_rollover, revert_rollover
+
+TERMS = {'First Term': 55000, 'Second Term': 50000, 'Third Term': 45000}
+
+
+def ledger(reg_number):
+    return {
+        (row.academic_year, row.term): (row.student_class, row.expected, row.paid, row.outstanding)
+        for row in StudentBalance.query.filter_by(student_reg_number=reg_number)
+    }
+
+
+def summaries():
+    return {
+        (row.student_class, row.academic_year, row.term): (row.collected, row.paying, row.paid_in_full)
+        for row in ClassTermSummary.query
+    }
+
+
+def collections():
+    totals = {}
+    for row in DailyCollection.query:
+        key = (row.student_class, row.academic_year, row.term)
+        totals[key] = totals.get(key, 0) + row.amount
+    return totals
+
+
+def fee_status(reg_number, academic_year, term):
+    return with_fee_status(Student.query.filter_by(reg_number=reg_number), academic_year, term).one().fee_status
+
+
+def test_promotion_leaves_past_terms_alone(app, add_student, pay):
+    add_student('AFA-001', student_class='Nur. 3', term='Third Term')
+    for term, fee in TERMS.items():
+        pay('AFA-001', fee, term=term)
+    pay('AFA-001', 10000, term='First Term', academic_year='2026/2027')
+
+    with app.app_context():
+        before = ledger('AFA-001')
+        summaries_before = summaries()
+        collections_before = collections()
+
+        apply_rollover('2025/2026', 'Third Term')
+        after = ledger('AFA-001')
+        for term in TERMS:
+            assert after[('2025/2026', term)] == before[('2025/2026', term)]
+            assert fee_status('AFA-001', '2025/2026', term) == 'Paid'
+        assert after[('2026/2027', 'First Term')] == ('Basic 1', 60000, 10000, 50000)
+
+        past = {key: value for key, value in summaries().items() if key[1] == '2025/2026'}
+        assert past == {key: value for key, value in summaries_before.items() if key[1] == '2025/2026'}
+        assert summaries()[('Basic 1', '2026/2027', 'First Term')] == (10000, 1, 0)
+        assert ('Nur. 3', '2026/2027', 'First Term') not in summaries()
+
+        assert {key: value for key, value in collections().items() if key[1] == '2025/2026'} == {
+            ('Nur. 3', '2025/2026', term): fee for term, fee in TERMS.items()}
+        assert collections()[('Basic 1', '2026/2027', 'First Term')] == 10000
+
+        student = Student.query.filter_by(reg_number='AFA-001').one()
+        breakdown = build_fee_breakdown(student, '2026/2027', 'First Term')
+        assert all(breakdown[f'{term} 2025/2026']['outstanding'] == 0 for term in TERMS)
+        assert verify_balances() == []
+
+        revert_rollover()
+        assert ledger('AFA-001') == before
+        assert summaries() == summaries_before
+        assert collections() == collections_before
+
+
+def edit_student(client, reg_number, **fields):
+    data = {'name': f'Student {reg_number}', 'dob': '', 'gender': '', 'address': '', 'phone': '', 'email': '',
+            'class': 'Basic 1', 'term': 'First Term', 'academic_year': '2026/2027', **fields}
+    response = client.post(f'/edit_student/{reg_number}', data=data)
+    assert response.status_code == 302
+
+
+def test_editing_a_promoted_student_leaves_past_terms_alone(app, admin_client, add_student, pay, monkeypatch):
+    monkeypatch.setattr(routes, 'get_current_school_period', lambda: ('2026/2027', 'First Term'))
+    add_student('AFA-001', student_class='Nur. 3', term='Third Term')
+    for term, fee in TERMS.items():
+        pay('AFA-001', fee, term=term)
+    pay('AFA-001', 10000, term='First Term', academic_year='2026/2027')
+    with app.app_context():
+        apply_rollover('2025/2026', 'Third Term')
+        before = ledger('AFA-001')
+        summaries_before = summaries()
+
+    edit_student(admin_client, 'AFA-001', phone='08030000000')
+
+    with app.app_context():
+        assert ledger('AFA-001') == before
+        assert summaries() == summaries_before
+        assert fee_status('AFA-001', '2025/2026', 'Third Term') == 'Paid'
+        assert verify_balances() == []
+
+    # A class correction reprices the current term onwards only.
+    edit_student(admin_client, 'AFA-001', **{'class': 'Basic 2'})
+
+    with app.app_context():
+        after = ledger('AFA-001')
+        for term in TERMS:
+            assert after[('2025/2026', term)] == before[('2025/2026', term)]
+        assert after[('2026/2027', 'First Term')][0] == 'Basic 2'
+        assert ('Basic 1', '2026/2027', 'First Term') not in summaries()
+        assert summaries()[('Basic 2', '2026/2027', 'First Term')][0] == 10000
+        assert collections()[('Basic 2', '2026/2027', 'First Term')] == 10000
+        assert {key: value for key, value in collections().items() if key[1] == '2025/2026'} == {
+            ('Nur. 3', '2025/2026', term): fee for term, fee in TERMS.items()}
+        assert verify_balances() == []
+
+
+def test_past_summary_survives_promotion_and_withdrawal(app, admin_client, add_student, pay):
+    add_student('AFA-001', student_class='Nur. 3', term='Third Term')
+    add_student('AFA-002', student_class='Nur. 3', term='Third Term')
+    pay('AFA-001', TERMS['Third Term'], term='Third Term')
+
+    with app.app_context():
+        before = collection_summary('2025/2026', 'Third Term')
+        assert before['totals'] == {
+            'students': 2, 'expected': 90000, 'collected': 45000, 'outstanding': 45000,
+            'paid_in_full': 1, 'part_paid': 0, 'unpaid': 1, 'defaulters': 1}
+
+        apply_rollover('2025/2026', 'Third Term')
+        db.session.delete(Student.query.filter_by(reg_number='AFA-002').one())
+        db.session.commit()
+
+        assert collection_summary('2025/2026', 'Third Term') == before
+        assert collection_summary('2026/2027', 'First Term')['totals']['students'] == 1
@@ -0,0 +1,26 @@
+from app import db
+from app.models import Student
+from app.students import search_condition
+
+
+def test_reg_number_prefix_ignores_case(app, add_student):
+    add_student('AFA-2024/001')
+    add_student('AFB-2024/002')
+
+    with app.app_context():
+        assert [student.reg_number for student in Student.query.filter(search_condition('afa-2024'))] == [
+            'AFA-2024/001']
+
+
+def test_typeahead_ignores_case(app, clerk_client, add_student):
+    add_student('AFA-2024/001')
+
+    results = clerk_client.get('/api/students/typeahead?q=afa-2024').get_json()['results']
+
+    assert [result['reg_number'] for result in results] == ['AFA-2024/001']
+
+
+def test_reg_number_lower_index_is_migrated(app):
+    with app.app_context():
+        indexes = db.session.execute(db.text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars()
+        assert 'ix_students_reg_number_lower' in set(indexes)
@@ -0,0 +1,75 @@
+import re
+
+from app.models import Student
+from app.students import decode_cursor, encode_cursor, keyset_page
+
+NAMES = ['Dayo', 'Amina', 'Chidi', 'Amina', 'Bola']
+
+
+def add_students(add_student):
+    for n, name in enumerate(NAMES, 1):
+        add_student(f'AFA-{n:03}', name=name)
+
+
+def walk(app, page_size, **cursors):
+    with app.app_context():
+        rows, next_cursor, prev_cursor = keyset_page(Student.query, page_size, key=lambda row: row, **cursors)
+        return [(student.name, student.id) for student in rows], next_cursor, prev_cursor
+
+
+def test_keyset_pages_cover_every_student_once_in_name_id_order(app, add_student):
+    add_students(add_student)
+
+    pages, after = [], None
+    while True:
+        rows, after, _ = walk(app, 2, after=decode_cursor(after))
+        pages.append(rows)
+        if after is None:
+            break
+
+    assert pages == [[('Amina', 2), ('Amina', 4)], [('Bola', 5), ('Chidi', 3)], [('Dayo', 1)]]
+
+
+def test_before_cursor_returns_the_previous_page(app, add_student):
+    add_students(add_student)
+
+    rows, next_cursor, prev_cursor = walk(app, 2, before=('Chidi', 3))
+
+    assert rows == [('Amina', 4), ('Bola', 5)]
+    assert decode_cursor(next_cursor) == ('Bola', 5)
+    assert decode_cursor(prev_cursor) == ('Amina', 4)
+
+
+def test_malformed_cursors_decode_to_none():
+    assert decode_cursor(encode_cursor('Amina', 4)) == ('Amina', 4)
+    for cursor in ('not-base64!', encode_cursor('Amina', 4)[:-3], 'WyJhIl0', 'eyJhIjogMX0'):
+        assert decode_cursor(cursor) is None
+
+
+def test_listing_pages_and_ignores_a_bad_cursor(app, clerk_client, add_student):
+    add_students(add_student)
+
+    page = clerk_client.get('/students?page_size=2').get_data(as_text=True)
+    assert page.count('AFA-00') >= 2 and 'AFA-001' not in page
+    after = re.search(r'after=([\w-]+)', page).group(1)
+
+    second = clerk_client.get(f'/students?page_size=2&after={after}').get_data(as_text=True)
+    assert 'AFA-005' in second and 'AFA-003' in second and 'AFA-002' not in second
+
+    response = clerk_client.get('/students?page_size=2&after=garbage')
+    assert response.status_code == 200
+    assert 'AFA-002' in response.get_data(as_text=True)
+
+
+def test_api_rejects_a_malformed_cursor(app, clerk_client, add_student):
+    add_students(add_student)
+
+    first = clerk_client.get('/api/v1/students?limit=3&fields=reg_number').get_json()
+    assert [row['reg_number'] for row in first['data']] == ['AFA-002', 'AFA-004', 'AFA-005']
+    rest = clerk_client.get(f"/api/v1/students?limit=3&fields=reg_number&after={first['next']}").get_json()
+    assert [row['reg_number'] for row in rest['data']] == ['AFA-003', 'AFA-001']
+    assert rest['next'] is None
+
+    response = clerk_client.get('/api/v1/students?after=garbage')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Malformed cursor.'}